@@ -0,0 +1,58 @@
+"""Add per-hospedagem rating aggregates
+
+Revision ID: 0c114e92ed48
+Revises: e6b0dfd109ee
+Create Date: 2026-10-18 11:03:54.118734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c114e92ed48'
+down_revision: Union[str, None] = 'e6b0dfd109ee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('avaliacoes_resumo',
+    sa.Column('hospedagem_id', sa.String(length=255), nullable=False),
+    sa.Column('quantidade', sa.Integer(), nullable=False),
+    sa.Column('soma', sa.Integer(), nullable=False),
+    sa.Column('nota_1', sa.Integer(), nullable=False),
+    sa.Column('nota_2', sa.Integer(), nullable=False),
+    sa.Column('nota_3', sa.Integer(), nullable=False),
+    sa.Column('nota_4', sa.Integer(), nullable=False),
+    sa.Column('nota_5', sa.Integer(), nullable=False),
+    sa.Column('media', sa.Numeric(precision=6, scale=4), nullable=True),
+    sa.ForeignKeyConstraint(['hospedagem_id'], ['hospedagens.hospedagem_id'], ),
+    sa.PrimaryKeyConstraint('hospedagem_id')
+    )
+    op.create_index('ix_avaliacoes_resumo_media_quantidade', 'avaliacoes_resumo', ['media', 'quantidade'], unique=False)
+
+    # Backfill from the existing reviews
+    op.execute("""
+        INSERT INTO avaliacoes_resumo
+            (hospedagem_id, quantidade, soma, nota_1, nota_2, nota_3, nota_4, nota_5, media)
+        SELECT hospedagem_id,
+               COUNT(nota),
+               COALESCE(SUM(nota), 0),
+               SUM(CASE WHEN nota = 1 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN nota = 2 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN nota = 3 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN nota = 4 THEN 1 ELSE 0 END),
+               SUM(CASE WHEN nota = 5 THEN 1 ELSE 0 END),
+               SUM(nota) * 1.0 / COUNT(nota)
+        FROM avaliacoes
+        WHERE hospedagem_id IS NOT NULL AND nota IS NOT NULL
+        GROUP BY hospedagem_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_avaliacoes_resumo_media_quantidade', table_name='avaliacoes_resumo')
+    op.drop_table('avaliacoes_resumo')
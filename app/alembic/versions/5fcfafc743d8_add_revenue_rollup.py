@@ -0,0 +1,131 @@
+"""Add the daily revenue rollup
+
+Revision ID: 5fcfafc743d8
+Revises: 0c114e92ed48
+Create Date: 2026-10-18 12:41:07.503216
+
+The backfill works on the tables as they are at this revision, so later
+changes to the models or to repositories.revenue_rollup cannot break it.
+It splits prices across nights the way nightly_amounts does.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_DOWN
+from typing import Dict, List, Sequence, Tuple, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5fcfafc743d8'
+down_revision: Union[str, None] = '0c114e92ed48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+CENT = Decimal('0.01')
+
+alugueis = sa.table(
+    'alugueis',
+    sa.column('aluguel_id'), sa.column('hospedagem_id'),
+    sa.column('data_inicio', sa.Date()), sa.column('data_fim', sa.Date()),
+    sa.column('preco_total', sa.Numeric(10, 2)),
+)
+hospedagens = sa.table('hospedagens', sa.column('hospedagem_id'), sa.column('endereco_id'),
+                       sa.column('proprietario_id'))
+enderecos = sa.table('enderecos', sa.column('endereco_id'), sa.column('cidade'))
+receita_diaria = sa.table(
+    'receita_diaria',
+    sa.column('dia', sa.Date()), sa.column('hospedagem_id'), sa.column('proprietario_id'),
+    sa.column('cidade'), sa.column('valor', sa.Numeric(12, 2)),
+)
+
+
+def _nightly_amounts(data_inicio: date, data_fim: date, preco_total) -> List[Tuple[date, Decimal]]:
+    preco_total = Decimal(preco_total)
+    nights = max((data_fim - data_inicio).days, 1)
+    share = (preco_total / nights).quantize(CENT, rounding=ROUND_DOWN)
+    amounts = [(data_inicio + timedelta(days=night), share) for night in range(nights)]
+    last_day, _ = amounts[-1]
+    amounts[-1] = (last_day, preco_total - share * (nights - 1))
+    return amounts
+
+
+def _backfill(connection) -> None:
+    """Sum the nights of every rental, one hospedagem at a time
+
+    Rentals are read in (hospedagem_id, aluguel_id) keyset batches, so each
+    hospedagem's nights are complete once the scan moves past it.
+    """
+    query = sa.select(
+        alugueis.c.aluguel_id, alugueis.c.hospedagem_id, alugueis.c.data_inicio,
+        alugueis.c.data_fim, alugueis.c.preco_total,
+        hospedagens.c.proprietario_id, enderecos.c.cidade,
+    ).select_from(
+        alugueis.outerjoin(hospedagens, hospedagens.c.hospedagem_id == alugueis.c.hospedagem_id)
+        .outerjoin(enderecos, enderecos.c.endereco_id == hospedagens.c.endereco_id)
+    ).where(
+        alugueis.c.hospedagem_id.isnot(None), alugueis.c.data_inicio.isnot(None),
+        alugueis.c.data_fim.isnot(None), alugueis.c.preco_total.isnot(None),
+    ).order_by(alugueis.c.hospedagem_id, alugueis.c.aluguel_id).limit(BATCH_SIZE)
+
+    pending: List[dict] = []
+    totals: Dict[date, Decimal] = defaultdict(Decimal)
+    current = None
+
+    def close_hospedagem():
+        hospedagem_id, proprietario_id, cidade = current
+        pending.extend({'dia': dia, 'hospedagem_id': hospedagem_id, 'proprietario_id': proprietario_id,
+                        'cidade': cidade, 'valor': valor} for dia, valor in totals.items())
+        totals.clear()
+
+    last = None
+    while True:
+        page = query if last is None else query.where(
+            sa.tuple_(alugueis.c.hospedagem_id, alugueis.c.aluguel_id) > sa.tuple_(*last)
+        )
+        rows = connection.execute(page).all()
+        if not rows:
+            break
+        for aluguel_id, hospedagem_id, data_inicio, data_fim, preco_total, proprietario_id, cidade in rows:
+            if current is None or current[0] != hospedagem_id:
+                if current is not None:
+                    close_hospedagem()
+                current = (hospedagem_id, proprietario_id, cidade)
+            for dia, valor in _nightly_amounts(data_inicio, data_fim, preco_total):
+                totals[dia] += valor
+        if len(pending) >= BATCH_SIZE:
+            connection.execute(sa.insert(receita_diaria), pending)
+            pending.clear()
+        last = (rows[-1].hospedagem_id, rows[-1].aluguel_id)
+    if current is not None:
+        close_hospedagem()
+    if pending:
+        connection.execute(sa.insert(receita_diaria), pending)
+
+
+def upgrade() -> None:
+    op.create_table('receita_diaria',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('hospedagem_id', sa.String(length=255), nullable=False),
+    sa.Column('proprietario_id', sa.String(length=255), nullable=True),
+    sa.Column('cidade', sa.String(length=255), nullable=True),
+    sa.Column('valor', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['hospedagem_id'], ['hospedagens.hospedagem_id'], ),
+    sa.PrimaryKeyConstraint('dia', 'hospedagem_id')
+    )
+    op.create_index('ix_receita_diaria_hospedagem_id_dia', 'receita_diaria', ['hospedagem_id', 'dia'], unique=False)
+    op.create_index('ix_receita_diaria_proprietario_id_dia', 'receita_diaria', ['proprietario_id', 'dia'], unique=False)
+    op.create_index('ix_receita_diaria_cidade_dia', 'receita_diaria', ['cidade', 'dia'], unique=False)
+
+    # Backfill from the existing rentals. Prorating by night is easier in
+    # Python than in portable SQL
+    _backfill(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_index('ix_receita_diaria_cidade_dia', table_name='receita_diaria')
+    op.drop_index('ix_receita_diaria_proprietario_id_dia', table_name='receita_diaria')
+    op.drop_index('ix_receita_diaria_hospedagem_id_dia', table_name='receita_diaria')
+    op.drop_table('receita_diaria')
@@ -0,0 +1,39 @@
+"""Add FULLTEXT indexes for review and customer search
+
+Revision ID: 9e5eebdc2369
+Revises: 5fcfafc743d8
+Create Date: 2026-10-18 13:26:45.218904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e5eebdc2369'
+down_revision: Union[str, None] = '5fcfafc743d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FULLTEXT_INDEXES = [
+    ('ft_proprietarios_nome', 'proprietarios', ['nome']),
+    ('ft_clientes_nome_cpf_contato', 'clientes', ['nome', 'cpf', 'contato']),
+    ('ft_avaliacoes_comentario', 'avaliacoes', ['comentario']),
+]
+
+
+def upgrade() -> None:
+    # Only MySQL has FULLTEXT; elsewhere InvertedIndex searches in process
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    for name, table, columns in FULLTEXT_INDEXES:
+        op.create_index(name, table, columns, unique=False, mysql_prefix='FULLTEXT')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'mysql':
+        return
+    for name, table, _ in reversed(FULLTEXT_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,189 @@
+"""Store primary and foreign keys as BINARY(16) UUIDs
+
+Revision ID: a7d3e9c2f1b4
+Revises: bffcc53030c5
+Create Date: 2026-10-18 16:20:44.918302
+
+On MySQL the conversion is online until the final swap:
+
+1. every key column gets a BINARY(16) shadow column, added in place
+   without locking the table;
+2. BEFORE INSERT/UPDATE triggers fill the shadow columns of rows the
+   running application writes;
+3. existing rows are backfilled in primary key order, BATCH_SIZE rows
+   per autocommitted UPDATE;
+4. the swap drops the foreign keys, replaces each key column with its
+   shadow in one in-place ALTER per table (LOCK=NONE), and adds the
+   foreign keys back without re-checking them.
+
+Deploy the application version that reads BinaryUUID keys right after the
+swap. An interrupted upgrade can be run again: existing shadow columns are
+reused and backfilled again.
+
+SQLite columns are untyped, so there the values are rewritten in place:
+the declared types stay VARCHAR while the values become 16-byte blobs.
+"""
+from typing import Callable, Dict, List, Sequence, Union
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9c2f1b4'
+down_revision: Union[str, None] = 'bffcc53030c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+KEY_COLUMNS: Dict[str, List[str]] = {
+    'proprietarios': ['proprietario_id'],
+    'clientes': ['cliente_id'],
+    'enderecos': ['endereco_id'],
+    'hospedagens': ['hospedagem_id', 'endereco_id', 'proprietario_id'],
+    'alugueis': ['aluguel_id', 'cliente_id', 'hospedagem_id'],
+    'avaliacoes': ['avaliacao_id', 'cliente_id', 'hospedagem_id'],
+    'avaliacoes_resumo': ['hospedagem_id'],
+    'receita_diaria': ['hospedagem_id', 'proprietario_id'],
+}
+
+
+def _shadow(column: str) -> str:
+    return f'{column}_new'
+
+
+def _unhex(column: str) -> str:
+    return f"UNHEX(REPLACE({column}, '-', ''))"
+
+
+def _hex(column: str) -> str:
+    digits = f'LOWER(HEX({column}))'
+    parts = ', '.join(f'SUBSTR({digits}, {start}, {length})'
+                      for start, length in ((1, 8), (9, 4), (13, 4), (17, 4), (21, 12)))
+    return f"IF({column} IS NULL, NULL, CONCAT_WS('-', {parts}))"
+
+
+def _triggers(table: str) -> List[str]:
+    return [f'{table}_binary_keys_{event}' for event in ('insert', 'update')]
+
+
+def _backfill(connection, table: str, columns: List[str], convert: Callable[[str], str]) -> None:
+    """Fill the shadow columns BATCH_SIZE rows at a time, in primary key order"""
+    key = sa.inspect(connection).get_pk_constraint(table)['constrained_columns']
+    key_list = ', '.join(key)
+    after_params = ', '.join(f':after_{i}' for i in range(len(key)))
+    upto_params = ', '.join(f':upto_{i}' for i in range(len(key)))
+    sets = ', '.join(f'{_shadow(column)} = {convert(column)}' for column in columns)
+    last = None
+    while True:
+        after = f'WHERE ({key_list}) > ({after_params})' if last else ''
+        params = {f'after_{i}': value for i, value in enumerate(last or ())}
+        upto = connection.execute(sa.text(
+            f'SELECT {key_list} FROM {table} {after} ORDER BY {key_list} '
+            f'LIMIT 1 OFFSET {BATCH_SIZE - 1}'
+        ), params).first()
+        if upto is None:
+            connection.execute(sa.text(f'UPDATE {table} SET {sets} {after}'), params)
+            return
+        params.update({f'upto_{i}': value for i, value in enumerate(upto)})
+        bound = f'({key_list}) <= ({upto_params})'
+        connection.execute(sa.text(
+            f'UPDATE {table} SET {sets} {after + " AND " if after else "WHERE "}{bound}'
+        ), params)
+        last = tuple(upto)
+
+
+def _convert_mysql(column_type: str, convert: Callable[[str], str]) -> None:
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    columns_of = {table: {column['name']: column for column in inspector.get_columns(table)}
+                  for table in KEY_COLUMNS}
+
+    # Shadow columns, kept current by triggers while the backfill runs
+    for table, columns in KEY_COLUMNS.items():
+        missing = [column for column in columns if _shadow(column) not in columns_of[table]]
+        if missing:
+            adds = ', '.join(f'ADD COLUMN {_shadow(column)} {column_type} NULL' for column in missing)
+            op.execute(f'ALTER TABLE {table} {adds}, ALGORITHM=INPLACE, LOCK=NONE')
+        sets = ' '.join(f'SET NEW.{_shadow(column)} = {convert("NEW." + column)};'
+                        for column in columns)
+        for trigger, event in zip(_triggers(table), ('INSERT', 'UPDATE')):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            op.execute(f'CREATE TRIGGER {trigger} BEFORE {event} ON {table} '
+                       f'FOR EACH ROW BEGIN {sets} END')
+
+    with op.get_context().autocommit_block():
+        for table, columns in KEY_COLUMNS.items():
+            _backfill(connection, table, columns, convert)
+
+    # Swap: every key changes type at once, so the foreign keys go first
+    foreign_keys = {table: inspector.get_foreign_keys(table) for table in KEY_COLUMNS}
+    for table, keys in foreign_keys.items():
+        for foreign_key in keys:
+            op.drop_constraint(foreign_key['name'], table, type_='foreignkey')
+
+    for table, columns in KEY_COLUMNS.items():
+        for trigger in _triggers(table):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        primary_key = inspector.get_pk_constraint(table)['constrained_columns']
+        indexes = [index for index in inspector.get_indexes(table)
+                   if set(index['column_names']) & set(columns)]
+        clauses = [f'DROP INDEX {index["name"]}' for index in indexes]
+        if set(primary_key) & set(columns):
+            clauses.append('DROP PRIMARY KEY')
+        for column in columns:
+            nullable = columns_of[table][column]['nullable'] and column not in primary_key
+            clauses.append(f'DROP COLUMN {column}')
+            clauses.append(f'CHANGE COLUMN {_shadow(column)} {column} {column_type} '
+                           f'{"NULL" if nullable else "NOT NULL"}')
+        if set(primary_key) & set(columns):
+            clauses.append(f'ADD PRIMARY KEY ({", ".join(primary_key)})')
+        clauses += [f'ADD {"UNIQUE " if index["unique"] else ""}INDEX {index["name"]} '
+                    f'({", ".join(index["column_names"])})' for index in indexes]
+        op.execute(f'ALTER TABLE {table} {", ".join(clauses)}, ALGORITHM=INPLACE, LOCK=NONE')
+
+    # The values were converted one to one, so the keys still match
+    op.execute('SET foreign_key_checks = 0')
+    for table, keys in foreign_keys.items():
+        for foreign_key in keys:
+            op.execute(
+                f'ALTER TABLE {table} ADD CONSTRAINT {foreign_key["name"]} '
+                f'FOREIGN KEY ({", ".join(foreign_key["constrained_columns"])}) '
+                f'REFERENCES {foreign_key["referred_table"]} '
+                f'({", ".join(foreign_key["referred_columns"])}), ALGORITHM=INPLACE'
+            )
+    op.execute('SET foreign_key_checks = 1')
+
+
+def _convert_in_place(stored_as: str, convert: Callable) -> None:
+    """Rewrite the values of SQLite's untyped columns, BATCH_SIZE at a time"""
+    connection = op.get_bind()
+    for table, columns in KEY_COLUMNS.items():
+        for column in columns:
+            target = sa.table(table, sa.column(column))
+            rewrite = sa.update(target).where(target.c[column] == sa.bindparam('previous')) \
+                .values({column: sa.bindparam('converted')})
+            pending = sa.select(target.c[column]).distinct() \
+                .where(sa.func.typeof(target.c[column]) == stored_as).limit(BATCH_SIZE)
+            while True:
+                values = connection.execute(pending).scalars().all()
+                if not values:
+                    break
+                connection.execute(rewrite, [{'previous': value, 'converted': convert(value)}
+                                             for value in values])
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'mysql':
+        _convert_mysql('BINARY(16)', _unhex)
+    else:
+        _convert_in_place('text', lambda value: uuid.UUID(value).bytes)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'mysql':
+        _convert_mysql('VARCHAR(255)', _hex)
+    else:
+        _convert_in_place('blob', lambda value: str(uuid.UUID(bytes=bytes(value))))
@@ -0,0 +1,55 @@
+"""Add the archive tables of alugueis and avaliacoes
+
+Revision ID: b5f2d8e4a9c3
+Revises: c4e8a1f6d2b9
+Create Date: 2026-10-18 19:32:50.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5f2d8e4a9c3'
+down_revision: Union[str, None] = 'c4e8a1f6d2b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('alugueis_arquivo',
+    sa.Column('aluguel_id', sa.BINARY(length=16), nullable=False),
+    sa.Column('cliente_id', sa.BINARY(length=16), nullable=True),
+    sa.Column('hospedagem_id', sa.BINARY(length=16), nullable=True),
+    sa.Column('data_inicio', sa.Date(), nullable=True),
+    sa.Column('data_fim', sa.Date(), nullable=True),
+    sa.Column('preco_total', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.ForeignKeyConstraint(['cliente_id'], ['clientes.cliente_id'], ),
+    sa.ForeignKeyConstraint(['hospedagem_id'], ['hospedagens.hospedagem_id'], ),
+    sa.PrimaryKeyConstraint('aluguel_id')
+    )
+    op.create_index('ix_alugueis_arquivo_cliente_id', 'alugueis_arquivo', ['cliente_id'], unique=False)
+    op.create_index('ix_alugueis_arquivo_hospedagem_id_periodo', 'alugueis_arquivo', ['hospedagem_id', 'data_inicio', 'data_fim'], unique=False)
+    op.create_table('avaliacoes_arquivo',
+    sa.Column('avaliacao_id', sa.BINARY(length=16), nullable=False),
+    sa.Column('cliente_id', sa.BINARY(length=16), nullable=True),
+    sa.Column('hospedagem_id', sa.BINARY(length=16), nullable=True),
+    sa.Column('nota', sa.Integer(), nullable=True),
+    sa.Column('comentario', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['cliente_id'], ['clientes.cliente_id'], ),
+    sa.ForeignKeyConstraint(['hospedagem_id'], ['hospedagens.hospedagem_id'], ),
+    sa.PrimaryKeyConstraint('avaliacao_id')
+    )
+    op.create_index('ix_avaliacoes_arquivo_cliente_id', 'avaliacoes_arquivo', ['cliente_id'], unique=False)
+    op.create_index('ix_avaliacoes_arquivo_hospedagem_id_nota', 'avaliacoes_arquivo', ['hospedagem_id', 'nota'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_avaliacoes_arquivo_hospedagem_id_nota', table_name='avaliacoes_arquivo')
+    op.drop_index('ix_avaliacoes_arquivo_cliente_id', table_name='avaliacoes_arquivo')
+    op.drop_table('avaliacoes_arquivo')
+    op.drop_index('ix_alugueis_arquivo_hospedagem_id_periodo', table_name='alugueis_arquivo')
+    op.drop_index('ix_alugueis_arquivo_cliente_id', table_name='alugueis_arquivo')
+    op.drop_table('alugueis_arquivo')
@@ -0,0 +1,86 @@
+"""Add normalized address search columns
+
+Revision ID: bffcc53030c5
+Revises: 9e5eebdc2369
+Create Date: 2026-10-18 14:02:31.640185
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from text_normalization import digits, search_key
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bffcc53030c5'
+down_revision: Union[str, None] = '9e5eebdc2369'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def _backfill() -> None:
+    # Accent stripping is not portable SQL, so normalize in Python
+    enderecos = sa.table(
+        'enderecos',
+        sa.column('endereco_id', sa.String), sa.column('rua', sa.String),
+        sa.column('bairro', sa.String), sa.column('cidade', sa.String),
+        sa.column('cep', sa.String), sa.column('rua_busca', sa.String),
+        sa.column('bairro_busca', sa.String), sa.column('cidade_busca', sa.String),
+        sa.column('cep_digitos', sa.String),
+    )
+    update = sa.update(enderecos).where(
+        enderecos.c.endereco_id == sa.bindparam('key')
+    ).values(
+        rua_busca=sa.bindparam('rua_busca'), bairro_busca=sa.bindparam('bairro_busca'),
+        cidade_busca=sa.bindparam('cidade_busca'), cep_digitos=sa.bindparam('cep_digitos'),
+    )
+    connection = op.get_bind()
+    last_id = None
+    while True:
+        stmt = sa.select(enderecos.c.endereco_id, enderecos.c.rua, enderecos.c.bairro,
+                         enderecos.c.cidade, enderecos.c.cep)
+        if last_id is not None:
+            stmt = stmt.where(enderecos.c.endereco_id > last_id)
+        rows = connection.execute(stmt.order_by(enderecos.c.endereco_id).limit(BATCH_SIZE)).all()
+        if not rows:
+            break
+        connection.execute(update, [
+            {
+                'key': row.endereco_id,
+                'rua_busca': search_key(row.rua) or None,
+                'bairro_busca': search_key(row.bairro) or None,
+                'cidade_busca': search_key(row.cidade) or None,
+                'cep_digitos': digits(row.cep) or None,
+            }
+            for row in rows
+        ])
+        last_id = rows[-1].endereco_id
+
+
+def upgrade() -> None:
+    op.add_column('enderecos', sa.Column('rua_busca', sa.String(length=255), nullable=True))
+    op.add_column('enderecos', sa.Column('bairro_busca', sa.String(length=255), nullable=True))
+    op.add_column('enderecos', sa.Column('cidade_busca', sa.String(length=255), nullable=True))
+    op.add_column('enderecos', sa.Column('cep_digitos', sa.String(length=8), nullable=True))
+
+    _backfill()
+
+    op.create_index(op.f('ix_enderecos_rua_busca'), 'enderecos', ['rua_busca'], unique=False)
+    op.create_index(op.f('ix_enderecos_cep_digitos'), 'enderecos', ['cep_digitos'], unique=False)
+    op.create_index('ix_enderecos_cidade_busca_bairro_busca', 'enderecos', ['cidade_busca', 'bairro_busca'], unique=False)
+    op.create_index('ix_enderecos_estado_cidade_busca', 'enderecos', ['estado', 'cidade_busca'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_enderecos_estado_cidade_busca', table_name='enderecos')
+    op.drop_index('ix_enderecos_cidade_busca_bairro_busca', table_name='enderecos')
+    op.drop_index(op.f('ix_enderecos_cep_digitos'), table_name='enderecos')
+    op.drop_index(op.f('ix_enderecos_rua_busca'), table_name='enderecos')
+    op.drop_column('enderecos', 'cep_digitos')
+    op.drop_column('enderecos', 'cidade_busca')
+    op.drop_column('enderecos', 'bairro_busca')
+    op.drop_column('enderecos', 'rua_busca')
@@ -0,0 +1,124 @@
+"""Partition alugueis by month of data_inicio
+
+Revision ID: c4e8a1f6d2b9
+Revises: a7d3e9c2f1b4
+Create Date: 2026-10-18 18:05:12.402117
+
+Adds the stay length CHECK on MySQL, SQLite and PostgreSQL, so a rental
+never ends before it starts nor lasts more than MAX_STAY_DAYS; existing
+rentals breaking it stop the upgrade. Only MySQL partitions: the table is
+copied once, with monthly partitions from its oldest rental to MONTHS_AHEAD
+months from now; after that, scripts/manage_partitions.py adds the months
+to come and drops or exchanges the old ones.
+
+Constants and DDL are spelled out here rather than imported from models or
+repositories, so this revision keeps running as the application changes.
+"""
+from datetime import date
+from typing import List, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1f6d2b9'
+down_revision: Union[str, None] = 'a7d3e9c2f1b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = 'alugueis'
+CHECK = 'ck_alugueis_duracao'
+MAX_STAY_DAYS = 366
+MONTHS_AHEAD = 12
+
+# Days from data_inicio to data_fim, in each dialect's date arithmetic
+STAY_DAYS = {
+    'mysql': 'DATEDIFF(data_fim, data_inicio)',
+    'sqlite': 'julianday(data_fim) - julianday(data_inicio)',
+    'postgresql': 'data_fim - data_inicio',
+}
+
+FOREIGN_KEYS = [
+    ('alugueis_ibfk_1', 'cliente_id', 'clientes'),
+    ('alugueis_ibfk_2', 'hospedagem_id', 'hospedagens'),
+]
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _months(first: date, last: date) -> List[date]:
+    months, month = [], first.replace(day=1)
+    while month <= last:
+        months.append(month)
+        month = _next_month(month)
+    return months
+
+
+def _add_check(dialect: str):
+    stay_days = STAY_DAYS[dialect]
+    too_long = op.get_bind().execute(sa.text(
+        f'SELECT COUNT(*) FROM {TABLE} '
+        f'WHERE NOT ({stay_days} BETWEEN 0 AND {MAX_STAY_DAYS})'
+    )).scalar()
+    if too_long:
+        raise ValueError(f'{too_long} alugueis end before they start or last more than '
+                         f'{MAX_STAY_DAYS} days; fix them before upgrading')
+    condition = f'{stay_days} BETWEEN 0 AND {MAX_STAY_DAYS}'
+    if dialect == 'sqlite':
+        # SQLite cannot add a CHECK to an existing table: batch mode rebuilds it
+        with op.batch_alter_table(TABLE, recreate='always') as batch:
+            batch.create_check_constraint(CHECK, condition)
+    else:
+        op.create_check_constraint(CHECK, TABLE, condition)
+
+
+def _partition(until: date):
+    """Monthly partitions from the oldest rental up to `until`, plus p_futuro
+
+    MySQL requires the partitioning column in every unique key and allows
+    no foreign keys on partitioned InnoDB tables, so the primary key becomes
+    (aluguel_id, data_inicio) and the foreign keys of alugueis are dropped.
+    """
+    connection = op.get_bind()
+    nulls = connection.execute(sa.text(f'SELECT COUNT(*) FROM {TABLE} WHERE data_inicio IS NULL')).scalar()
+    if nulls:
+        raise ValueError(f'{nulls} alugueis have no data_inicio; they cannot be partitioned')
+    for foreign_key in sa.inspect(connection).get_foreign_keys(TABLE):
+        op.execute(f'ALTER TABLE {TABLE} DROP FOREIGN KEY {foreign_key["name"]}')
+    op.execute(f'ALTER TABLE {TABLE} MODIFY data_inicio DATE NOT NULL, '
+               f'DROP PRIMARY KEY, ADD PRIMARY KEY (aluguel_id, data_inicio)')
+    oldest = connection.execute(sa.text(f'SELECT MIN(data_inicio) FROM {TABLE}')).scalar() or until
+    clauses = [f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_next_month(month)}')"
+               for month in _months(min(oldest, until), until)]
+    clauses.append('PARTITION p_futuro VALUES LESS THAN (MAXVALUE)')
+    op.execute(f'ALTER TABLE {TABLE} PARTITION BY RANGE COLUMNS(data_inicio) ({", ".join(clauses)})')
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect in STAY_DAYS:
+        _add_check(dialect)
+    if dialect != 'mysql':
+        return
+    until = date.today().replace(day=1)
+    for _ in range(MONTHS_AHEAD):
+        until = _next_month(until)
+    _partition(until)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.execute(f'ALTER TABLE {TABLE} REMOVE PARTITIONING')
+        op.execute(f'ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (aluguel_id), '
+                   f'MODIFY data_inicio DATE NULL')
+        for name, column, referred in FOREIGN_KEYS:
+            op.create_foreign_key(name, TABLE, referred, [column], [column])
+    if dialect == 'sqlite':
+        with op.batch_alter_table(TABLE, recreate='always') as batch:
+            batch.drop_constraint(CHECK, type_='check')
+    elif dialect in STAY_DAYS:
+        op.drop_constraint(CHECK, TABLE, type_='check')
@@ -0,0 +1,47 @@
+"""Key the revenue rollup by the search key of the city, from current owners
+
+Revision ID: d9b3f7a2c6e1
+Revises: b5f2d8e4a9c3
+Create Date: 2026-10-18 21:14:37.552903
+
+receita_diaria.cidade held the city as typed when each night was written,
+and proprietario_id the owner at that time. Both are copied again from the
+current hospedagens and enderecos, with cidade as enderecos.cidade_busca.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9b3f7a2c6e1'
+down_revision: Union[str, None] = 'b5f2d8e4a9c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+receita_diaria = sa.table('receita_diaria', sa.column('hospedagem_id'),
+                          sa.column('proprietario_id'), sa.column('cidade'))
+hospedagens = sa.table('hospedagens', sa.column('hospedagem_id'),
+                       sa.column('proprietario_id'), sa.column('endereco_id'))
+enderecos = sa.table('enderecos', sa.column('endereco_id'),
+                     sa.column('cidade'), sa.column('cidade_busca'))
+
+
+def _attribute(cidade_column: str):
+    owner = (sa.select(hospedagens.c.proprietario_id)
+             .where(hospedagens.c.hospedagem_id == receita_diaria.c.hospedagem_id)
+             .scalar_subquery())
+    city = (sa.select(enderecos.c[cidade_column])
+            .select_from(hospedagens.join(enderecos, enderecos.c.endereco_id == hospedagens.c.endereco_id))
+            .where(hospedagens.c.hospedagem_id == receita_diaria.c.hospedagem_id)
+            .scalar_subquery())
+    op.execute(sa.update(receita_diaria).values(proprietario_id=owner, cidade=city))
+
+
+def upgrade() -> None:
+    _attribute('cidade_busca')
+
+
+def downgrade() -> None:
+    _attribute('cidade')
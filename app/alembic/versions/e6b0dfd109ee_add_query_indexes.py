@@ -0,0 +1,54 @@
+"""Add indexes matching the repository access paths
+
+Revision ID: e6b0dfd109ee
+Revises: f541e2ec362c
+Create Date: 2026-10-18 09:12:31.402215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b0dfd109ee'
+down_revision: Union[str, None] = 'f541e2ec362c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_clientes_cpf', 'clientes', ['cpf'], unique=False)
+    op.create_index('ix_proprietarios_cpf_cnpj', 'proprietarios', ['cpf_cnpj'], unique=False)
+    op.create_index('ix_enderecos_cep', 'enderecos', ['cep'], unique=False)
+    op.create_index('ix_hospedagens_endereco_id', 'hospedagens', ['endereco_id'], unique=False)
+    op.create_index('ix_hospedagens_proprietario_id_ativo', 'hospedagens', ['proprietario_id', 'ativo'], unique=False)
+    op.create_index('ix_alugueis_hospedagem_id_periodo', 'alugueis', ['hospedagem_id', 'data_inicio', 'data_fim'], unique=False)
+    op.create_index('ix_alugueis_cliente_id', 'alugueis', ['cliente_id'], unique=False)
+    op.create_index('ix_alugueis_data_inicio', 'alugueis', ['data_inicio'], unique=False)
+    op.create_index('ix_alugueis_data_fim', 'alugueis', ['data_fim'], unique=False)
+    op.create_index('ix_avaliacoes_hospedagem_id_nota', 'avaliacoes', ['hospedagem_id', 'nota'], unique=False)
+    op.create_index('ix_avaliacoes_cliente_id', 'avaliacoes', ['cliente_id'], unique=False)
+
+
+def _drop_index(name: str, table: str, fk_column: str = None) -> None:
+    if fk_column and op.get_bind().dialect.name == 'mysql':
+        # MySQL will not drop the only index backing a foreign key, so put
+        # back the implicit single-column index it created with the table
+        op.create_index(fk_column, table, [fk_column], unique=False)
+    op.drop_index(name, table_name=table)
+
+
+def downgrade() -> None:
+    _drop_index('ix_avaliacoes_cliente_id', 'avaliacoes', 'cliente_id')
+    _drop_index('ix_avaliacoes_hospedagem_id_nota', 'avaliacoes', 'hospedagem_id')
+    _drop_index('ix_alugueis_data_fim', 'alugueis')
+    _drop_index('ix_alugueis_data_inicio', 'alugueis')
+    _drop_index('ix_alugueis_cliente_id', 'alugueis', 'cliente_id')
+    _drop_index('ix_alugueis_hospedagem_id_periodo', 'alugueis', 'hospedagem_id')
+    _drop_index('ix_hospedagens_proprietario_id_ativo', 'hospedagens', 'proprietario_id')
+    _drop_index('ix_hospedagens_endereco_id', 'hospedagens', 'endereco_id')
+    _drop_index('ix_enderecos_cep', 'enderecos')
+    _drop_index('ix_proprietarios_cpf_cnpj', 'proprietarios')
+    _drop_index('ix_clientes_cpf', 'clientes')
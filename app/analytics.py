@@ -0,0 +1,214 @@
+"""Occupancy analytics over `alugueis`, computed with NumPy one chunk at a time
+
+Rentals are streamed as columns (hospedagem, group key, dates, price) in
+chunks of `chunk_size` rows and folded into per-group accumulators, so memory
+depends on the number of groups, not on the number of rentals.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models import Aluguel, Endereco, Hospedagem
+from repositories.partitions import is_partitioned, overlapping
+
+OCCUPANCY_DIMENSIONS = {
+    'hospedagem': Hospedagem.hospedagem_id,
+    'cidade': Endereco.cidade,
+    'tipo': Hospedagem.tipo,
+    'proprietario': Hospedagem.proprietario_id,
+}
+# Stays and gaps this long or longer share the last histogram bin
+MAX_NIGHTS = 30
+# Upper edges of the nightly rate histogram; rates above the last share it
+RATE_BUCKETS = tuple(float(edge) for edge in range(50, 2050, 50))
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+@dataclass
+class OccupancyStats:
+    """Occupancy of one group over a period
+
+    `stay_lengths[n]` counts check-ins of n nights and `gaps[n]` the empty
+    stretches of n nights before a check-in, since the previous stay at the
+    same hospedagem (both capped at MAX_NIGHTS; a gap reaching further back
+    than MAX_NIGHTS before the period is not counted). `nightly_rates[i]`
+    counts check-ins whose price per night is at most RATE_BUCKETS[i].
+    """
+    hospedagens: int
+    available_nights: int
+    occupied_nights: int
+    revenue: float
+    stays: int
+    stay_nights: int
+    stay_lengths: np.ndarray
+    gaps: np.ndarray
+    nightly_rates: np.ndarray
+
+    @property
+    def occupancy(self) -> float:
+        return self.occupied_nights / self.available_nights if self.available_nights else 0.0
+
+    @property
+    def average_stay(self) -> Optional[float]:
+        return self.stay_nights / self.stays if self.stays else None
+
+    @property
+    def nightly_rate(self) -> Optional[float]:
+        """Revenue per occupied night (ADR)"""
+        return self.revenue / self.occupied_nights if self.occupied_nights else None
+
+    def nightly_rate_quantile(self, q: float) -> Optional[float]:
+        return histogram_quantile(self.nightly_rates, RATE_BUCKETS, q)
+
+    def as_dict(self) -> dict:
+        return {
+            'hospedagens': self.hospedagens,
+            'occupancy': round(self.occupancy, 4),
+            'occupied_nights': self.occupied_nights,
+            'available_nights': self.available_nights,
+            'revenue': round(self.revenue, 2),
+            'nightly_rate': self.nightly_rate,
+            'stays': self.stays,
+            'average_stay': self.average_stay,
+            'stay_lengths': self.stay_lengths.tolist(),
+            'gaps': self.gaps.tolist(),
+            'nightly_rate_p50': self.nightly_rate_quantile(0.5),
+            'nightly_rate_p90': self.nightly_rate_quantile(0.9),
+        }
+
+
+def histogram_quantile(counts: np.ndarray, edges: Sequence[float], q: float) -> Optional[float]:
+    """Upper edge of the bucket holding quantile q, or None for no data"""
+    total = counts.sum()
+    if not total:
+        return None
+    return edges[int(np.searchsorted(np.cumsum(counts), q * total))]
+
+
+class _Accumulator:
+    """Per-group running sums, grown as new group keys show up"""
+
+    def __init__(self):
+        self.index: Dict[object, int] = {}
+        self.sums = np.zeros((4, 0))            # occupied, revenue, stays, stay_nights
+        self.stay_lengths = np.zeros((0, MAX_NIGHTS + 1), dtype=np.int64)
+        self.gaps = np.zeros((0, MAX_NIGHTS + 1), dtype=np.int64)
+        self.nightly_rates = np.zeros((0, len(RATE_BUCKETS)), dtype=np.int64)
+
+    def codes(self, keys: List) -> np.ndarray:
+        index = self.index
+        codes = np.fromiter((index.setdefault(key, len(index)) for key in keys),
+                            dtype=np.int64, count=len(keys))
+        grow = len(index) - self.sums.shape[1]
+        if grow > 0:
+            self.sums = np.pad(self.sums, ((0, 0), (0, grow)))
+            self.stay_lengths = np.pad(self.stay_lengths, ((0, grow), (0, 0)))
+            self.gaps = np.pad(self.gaps, ((0, grow), (0, 0)))
+            self.nightly_rates = np.pad(self.nightly_rates, ((0, grow), (0, 0)))
+        return codes
+
+    def count(self, histogram: np.ndarray, codes: np.ndarray, bins: np.ndarray):
+        width = histogram.shape[1]
+        flat = np.bincount(codes * width + bins, minlength=histogram.size)
+        histogram += flat.reshape(histogram.shape)
+
+
+def _days(values: List[date]) -> np.ndarray:
+    return np.array(values, dtype='datetime64[D]').astype(np.int64)
+
+
+def occupancy(db: Session, start_date: date, end_date: date, by: str = 'cidade',
+              chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[object, OccupancyStats]:
+    """Occupancy, stay length, nightly rate and gap statistics per `by` group
+    for the nights from start_date to end_date, both inclusive
+
+    Nights follow the revenue rollup: a stay from the 1st to the 4th covers
+    the nights of the 1st, 2nd and 3rd, and same-day stays count one night.
+    Available nights are every hospedagem of the group times the nights in
+    the period. Stay, rate and gap statistics count check-ins in the period.
+    """
+    if by not in OCCUPANCY_DIMENSIONS:
+        raise ValueError(f"Unknown dimension {by!r}; expected one of {sorted(OCCUPANCY_DIMENSIONS)}")
+    dimension = OCCUPANCY_DIMENSIONS[by]
+    first_night = _days([start_date])[0]
+    after_last = _days([end_date])[0] + 1
+    rate_edges = np.array(RATE_BUCKETS)
+    totals = _Accumulator()
+
+    rentals = db.execute(
+        select(Aluguel.hospedagem_id, dimension, Aluguel.data_inicio, Aluguel.data_fim,
+               Aluguel.preco_total)
+        .join(Hospedagem, Hospedagem.hospedagem_id == Aluguel.hospedagem_id)
+        .outerjoin(Endereco, Endereco.endereco_id == Hospedagem.endereco_id)
+        # Looking back MAX_NIGHTS finds the stay before the first one in the
+        # period; older ones only add 0 to the sums
+        .where(overlapping(start_date - timedelta(days=MAX_NIGHTS + 1), end_date, is_partitioned(db)),
+               Aluguel.preco_total.is_not(None))
+        # Ordered per hospedagem so gaps between consecutive stays can be read off
+        .order_by(Aluguel.hospedagem_id, Aluguel.data_inicio)
+        .execution_options(yield_per=chunk_size)
+    )
+    previous_hospedagem, previous_end = None, None
+    for chunk in rentals.partitions():
+        hospedagens, keys, starts, ends, prices = zip(*chunk)
+        codes = totals.codes(list(keys))
+        starts, ends = _days(starts), _days(ends)
+        prices = np.array(prices, dtype=np.float64)
+        nights = np.maximum(ends - starts, 1)
+        stay_ends = starts + nights
+        rates = prices / nights
+
+        overlap = np.clip(np.minimum(stay_ends, after_last) - np.maximum(starts, first_night), 0, None)
+        checked_in = (starts >= first_night) & (starts < after_last)
+        group_count = totals.sums.shape[1]
+        totals.sums[0] += np.bincount(codes, overlap, minlength=group_count)
+        totals.sums[1] += np.bincount(codes, rates * overlap, minlength=group_count)
+        totals.sums[2] += np.bincount(codes, checked_in, minlength=group_count)
+        totals.sums[3] += np.bincount(codes, nights * checked_in, minlength=group_count)
+
+        in_period = codes[checked_in]
+        totals.count(totals.stay_lengths, in_period, np.minimum(nights[checked_in], MAX_NIGHTS))
+        rate_bins = np.minimum(np.searchsorted(rate_edges, rates[checked_in]), len(rate_edges) - 1)
+        totals.count(totals.nightly_rates, in_period, rate_bins)
+
+        # Gap before each stay: from the end of the previous stay of the same
+        # hospedagem, carried over from the previous chunk for the first row
+        hospedagens = np.array(hospedagens, dtype=object)
+        previous_hospedagens = np.concatenate(([previous_hospedagem], hospedagens[:-1]))
+        previous_ends = np.concatenate(([previous_end if previous_end is not None else 0], stay_ends[:-1]))
+        gaps = starts - previous_ends
+        counted = (hospedagens == previous_hospedagens) & checked_in & (gaps >= 0)
+        totals.count(totals.gaps, codes[counted], np.minimum(gaps[counted], MAX_NIGHTS))
+        previous_hospedagem, previous_end = hospedagens[-1], stay_ends[-1]
+
+    capacity = dict(db.execute(
+        select(dimension, func.count(Hospedagem.hospedagem_id))
+        .select_from(Hospedagem)
+        .outerjoin(Endereco, Endereco.endereco_id == Hospedagem.endereco_id)
+        .group_by(dimension)
+    ).all())
+    period = int(after_last - first_night)
+    empty = np.zeros(MAX_NIGHTS + 1, dtype=np.int64)
+    result = {}
+    for key in capacity.keys() | totals.index.keys():
+        code = totals.index.get(key)
+        occupied, revenue, stays, stay_nights = (
+            totals.sums[:, code] if code is not None else (0, 0.0, 0, 0)
+        )
+        result[key] = OccupancyStats(
+            hospedagens=capacity.get(key, 0),
+            available_nights=capacity.get(key, 0) * period,
+            occupied_nights=int(occupied),
+            revenue=float(revenue),
+            stays=int(stays),
+            stay_nights=int(stay_nights),
+            stay_lengths=totals.stay_lengths[code] if code is not None else empty,
+            gaps=totals.gaps[code] if code is not None else empty,
+            nightly_rates=(totals.nightly_rates[code] if code is not None
+                           else np.zeros(len(RATE_BUCKETS), dtype=np.int64)),
+        )
+    return result
@@ -0,0 +1,175 @@
+"""Compare the asyncio repositories against sync repositories on a thread pool
+
+Usage:
+    python benchmarks/bench_async_repositories.py                  # SQLite temp file
+    python benchmarks/bench_async_repositories.py --mysql          # docker-compose MySQL
+    python benchmarks/bench_async_repositories.py --url <url> --concurrency 64 --requests 5000
+
+Each request opens its own session, loads a hospedagem with `get_by_id` and
+checks its availability for a week, the way a web handler would. The
+thread-pool run is what the web tier does today: `asyncio.to_thread` around
+the synchronous repositories, with as many workers as concurrent requests.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete
+from sqlalchemy.orm import sessionmaker
+
+from database import EngineProfile, make_async_engine, make_engine
+from identifiers import uuid7
+from models import Base, Proprietario, Cliente, Endereco, Hospedagem, Aluguel
+from repositories import AluguelRepository, HospedagemRepository
+
+
+def seed(db, hospedagens: int):
+    parents = {key: uuid7() for key in ('proprietario', 'cliente', 'endereco')}
+    db.add_all([
+        Proprietario(proprietario_id=parents['proprietario'], nome='Bench'),
+        Cliente(cliente_id=parents['cliente'], nome='Bench'),
+        Endereco(endereco_id=parents['endereco'], cidade='Bench'),
+    ])
+    db.flush()
+    ids = [uuid7() for _ in range(hospedagens)]
+    db.add_all(Hospedagem(hospedagem_id=hospedagem_id, endereco_id=parents['endereco'],
+                          proprietario_id=parents['proprietario'], tipo='Casa', ativo=True)
+               for hospedagem_id in ids)
+    db.commit()
+    start = date(2024, 1, 1)
+    AluguelRepository(db).create_many(
+        {
+            'aluguel_id': uuid7(),
+            'cliente_id': parents['cliente'],
+            'hospedagem_id': hospedagem_id,
+            'data_inicio': start + timedelta(weeks=week),
+            'data_fim': start + timedelta(weeks=week, days=3),
+            'preco_total': Decimal('300.00'),
+        }
+        for i, hospedagem_id in enumerate(ids) for week in range(0, 52, 2)
+    )
+    return parents, ids
+
+
+def cleanup(db, parents: dict):
+    db.execute(delete(Aluguel).where(Aluguel.cliente_id == parents['cliente']))
+    db.execute(delete(Hospedagem).where(Hospedagem.proprietario_id == parents['proprietario']))
+    db.execute(delete(Cliente).where(Cliente.cliente_id == parents['cliente']))
+    db.execute(delete(Endereco).where(Endereco.endereco_id == parents['endereco']))
+    db.execute(delete(Proprietario).where(Proprietario.proprietario_id == parents['proprietario']))
+    db.commit()
+
+
+def workload(ids, requests: int, seed_value: int = 42):
+    rng = random.Random(seed_value)
+    for _ in range(requests):
+        check_in = date(2024, 1, 1) + timedelta(days=rng.randrange(350))
+        yield rng.choice(ids), check_in, check_in + timedelta(days=7)
+
+
+def report(label: str, latencies, elapsed: float):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<28} {len(latencies) / elapsed:>9.0f} req/s  "
+          f"p50 {latencies[len(latencies) // 2] * 1000:7.2f}ms  p95 {p95 * 1000:7.2f}ms")
+
+
+async def run_threads(Session, requests, concurrency: int):
+    def handle(hospedagem_id, check_in, check_out):
+        with Session() as db:
+            HospedagemRepository(db).get_by_id(hospedagem_id)
+            AluguelRepository(db).check_availability(hospedagem_id, check_in, check_out)
+
+    limit = asyncio.Semaphore(concurrency)
+
+    async def request(args):
+        async with limit:
+            started = time.perf_counter()
+            await asyncio.to_thread(handle, *args)
+            return time.perf_counter() - started
+
+    # to_thread uses the loop's default executor; size it like the web tier would
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(concurrency))
+    return await asyncio.gather(*(request(args) for args in requests))
+
+
+async def run_async(AsyncSessionLocal, requests, concurrency: int):
+    from repositories.aio import AsyncAluguelRepository, AsyncHospedagemRepository
+
+    limit = asyncio.Semaphore(concurrency)
+
+    async def request(hospedagem_id, check_in, check_out):
+        async with limit:
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as db:
+                await AsyncHospedagemRepository(db).get_by_id(hospedagem_id)
+                await AsyncAluguelRepository(db).check_availability(hospedagem_id, check_in, check_out)
+            return time.perf_counter() - started
+
+    return await asyncio.gather(*(request(*args) for args in requests))
+
+
+def timed(label: str, run):
+    started = time.perf_counter()
+    latencies = asyncio.run(run())
+    report(label, latencies, time.perf_counter() - started)
+
+
+def run(url: str, concurrency: int, requests: int, hospedagens: int):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    # Both sides get a pool as large as the concurrency, so neither waits on it
+    profile = EngineProfile(pool_size=concurrency, max_overflow=0)
+    engine = make_engine(url, profile)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_engine = make_async_engine(url, profile)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+    print(f"{requests} requests, {concurrency} concurrent")
+    with Session() as db:
+        parents, ids = seed(db, hospedagens)
+    try:
+        load = list(workload(ids, requests))
+        timed('sync + asyncio.to_thread', lambda: run_threads(Session, load, concurrency))
+        timed('AsyncSession', lambda: run_async(AsyncSessionLocal, load, concurrency))
+    finally:
+        with Session() as db:
+            cleanup(db, parents)
+        engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='SQLAlchemy database URL (sync driver; the async one is derived)')
+    parser.add_argument('--mysql', action='store_true',
+                        help='use the DB_* environment (docker-compose MySQL)')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--hospedagens', type=int, default=200)
+    args = parser.parse_args()
+
+    if args.mysql:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+    elif args.url:
+        url = args.url
+    else:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+    run(url, args.concurrency, args.requests, args.hospedagens)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Compare the two-step availability search with HospedagemRepository.search_available
+
+Usage:
+    python benchmarks/bench_available_search.py                      # 100k hospedagens on SQLite
+    python benchmarks/bench_available_search.py --hospedagens 20000 --url sqlite:///bench.db
+
+The two-step approach is what callers did before: `search({'cidade': ...})`
+followed by `check_availability` for every result. The dataset is generated
+with fixtures/generate_dataset.py when the target database is empty.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(APP_DIR)
+sys.path.append(os.path.join(APP_DIR, 'fixtures'))
+
+from sqlalchemy import create_engine, event, func, inspect
+from sqlalchemy.orm import sessionmaker
+
+from generate_dataset import DatasetPlan, generate
+from models import Endereco, Hospedagem
+from repositories import AluguelRepository, HospedagemRepository
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self)
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def two_step(db, cidade, start, end, limit):
+    hospedagens = HospedagemRepository(db).search({'cidade': cidade, 'ativo': True}, limit=10 ** 9)
+    alugueis = AluguelRepository(db)
+    available = [
+        hospedagem for hospedagem in hospedagens
+        if alugueis.check_availability(hospedagem.hospedagem_id, start, end)
+    ]
+    return available[:limit]
+
+
+def single_query(db, cidade, start, end, limit):
+    return HospedagemRepository(db).search_available(start, end, cidade=cidade, limit=limit).items
+
+
+def measure(label, Session, counter, fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        with Session() as db:
+            counter.count = 0
+            started = time.perf_counter()
+            result = fn(db)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"{label:<18} median {timings[len(timings) // 2] * 1000:9.1f} ms  "
+          f"{counter.count:>6} statements  {len(result):>4} results")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='SQLAlchemy database URL')
+    parser.add_argument('--hospedagens', type=int, default=100000)
+    parser.add_argument('--rentals-per-hospedagem', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--start', type=date.fromisoformat, default=date(2020, 3, 1))
+    parser.add_argument('--end', type=date.fromisoformat, default=date(2020, 3, 8))
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    empty = not inspect(engine).has_table('hospedagens')
+    if not empty:
+        with Session() as db:
+            empty = db.query(Hospedagem).count() == 0
+    if empty:
+        generate(url, DatasetPlan(
+            rentals=args.hospedagens * args.rentals_per_hospedagem,
+            rentals_per_hospedagem=args.rentals_per_hospedagem
+        ), workers=args.workers)
+
+    with Session() as db:
+        cidade = db.query(Endereco.cidade).group_by(Endereco.cidade).order_by(
+            func.count().desc()
+        ).first()[0]
+        total = db.query(Hospedagem).count()
+    print(f"{total} hospedagens, cidade={cidade!r}, {args.start} to {args.end}")
+
+    counter = StatementCounter(engine)
+    measure('two-step', Session, counter,
+            lambda db: two_step(db, cidade, args.start, args.end, args.limit), args.repeat)
+    measure('search_available', Session, counter,
+            lambda db: single_query(db, cidade, args.start, args.end, args.limit), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Compare per-row `create` against `create_many` / `upsert_many`
+
+Usage:
+    python benchmarks/bench_bulk_writes.py                  # SQLite temp file
+    python benchmarks/bench_bulk_writes.py --mysql          # docker-compose MySQL
+    python benchmarks/bench_bulk_writes.py --url <url> --rows 50000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+
+from identifiers import uuid7
+from models import Base, Proprietario, Cliente, Endereco, Hospedagem, Aluguel
+from repositories import AluguelRepository
+
+
+def seed_parents(db):
+    ids = {key: uuid7() for key in ('proprietario', 'cliente', 'endereco', 'hospedagem')}
+    db.add_all([
+        Proprietario(proprietario_id=ids['proprietario'], nome='Bench'),
+        Cliente(cliente_id=ids['cliente'], nome='Bench'),
+        Endereco(endereco_id=ids['endereco'], cidade='Bench'),
+    ])
+    db.flush()
+    db.add(Hospedagem(hospedagem_id=ids['hospedagem'], endereco_id=ids['endereco'],
+                      proprietario_id=ids['proprietario'], tipo='Casa', ativo=True))
+    db.commit()
+    return ids
+
+
+def make_rows(ids, count):
+    start = date(2020, 1, 1)
+    for i in range(count):
+        yield {
+            'aluguel_id': uuid7(),
+            'cliente_id': ids['cliente'],
+            'hospedagem_id': ids['hospedagem'],
+            'data_inicio': start + timedelta(days=i),
+            'data_fim': start + timedelta(days=i + 1),
+            'preco_total': Decimal('100.00'),
+        }
+
+
+def timed(label, rows, fn):
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<32} {rows:>8} rows  {elapsed:8.3f}s  {rows / elapsed:>10.0f} rows/s")
+
+
+def run(url: str, rows: int, batch_size: int):
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+    with Session() as db:
+        ids = seed_parents(db)
+        repo = AluguelRepository(db)
+
+        per_row = list(make_rows(ids, rows))
+        timed('create (per row)', rows,
+              lambda: [repo.create(Aluguel(**row)) for row in per_row])
+        db.execute(delete(Aluguel).where(Aluguel.hospedagem_id == ids['hospedagem']))
+        db.commit()
+
+        timed(f'create_many (batch={batch_size})', rows,
+              lambda: repo.create_many(make_rows(ids, rows), batch_size=batch_size))
+
+        existing = [row | {'preco_total': Decimal('120.00')} for row in per_row]
+        repo.create_many(per_row, batch_size=batch_size)
+        timed(f'upsert_many (batch={batch_size})', rows,
+              lambda: repo.upsert_many(existing, batch_size=batch_size))
+
+        db.execute(delete(Aluguel).where(Aluguel.hospedagem_id == ids['hospedagem']))
+        db.execute(delete(Hospedagem).where(Hospedagem.hospedagem_id == ids['hospedagem']))
+        db.execute(delete(Cliente).where(Cliente.cliente_id == ids['cliente']))
+        db.execute(delete(Endereco).where(Endereco.endereco_id == ids['endereco']))
+        db.execute(delete(Proprietario).where(Proprietario.proprietario_id == ids['proprietario']))
+        db.commit()
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='SQLAlchemy database URL')
+    parser.add_argument('--mysql', action='store_true',
+                        help='use the DB_* environment (docker-compose MySQL)')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.mysql:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+    elif args.url:
+        url = args.url
+    else:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+    run(url, args.rows, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Look up the cliente and hospedagem of each review: get_by_id per row against a DataLoader
+
+Usage:
+    python benchmarks/bench_dataloader.py                   # SQLite, 100k rentals
+    python benchmarks/bench_dataloader.py --mysql --reviews 2000
+
+Uses the datasets of bench_repositories.py. `get_by_id` calls
+ClienteRepository.get_by_id and HospedagemRepository.get_by_id once per
+review, the loop the loaders replace; `DataLoader` queues the keys and
+fetches them with one get_by_ids per entity type; `AsyncDataLoader` does
+the same from coroutines gathered on an AsyncSession (SQLite only, through
+aiosqlite). Statements are counted on the engine.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import sessionmaker
+
+from bench_repositories import SCALES, ensure_dataset
+from database import PROFILES, make_engine
+from models import Avaliacao, Cliente, Hospedagem
+from repositories import ClienteRepository, DataLoader, HospedagemRepository
+
+
+def per_row(db, reviews):
+    clientes, hospedagens = ClienteRepository(db), HospedagemRepository(db)
+    return [(clientes.get_by_id(cliente_id), hospedagens.get_by_id(hospedagem_id))
+            for cliente_id, hospedagem_id in reviews]
+
+
+def loader(db, reviews):
+    batches = DataLoader(db)
+    pending = [(batches.load(Cliente, cliente_id), batches.load(Hospedagem, hospedagem_id))
+               for cliente_id, hospedagem_id in reviews]
+    return [(cliente.get(), hospedagem.get()) for cliente, hospedagem in pending]
+
+
+def async_loader(url, reviews):
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from repositories.aio import AsyncDataLoader
+
+    async def run():
+        engine = create_async_engine(url.replace('sqlite://', 'sqlite+aiosqlite://', 1))
+        statements = count_statements(engine.sync_engine)
+        async with AsyncSession(engine) as db:
+            batches = AsyncDataLoader(db)
+
+            async def one(cliente_id, hospedagem_id):
+                return await batches.load(Cliente, cliente_id), await batches.load(Hospedagem, hospedagem_id)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(*review) for review in reviews))
+            elapsed = time.perf_counter() - started
+        await engine.dispose()
+        return elapsed, statements[0]
+    return asyncio.run(run())
+
+
+def count_statements(engine):
+    counter = [0]
+
+    def count(*_):
+        counter[0] += 1
+    event.listen(engine, 'before_cursor_execute', count)
+    return counter
+
+
+def run(url: str, count: int):
+    engine = make_engine(url, PROFILES['batch'])
+    statements = count_statements(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        reviews = db.execute(select(Avaliacao.cliente_id, Avaliacao.hospedagem_id)
+                             .order_by(Avaliacao.avaliacao_id).limit(count)).all()
+
+    print(f"{len(reviews)} reviews, {len({r[0] for r in reviews})} clientes, "
+          f"{len({r[1] for r in reviews})} hospedagens on {engine.dialect.name}")
+    print(f"{'mode':<16} {'ms':>9} {'statements':>11}")
+    for name, mode in (('get_by_id', per_row), ('DataLoader', loader)):
+        with Session() as db:
+            statements[0] = 0
+            started = time.perf_counter()
+            mode(db, reviews)
+            elapsed = time.perf_counter() - started
+        print(f"{name:<16} {elapsed * 1000:>9.1f} {statements[0]:>11}")
+    if engine.dialect.name == 'sqlite':
+        elapsed, issued = async_loader(url, reviews)
+        print(f"{'AsyncDataLoader':<16} {elapsed * 1000:>9.1f} {issued:>11}")
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES, key=SCALES.get), default='100k')
+    parser.add_argument('--url', help='SQLAlchemy database URL (seeded when empty)')
+    parser.add_argument('--mysql', action='store_true',
+                        help='use the DB_* environment (docker-compose MySQL)')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'insight_places_bench'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--reviews', type=int, default=500)
+    args = parser.parse_args()
+
+    if args.mysql:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+    elif args.url:
+        url = args.url
+    else:
+        os.makedirs(args.data_dir, exist_ok=True)
+        url = f"sqlite:///{os.path.join(args.data_dir, f'sqlite-{args.scale}.db')}"
+    ensure_dataset(url, SCALES[args.scale], args.workers)
+
+    run(url, args.reviews)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Insert throughput and index size of UUID4 strings against UUIDv7 in BINARY(16)
+
+Usage:
+    python benchmarks/bench_keys.py                      # SQLite temp file, 200k rows
+    python benchmarks/bench_keys.py --mysql --rows 2000000
+    python benchmarks/bench_keys.py --url <url> --batch-size 5000
+
+Each layout gets its own copy of the alugueis table: the primary key, an
+index on cliente_id and the (hospedagem_id, data_inicio, data_fim) index.
+Rows are inserted in batches, one transaction each. Sizes come from dbstat
+on SQLite and from information_schema on MySQL; the copies are dropped at
+the end.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import (Column, Date, Index, MetaData, Numeric, String, Table, create_engine,
+                        insert, text)
+
+from identifiers import BinaryUUID, uuid7
+
+LAYOUTS = {
+    'uuid4 VARCHAR(255)': (lambda: String(255), lambda: str(uuid.uuid4())),
+    'uuid7 VARCHAR(255)': (lambda: String(255), uuid7),
+    'uuid7 BINARY(16)': (BinaryUUID, uuid7),
+}
+
+
+def make_table(metadata: MetaData, number: int, key_type) -> Table:
+    name = f'bench_keys_{number}'
+    return Table(
+        name, metadata,
+        Column('aluguel_id', key_type(), primary_key=True),
+        Column('cliente_id', key_type()),
+        Column('hospedagem_id', key_type()),
+        Column('data_inicio', Date),
+        Column('data_fim', Date),
+        Column('preco_total', Numeric(10, 2)),
+        Index(f'ix_{name}_cliente_id', 'cliente_id'),
+        Index(f'ix_{name}_hospedagem_id_periodo', 'hospedagem_id', 'data_inicio', 'data_fim'),
+    )
+
+
+def rows(new_key, count, clientes, hospedagens, rng):
+    start = date(2020, 1, 1)
+    for _ in range(count):
+        check_in = start + timedelta(days=rng.randrange(1500))
+        yield {
+            'aluguel_id': new_key(),
+            'cliente_id': rng.choice(clientes),
+            'hospedagem_id': rng.choice(hospedagens),
+            'data_inicio': check_in,
+            'data_fim': check_in + timedelta(days=rng.randint(1, 7)),
+            'preco_total': Decimal(rng.randrange(100, 5000)),
+        }
+
+
+def sizes(connection, table: Table) -> dict:
+    """Bytes of the table (clustered primary key) and of its secondary indexes"""
+    if connection.dialect.name == 'mysql':
+        connection.execute(text(f'ANALYZE TABLE {table.name}'))
+        data, indexes = connection.execute(text(
+            'SELECT data_length, index_length FROM information_schema.TABLES '
+            'WHERE table_schema = DATABASE() AND table_name = :name'
+        ), {'name': table.name}).one()
+        return {'table': int(data), 'indexes': int(indexes)}
+    pages = dict(connection.execute(text('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')).all())
+    return {
+        # SQLite keeps the rows in a rowid tree and the primary key in its own index
+        'table': pages.get(table.name, 0) + pages.get(f'sqlite_autoindex_{table.name}_1', 0),
+        'indexes': sum(pages.get(index.name, 0) for index in table.indexes),
+    }
+
+
+def run(url: str, count: int, batch_size: int, seed: int):
+    engine = create_engine(url)
+    metadata = MetaData()
+    tables = {name: make_table(metadata, number, key_type)
+              for number, (name, (key_type, _)) in enumerate(LAYOUTS.items())}
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    print(f"{count} rows in batches of {batch_size} on {engine.dialect.name}")
+    print(f"{'layout':<20} {'rows/s':>10} {'table MB':>9} {'indexes MB':>11} {'total MB':>9}")
+    try:
+        for name, (key_type, new_key) in LAYOUTS.items():
+            rng = random.Random(seed)
+            clientes = [new_key() for _ in range(max(1, count // 5))]
+            hospedagens = [new_key() for _ in range(max(1, count // 40))]
+            table = tables[name]
+            generated = rows(new_key, count, clientes, hospedagens, rng)
+            elapsed = 0.0
+            while True:
+                batch = [row for _, row in zip(range(batch_size), generated)]
+                if not batch:
+                    break
+                started = time.perf_counter()
+                with engine.begin() as connection:
+                    connection.execute(insert(table), batch)
+                elapsed += time.perf_counter() - started
+            with engine.connect() as connection:
+                measured = sizes(connection, table)
+            print(f"{name:<20} {count / elapsed:>10.0f} {measured['table'] / 2**20:>9.1f} "
+                  f"{measured['indexes'] / 2**20:>11.1f} "
+                  f"{(measured['table'] + measured['indexes']) / 2**20:>9.1f}")
+    finally:
+        metadata.drop_all(engine)
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='SQLAlchemy database URL')
+    parser.add_argument('--mysql', action='store_true',
+                        help='use the DB_* environment (docker-compose MySQL)')
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.mysql:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+    elif args.url:
+        url = args.url
+    else:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_keys.db')}"
+
+    run(url, args.rows, args.batch_size, args.seed)
+
+
+if __name__ == '__main__':
+    main()
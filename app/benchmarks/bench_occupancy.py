@@ -0,0 +1,118 @@
+"""Compare occupancy per group computed in a Python loop with analytics.occupancy
+
+Usage:
+    python benchmarks/bench_occupancy.py                      # SQLite, 100k rentals
+    python benchmarks/bench_occupancy.py --scale 1m --by tipo
+    python benchmarks/bench_occupancy.py --mysql --chunk-size 50000
+
+Uses the datasets of bench_repositories.py and the whole rental history as
+the period. The loop walks the entities of get_rentals_in_period night by
+night; both sides must agree on the occupied nights of every group. Peak
+memory is measured with tracemalloc.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from analytics import DEFAULT_CHUNK_SIZE, OCCUPANCY_DIMENSIONS
+from bench_repositories import SCALES, ensure_dataset
+from database import PROFILES, make_engine
+from models import Aluguel
+from repositories import AluguelRepository
+
+
+def occupied_by_loop(db, first_day, last_day, by):
+    keys = {
+        'hospedagem': lambda aluguel: aluguel.hospedagem_id,
+        'cidade': lambda aluguel: aluguel.hospedagem.endereco.cidade,
+        'tipo': lambda aluguel: aluguel.hospedagem.tipo,
+        'proprietario': lambda aluguel: aluguel.hospedagem.proprietario_id,
+    }
+    occupied = Counter()
+    for aluguel in AluguelRepository(db).get_rentals_in_period(first_day, last_day,
+                                                               load='relations'):
+        key = keys[by](aluguel)
+        nights = max((aluguel.data_fim - aluguel.data_inicio).days, 1)
+        for night in range(nights):
+            if first_day <= aluguel.data_inicio + timedelta(days=night) <= last_day:
+                occupied[key] += 1
+    return occupied
+
+
+def occupied_by_numpy(db, first_day, last_day, by, chunk_size):
+    stats = AluguelRepository(db).get_occupancy(first_day, last_day, by, chunk_size)
+    return Counter({key: group.occupied_nights for key, group in stats.items()
+                    if group.occupied_nights})
+
+
+def measure(Session, call):
+    with Session() as db:
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = call(db)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run(url: str, by: str, chunk_size: int):
+    engine = make_engine(url, PROFILES['batch'])
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        first_day, last_day, rentals = db.execute(select(
+            func.min(Aluguel.data_inicio), func.max(Aluguel.data_fim), func.count(Aluguel.aluguel_id)
+        )).one()
+
+    expected, loop_time, loop_peak = measure(
+        Session, lambda db: occupied_by_loop(db, first_day, last_day, by))
+    result, numpy_time, numpy_peak = measure(
+        Session, lambda db: occupied_by_numpy(db, first_day, last_day, by, chunk_size))
+    if result != expected:
+        raise SystemExit("Occupied nights differ between the loop and analytics.occupancy")
+
+    print(f"{rentals} rentals, {first_day} to {last_day}, {len(result)} groups by {by}")
+    print(f"{'method':<24} {'seconds':>9} {'peak MB':>9}")
+    print(f"{'python loop':<24} {loop_time:>9.2f} {loop_peak / 2**20:>9.1f}")
+    print(f"{'numpy, chunks of %d' % chunk_size:<24} {numpy_time:>9.2f} {numpy_peak / 2**20:>9.1f}")
+    print(f"speedup {loop_time / numpy_time:.1f}x")
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES, key=SCALES.get), default='100k')
+    parser.add_argument('--url', help='SQLAlchemy database URL (seeded when empty)')
+    parser.add_argument('--mysql', action='store_true',
+                        help='use the DB_* environment (docker-compose MySQL)')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'insight_places_bench'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--by', choices=sorted(OCCUPANCY_DIMENSIONS), default='cidade')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.mysql:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+    elif args.url:
+        url = args.url
+    else:
+        os.makedirs(args.data_dir, exist_ok=True)
+        url = f"sqlite:///{os.path.join(args.data_dir, f'sqlite-{args.scale}.db')}"
+    ensure_dataset(url, SCALES[args.scale], args.workers)
+
+    run(url, args.by, args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Compare listing entities against `columns=` projections: time and memory per row
+
+Usage:
+    python benchmarks/bench_projections.py                       # SQLite, 100k rentals
+    python benchmarks/bench_projections.py --mysql --limit 50000 # docker-compose MySQL
+    python benchmarks/bench_projections.py --url <url> --repeat 10
+
+Uses the datasets of bench_repositories.py. Time is the best of --repeat
+calls; memory is what the returned list keeps alive, per row, measured with
+tracemalloc on a fresh session.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from bench_repositories import SCALES, ensure_dataset
+from database import PROFILES, make_engine
+from models import Aluguel
+from repositories import AluguelRepository, ClienteRepository, HospedagemRepository
+
+
+def cases(first_day, last_day, limit):
+    return {
+        'AluguelRepository.get_all': (
+            lambda db, columns: AluguelRepository(db).get_all(limit=limit, columns=columns),
+            ('aluguel_id', 'data_inicio', 'preco_total')),
+        'AluguelRepository.get_rentals_in_period': (
+            lambda db, columns: AluguelRepository(db).get_rentals_in_period(first_day, last_day,
+                                                                            columns=columns),
+            ('aluguel_id', 'data_inicio', 'data_fim')),
+        'HospedagemRepository.get_all': (
+            lambda db, columns: HospedagemRepository(db).get_all(limit=limit, columns=columns),
+            ('hospedagem_id', 'tipo')),
+        'ClienteRepository.search': (
+            lambda db, columns: ClienteRepository(db).search('a', limit=limit, columns=columns),
+            ('cliente_id', 'nome', 'contato')),
+    }
+
+
+def best_time(Session, call, columns, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        with Session() as db:
+            started = time.perf_counter()
+            rows = call(db, columns)
+            best = min(best, time.perf_counter() - started)
+    return best, len(rows)
+
+
+def bytes_per_row(Session, call, columns):
+    with Session() as db:
+        tracemalloc.start()
+        rows = call(db, columns)
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return retained / max(len(rows), 1)
+
+
+def run(url: str, limit: int, repeat: int):
+    engine = make_engine(url, PROFILES['batch'])
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        first_day, last_day = db.execute(select(func.min(Aluguel.data_inicio),
+                                                func.max(Aluguel.data_fim))).one()
+
+    print(f"{'method':<42} {'rows':>7} {'entity ms':>10} {'columns ms':>10} {'speedup':>8} "
+          f"{'entity B/row':>13} {'columns B/row':>13} {'smaller':>8}")
+    for name, (call, columns) in cases(first_day, last_day, limit).items():
+        entity_time, rows = best_time(Session, call, None, repeat)
+        projected_time, _ = best_time(Session, call, columns, repeat)
+        entity_bytes = bytes_per_row(Session, call, None)
+        projected_bytes = bytes_per_row(Session, call, columns)
+        print(f"{name:<42} {rows:>7} {entity_time * 1000:>10.1f} {projected_time * 1000:>10.1f} "
+              f"{entity_time / projected_time:>7.1f}x {entity_bytes:>13.0f} {projected_bytes:>13.0f} "
+              f"{entity_bytes / projected_bytes:>7.1f}x")
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES, key=SCALES.get), default='100k')
+    parser.add_argument('--url', help='SQLAlchemy database URL (seeded when empty)')
+    parser.add_argument('--mysql', action='store_true',
+                        help='use the DB_* environment (docker-compose MySQL)')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'insight_places_bench'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--limit', type=int, default=20000, help='rows per listing')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.mysql:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+    elif args.url:
+        url = args.url
+    else:
+        os.makedirs(args.data_dir, exist_ok=True)
+        url = f"sqlite:///{os.path.join(args.data_dir, f'sqlite-{args.scale}.db')}"
+    ensure_dataset(url, SCALES[args.scale], args.workers)
+
+    run(url, args.limit, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,472 @@
+"""Time every public repository method and gate on regressions against a baseline
+
+Usage:
+    python benchmarks/bench_repositories.py --scale 10k                 # SQLite, generated once
+    python benchmarks/bench_repositories.py --scale 1m --mysql          # docker-compose MySQL
+    python benchmarks/bench_repositories.py --scale 10k --save-baseline baselines/sqlite-10k.json
+    python benchmarks/bench_repositories.py --scale 10k --baseline baselines/sqlite-10k.json
+
+SQLite datasets are generated with fixtures/generate_dataset.py into
+--data-dir and reused by later runs at the same scale; other databases are
+seeded only when empty. Every method runs --warmup + --iterations times on
+sampled rows and reports p50/p95/p99 latency and SQL statements per call.
+Writes run inside a UnitOfWork that is rolled back, so the dataset never
+changes. With --baseline the run fails (exit status 1) when a method got
+slower than --threshold on --metric, issues more statements than before,
+started failing, or when a public method has no benchmark.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(APP_DIR)
+sys.path.append(os.path.join(APP_DIR, 'fixtures'))
+
+import sqlalchemy
+from sqlalchemy import func, inspect, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from database import PROFILES, make_engine
+from identifiers import uuid7
+from instrumentation import Instrumentation
+from models import Proprietario, Cliente, Endereco, Hospedagem, Aluguel, Avaliacao
+from repositories import (
+    ProprietarioRepository, ClienteRepository, EnderecoRepository,
+    HospedagemRepository, AluguelRepository, AvaliacaoRepository, UnitOfWork
+)
+
+REPOSITORIES = (ProprietarioRepository, ClienteRepository, EnderecoRepository,
+                HospedagemRepository, AluguelRepository, AvaliacaoRepository)
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+BATCH = 100
+
+
+@dataclass
+class Path:
+    """How to call one method: `call(db, prepared)`, after `prepare(db)` for writes"""
+    call: Callable[[Session, Any], Any]
+    write: bool = False
+    prepare: Optional[Callable[[Session], Any]] = None
+
+
+def new_id() -> str:
+    return uuid7()
+
+
+def added(db: Session, objects: List) -> List[str]:
+    # Untimed setup for delete paths: rows that exist only inside the unit of work
+    db.add_all(objects)
+    db.flush()
+    return [inspect(obj).identity[0] for obj in objects]
+
+
+def sample(db: Session) -> Dict[str, Any]:
+    """Rows the benchmarks read and write, the same on every run at one scale"""
+    first = lambda model, key: db.scalars(select(model).order_by(key).limit(1)).first()
+    hospedagem = db.scalars(
+        select(Hospedagem).join(Aluguel, Aluguel.hospedagem_id == Hospedagem.hospedagem_id)
+        .order_by(Hospedagem.hospedagem_id).limit(1)
+    ).first()
+    rows = {
+        'proprietario': first(Proprietario, Proprietario.proprietario_id),
+        'cliente': first(Cliente, Cliente.cliente_id),
+        'hospedagem': hospedagem,
+        'aluguel': db.scalars(select(Aluguel).where(Aluguel.hospedagem_id == hospedagem.hospedagem_id)
+                              .order_by(Aluguel.aluguel_id).limit(1)).first() if hospedagem else None,
+        'avaliacao': first(Avaliacao, Avaliacao.avaliacao_id),
+    }
+    if None in rows.values():
+        raise SystemExit('The database needs at least one row per table')
+    rows['endereco'] = db.get(Endereco, hospedagem.endereco_id)
+    rows['proprietario'] = db.get(Proprietario, hospedagem.proprietario_id)
+    rows['cidade'] = db.scalar(
+        select(Endereco.cidade).group_by(Endereco.cidade).order_by(func.count().desc()).limit(1)
+    )
+    for model, key in (('proprietarios', Proprietario), ('clientes', Cliente), ('enderecos', Endereco),
+                       ('hospedagens', Hospedagem), ('alugueis', Aluguel), ('avaliacoes', Avaliacao)):
+        pk = inspect(key).primary_key[0]
+        rows[f'{model}_batch'] = list(db.scalars(select(pk).order_by(pk).limit(BATCH)))
+    db.expunge_all()
+    return rows
+
+
+def paths(s: Dict[str, Any]) -> Dict[str, Path]:
+    proprietario, cliente, endereco = s['proprietario'], s['cliente'], s['endereco']
+    hospedagem, aluguel, avaliacao = s['hospedagem'], s['aluguel'], s['avaliacao']
+    proprietario_id, cliente_id = proprietario.proprietario_id, cliente.cliente_id
+    endereco_id, hospedagem_id = endereco.endereco_id, hospedagem.hospedagem_id
+    start, end = aluguel.data_inicio, aluguel.data_inicio + timedelta(days=7)
+    year, month = start.year, start.month
+    future = date(2099, 1, 1)
+
+    def new_proprietario():
+        return Proprietario(proprietario_id=new_id(), nome='Bench Proprietario')
+
+    def new_cliente():
+        return Cliente(cliente_id=new_id(), nome='Bench Cliente', cpf='00000000000')
+
+    def new_endereco():
+        return Endereco(endereco_id=new_id(), rua='Rua Bench', cidade=s['cidade'], estado='SP',
+                        cep='01310-100')
+
+    def new_hospedagem():
+        return Hospedagem(hospedagem_id=new_id(), tipo='Casa', endereco_id=endereco_id,
+                          proprietario_id=proprietario_id, ativo=True)
+
+    def new_aluguel(offset: int = 0):
+        check_in = future + timedelta(days=10 * offset)
+        return Aluguel(aluguel_id=new_id(), cliente_id=cliente_id, hospedagem_id=hospedagem_id,
+                       data_inicio=check_in, data_fim=check_in + timedelta(days=3),
+                       preco_total=Decimal('450.00'))
+
+    def new_avaliacao():
+        return Avaliacao(avaliacao_id=new_id(), cliente_id=cliente_id, hospedagem_id=hospedagem_id,
+                         nota=4, comentario='Bench review')
+
+    def rows_of(factory, count=BATCH):
+        return [{column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+                for obj in (factory(i) if factory is new_aluguel else factory() for i in range(count))]
+
+    def stored(model, keys):
+        return lambda db: [
+            {column.key: getattr(obj, column.key) for column in model.__table__.columns}
+            for obj in db.scalars(select(model).where(inspect(model).primary_key[0].in_(keys)))
+        ]
+
+    def write(call, prepare=None):
+        return Path(call, write=True, prepare=prepare)
+
+    def read(call):
+        return Path(lambda db, _: call(db))
+
+    return {
+        # Proprietario
+        'ProprietarioRepository.create': write(lambda db, _: ProprietarioRepository(db).create(new_proprietario())),
+        'ProprietarioRepository.create_many': write(lambda db, _: ProprietarioRepository(db).create_many(rows_of(new_proprietario))),
+        'ProprietarioRepository.upsert_many': write(lambda db, rows: ProprietarioRepository(db).upsert_many(rows),
+                                                    stored(Proprietario, s['proprietarios_batch'])),
+        'ProprietarioRepository.update': write(lambda db, _: ProprietarioRepository(db).update(proprietario_id, {'contato': 'bench'})),
+        'ProprietarioRepository.update_where': write(lambda db, _: ProprietarioRepository(db).update_where({'proprietario_id': s['proprietarios_batch']}, {'contato': 'bench'})),
+        'ProprietarioRepository.delete': write(lambda db, ids: ProprietarioRepository(db).delete(ids[0]),
+                                               lambda db: added(db, [new_proprietario()])),
+        'ProprietarioRepository.delete_by_ids': write(lambda db, ids: ProprietarioRepository(db).delete_by_ids(ids),
+                                                      lambda db: added(db, [new_proprietario() for _ in range(10)])),
+        'ProprietarioRepository.get_by_id': read(lambda db: ProprietarioRepository(db).get_by_id(proprietario_id)),
+        'ProprietarioRepository.get_by_ids': read(lambda db: ProprietarioRepository(db).get_by_ids(s['proprietarios_batch'])),
+        'ProprietarioRepository.get_all': read(lambda db: ProprietarioRepository(db).get_all()),
+        'ProprietarioRepository.get_all_page': read(lambda db: ProprietarioRepository(db).get_all_page()),
+        'ProprietarioRepository.get_by_cpf_cnpj': read(lambda db: ProprietarioRepository(db).get_by_cpf_cnpj(proprietario.cpf_cnpj)),
+        'ProprietarioRepository.search_by_name': read(lambda db: ProprietarioRepository(db).search_by_name(proprietario.nome[:4])),
+        'ProprietarioRepository.search_by_name_ranked': read(lambda db: ProprietarioRepository(db).search_by_name_ranked(proprietario.nome[:4])),
+        'ProprietarioRepository.search_by_name_page': read(lambda db: ProprietarioRepository(db).search_by_name_page(proprietario.nome[:4])),
+        # Cliente
+        'ClienteRepository.create': write(lambda db, _: ClienteRepository(db).create(new_cliente())),
+        'ClienteRepository.create_many': write(lambda db, _: ClienteRepository(db).create_many(rows_of(new_cliente))),
+        'ClienteRepository.upsert_many': write(lambda db, rows: ClienteRepository(db).upsert_many(rows),
+                                               stored(Cliente, s['clientes_batch'])),
+        'ClienteRepository.update': write(lambda db, _: ClienteRepository(db).update(cliente_id, {'contato': 'bench'})),
+        'ClienteRepository.update_where': write(lambda db, _: ClienteRepository(db).update_where({'cliente_id': s['clientes_batch']}, {'contato': 'bench'})),
+        'ClienteRepository.delete': write(lambda db, ids: ClienteRepository(db).delete(ids[0]),
+                                          lambda db: added(db, [new_cliente()])),
+        'ClienteRepository.delete_by_ids': write(lambda db, ids: ClienteRepository(db).delete_by_ids(ids),
+                                                 lambda db: added(db, [new_cliente() for _ in range(10)])),
+        'ClienteRepository.get_by_id': read(lambda db: ClienteRepository(db).get_by_id(cliente_id)),
+        'ClienteRepository.get_by_ids': read(lambda db: ClienteRepository(db).get_by_ids(s['clientes_batch'])),
+        'ClienteRepository.get_all': read(lambda db: ClienteRepository(db).get_all()),
+        'ClienteRepository.get_all_page': read(lambda db: ClienteRepository(db).get_all_page()),
+        'ClienteRepository.get_by_cpf': read(lambda db: ClienteRepository(db).get_by_cpf(cliente.cpf)),
+        'ClienteRepository.search': read(lambda db: ClienteRepository(db).search(cliente.nome[:4])),
+        'ClienteRepository.search_ranked': read(lambda db: ClienteRepository(db).search_ranked(cliente.nome[:4])),
+        'ClienteRepository.search_page': read(lambda db: ClienteRepository(db).search_page(cliente.nome[:4])),
+        # Endereco
+        'EnderecoRepository.create': write(lambda db, _: EnderecoRepository(db).create(new_endereco())),
+        'EnderecoRepository.create_many': write(lambda db, _: EnderecoRepository(db).create_many(rows_of(new_endereco))),
+        'EnderecoRepository.upsert_many': write(lambda db, rows: EnderecoRepository(db).upsert_many(rows),
+                                                stored(Endereco, s['enderecos_batch'])),
+        'EnderecoRepository.update': write(lambda db, _: EnderecoRepository(db).update(endereco_id, {'bairro': 'Bench'})),
+        'EnderecoRepository.update_where': write(lambda db, _: EnderecoRepository(db).update_where({'endereco_id': s['enderecos_batch']}, {'bairro': 'Bench'})),
+        'EnderecoRepository.delete': write(lambda db, ids: EnderecoRepository(db).delete(ids[0]),
+                                           lambda db: added(db, [new_endereco()])),
+        'EnderecoRepository.delete_by_ids': write(lambda db, ids: EnderecoRepository(db).delete_by_ids(ids),
+                                                  lambda db: added(db, [new_endereco() for _ in range(10)])),
+        'EnderecoRepository.get_by_id': read(lambda db: EnderecoRepository(db).get_by_id(endereco_id)),
+        'EnderecoRepository.get_by_ids': read(lambda db: EnderecoRepository(db).get_by_ids(s['enderecos_batch'])),
+        'EnderecoRepository.get_all': read(lambda db: EnderecoRepository(db).get_all()),
+        'EnderecoRepository.get_all_page': read(lambda db: EnderecoRepository(db).get_all_page()),
+        'EnderecoRepository.get_by_cep': read(lambda db: EnderecoRepository(db).get_by_cep(endereco.cep)),
+        'EnderecoRepository.get_by_cep_prefix': read(lambda db: EnderecoRepository(db).get_by_cep_prefix((endereco.cep or '')[:5])),
+        'EnderecoRepository.get_by_cep_prefix_page': read(lambda db: EnderecoRepository(db).get_by_cep_prefix_page((endereco.cep or '')[:5])),
+        'EnderecoRepository.get_by_cidade': read(lambda db: EnderecoRepository(db).get_by_cidade(s['cidade'])),
+        'EnderecoRepository.get_by_cidade_page': read(lambda db: EnderecoRepository(db).get_by_cidade_page(s['cidade'])),
+        'EnderecoRepository.search_by_address': read(lambda db: EnderecoRepository(db).search_by_address(cidade=s['cidade'], bairro=endereco.bairro)),
+        'EnderecoRepository.search_by_address_page': read(lambda db: EnderecoRepository(db).search_by_address_page(cidade=s['cidade'])),
+        'EnderecoRepository.iter_search_by_address': read(lambda db: EnderecoRepository(db).iter_search_by_address(cidade=s['cidade'])),
+        # Hospedagem
+        'HospedagemRepository.create': write(lambda db, _: HospedagemRepository(db).create(new_hospedagem())),
+        'HospedagemRepository.create_many': write(lambda db, _: HospedagemRepository(db).create_many(rows_of(new_hospedagem))),
+        'HospedagemRepository.upsert_many': write(lambda db, rows: HospedagemRepository(db).upsert_many(rows),
+                                                  stored(Hospedagem, s['hospedagens_batch'])),
+        'HospedagemRepository.update': write(lambda db, _: HospedagemRepository(db).update(hospedagem_id, {'tipo': 'Chalé'})),
+        'HospedagemRepository.update_where': write(lambda db, _: HospedagemRepository(db).update_where({'hospedagem_id': s['hospedagens_batch']}, {'tipo': 'Chalé'})),
+        'HospedagemRepository.deactivate_by_proprietario': write(lambda db, _: HospedagemRepository(db).deactivate_by_proprietario(proprietario_id)),
+        'HospedagemRepository.delete': write(lambda db, ids: HospedagemRepository(db).delete(ids[0]),
+                                             lambda db: added(db, [new_hospedagem()])),
+        'HospedagemRepository.delete_by_ids': write(lambda db, _: HospedagemRepository(db).delete_by_ids(s['hospedagens_batch'])),
+        'HospedagemRepository.get_by_id': read(lambda db: HospedagemRepository(db).get_by_id(hospedagem_id, load='relations')),
+        'HospedagemRepository.get_by_ids': read(lambda db: HospedagemRepository(db).get_by_ids(s['hospedagens_batch'], load='relations')),
+        'HospedagemRepository.get_all': read(lambda db: HospedagemRepository(db).get_all()),
+        'HospedagemRepository.get_all_page': read(lambda db: HospedagemRepository(db).get_all_page()),
+        'HospedagemRepository.get_by_proprietario': read(lambda db: HospedagemRepository(db).get_by_proprietario(proprietario_id)),
+        'HospedagemRepository.get_by_endereco': read(lambda db: HospedagemRepository(db).get_by_endereco(endereco_id)),
+        'HospedagemRepository.count_by_proprietario': read(lambda db: HospedagemRepository(db).count_by_proprietario(proprietario_id)),
+        'HospedagemRepository.search': read(lambda db: HospedagemRepository(db).search({'cidade': s['cidade']})),
+        'HospedagemRepository.search_page': read(lambda db: HospedagemRepository(db).search_page({'cidade': s['cidade']})),
+        'HospedagemRepository.search_available': read(lambda db: HospedagemRepository(db).search_available(start, end, cidade=s['cidade'])),
+        # Aluguel
+        'AluguelRepository.create': write(lambda db, _: AluguelRepository(db).create(new_aluguel())),
+        'AluguelRepository.reserve': write(lambda db, _: AluguelRepository(db).reserve(cliente_id, hospedagem_id, future, future + timedelta(days=3), Decimal('450.00'))),
+        'AluguelRepository.create_many': write(lambda db, _: AluguelRepository(db).create_many(rows_of(new_aluguel))),
+        'AluguelRepository.upsert_many': write(lambda db, rows: AluguelRepository(db).upsert_many(rows),
+                                               stored(Aluguel, s['alugueis_batch'])),
+        'AluguelRepository.update': write(lambda db, _: AluguelRepository(db).update(aluguel.aluguel_id, {'preco_total': Decimal('999.00')})),
+        'AluguelRepository.update_where': write(lambda db, _: AluguelRepository(db).update_where({'aluguel_id': s['alugueis_batch']}, {'preco_total': Decimal('999.00')})),
+        'AluguelRepository.delete': write(lambda db, _: AluguelRepository(db).delete(aluguel.aluguel_id)),
+        'AluguelRepository.delete_by_ids': write(lambda db, _: AluguelRepository(db).delete_by_ids(s['alugueis_batch'])),
+        'AluguelRepository.archive_before': write(lambda db, _: AluguelRepository(db).archive_before(end, max_batches=1)),
+        'AluguelRepository.get_by_id': read(lambda db: AluguelRepository(db).get_by_id(aluguel.aluguel_id, load='relations')),
+        'AluguelRepository.get_by_ids': read(lambda db: AluguelRepository(db).get_by_ids(s['alugueis_batch'])),
+        'AluguelRepository.get_all': read(lambda db: AluguelRepository(db).get_all()),
+        'AluguelRepository.get_all_page': read(lambda db: AluguelRepository(db).get_all_page()),
+        'AluguelRepository.get_by_cliente': read(lambda db: AluguelRepository(db).get_by_cliente(aluguel.cliente_id)),
+        'AluguelRepository.iter_by_cliente': read(lambda db: AluguelRepository(db).iter_by_cliente(aluguel.cliente_id)),
+        'AluguelRepository.get_by_hospedagem': read(lambda db: AluguelRepository(db).get_by_hospedagem(hospedagem_id)),
+        'AluguelRepository.get_active_rentals': read(lambda db: AluguelRepository(db).get_active_rentals(start)),
+        'AluguelRepository.iter_active_rentals': read(lambda db: AluguelRepository(db).iter_active_rentals(start)),
+        'AluguelRepository.check_availability': read(lambda db: AluguelRepository(db).check_availability(hospedagem_id, start, end)),
+        'AluguelRepository.check_availability_many': read(lambda db: AluguelRepository(db).check_availability_many(s['hospedagens_batch'], start, end)),
+        'AluguelRepository.get_rentals_in_period': read(lambda db: AluguelRepository(db).get_rentals_in_period(start, end)),
+        'AluguelRepository.iter_rentals_in_period': read(lambda db: AluguelRepository(db).iter_rentals_in_period(start, end)),
+        'AluguelRepository.get_revenue_by_period': read(lambda db: AluguelRepository(db).get_revenue_by_period(start, end)),
+        'AluguelRepository.get_revenue_by_month': read(lambda db: AluguelRepository(db).get_revenue_by_month(year, month, proprietario_id=proprietario_id)),
+        'AluguelRepository.get_revenue_by_year': read(lambda db: AluguelRepository(db).get_revenue_by_year(year, cidade=s['cidade'])),
+        'AluguelRepository.get_revenue_breakdown': read(lambda db: AluguelRepository(db).get_revenue_breakdown(date(year, 1, 1), date(year, 12, 31), by='cidade')),
+        'AluguelRepository.get_monthly_revenue': read(lambda db: AluguelRepository(db).get_monthly_revenue(year, hospedagem_id=hospedagem_id)),
+        'AluguelRepository.get_occupancy': read(lambda db: AluguelRepository(db).get_occupancy(date(year, 1, 1), date(year, 12, 31), by='cidade')),
+        'AluguelRepository.get_most_frequent_clients': read(lambda db: AluguelRepository(db).get_most_frequent_clients()),
+        # Avaliacao
+        'AvaliacaoRepository.create': write(lambda db, _: AvaliacaoRepository(db).create(new_avaliacao())),
+        'AvaliacaoRepository.create_many': write(lambda db, _: AvaliacaoRepository(db).create_many(rows_of(new_avaliacao))),
+        'AvaliacaoRepository.upsert_many': write(lambda db, rows: AvaliacaoRepository(db).upsert_many(rows),
+                                                 stored(Avaliacao, s['avaliacoes_batch'])),
+        'AvaliacaoRepository.update': write(lambda db, _: AvaliacaoRepository(db).update(avaliacao.avaliacao_id, {'nota': 1})),
+        'AvaliacaoRepository.update_where': write(lambda db, _: AvaliacaoRepository(db).update_where({'avaliacao_id': s['avaliacoes_batch']}, {'nota': 1})),
+        'AvaliacaoRepository.delete': write(lambda db, _: AvaliacaoRepository(db).delete(avaliacao.avaliacao_id)),
+        'AvaliacaoRepository.delete_by_ids': write(lambda db, _: AvaliacaoRepository(db).delete_by_ids(s['avaliacoes_batch'])),
+        'AvaliacaoRepository.archive_before': write(lambda db, _: AvaliacaoRepository(db).archive_before(end, max_batches=1)),
+        'AvaliacaoRepository.get_by_id': read(lambda db: AvaliacaoRepository(db).get_by_id(avaliacao.avaliacao_id, load='relations')),
+        'AvaliacaoRepository.get_by_ids': read(lambda db: AvaliacaoRepository(db).get_by_ids(s['avaliacoes_batch'])),
+        'AvaliacaoRepository.get_all': read(lambda db: AvaliacaoRepository(db).get_all()),
+        'AvaliacaoRepository.get_all_page': read(lambda db: AvaliacaoRepository(db).get_all_page()),
+        'AvaliacaoRepository.get_by_cliente': read(lambda db: AvaliacaoRepository(db).get_by_cliente(cliente_id)),
+        'AvaliacaoRepository.get_by_hospedagem': read(lambda db: AvaliacaoRepository(db).get_by_hospedagem(hospedagem_id)),
+        'AvaliacaoRepository.get_average_rating': read(lambda db: AvaliacaoRepository(db).get_average_rating(hospedagem_id)),
+        'AvaliacaoRepository.get_ratings_summary': read(lambda db: AvaliacaoRepository(db).get_ratings_summary(hospedagem_id)),
+        'AvaliacaoRepository.get_recent_reviews': read(lambda db: AvaliacaoRepository(db).get_recent_reviews(hospedagem_id)),
+        'AvaliacaoRepository.get_highest_rated_hospedagens': read(lambda db: AvaliacaoRepository(db).get_highest_rated_hospedagens()),
+        'AvaliacaoRepository.search_by_comment': read(lambda db: AvaliacaoRepository(db).search_by_comment('bom')),
+        'AvaliacaoRepository.search_by_comment_ranked': read(lambda db: AvaliacaoRepository(db).search_by_comment_ranked('bom')),
+        'AvaliacaoRepository.search_by_comment_page': read(lambda db: AvaliacaoRepository(db).search_by_comment_page('bom')),
+    }
+
+
+def public_methods() -> List[str]:
+    return sorted(
+        f'{repository.__name__}.{name}'
+        for repository in REPOSITORIES
+        for name, member in vars(repository).items()
+        if not name.startswith('_') and callable(member)
+    )
+
+
+def percentile(timings: List[float], q: int) -> float:
+    if len(timings) == 1:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method='inclusive')[q - 1]
+
+
+def run_path(db: Session, path: Path, iterations: int, warmup: int) -> List[float]:
+    timings = []
+    for i in range(warmup + iterations):
+        db.expunge_all()
+        if path.write:
+            with UnitOfWork(db) as unit_of_work:
+                prepared = path.prepare(db) if path.prepare else None
+                started = time.perf_counter()
+                path.call(db, prepared)
+                elapsed = time.perf_counter() - started
+                unit_of_work.rollback()
+        else:
+            started = time.perf_counter()
+            result = path.call(db, None)
+            if hasattr(result, '__next__'):
+                for _ in result:
+                    pass
+            elapsed = time.perf_counter() - started
+        if i >= warmup:
+            timings.append(elapsed)
+    return timings
+
+
+def benchmark(url: str, iterations: int, warmup: int, only: Optional[str]) -> Dict[str, Any]:
+    engine = make_engine(url, PROFILES['batch'])
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    results = {}
+    with Session() as db:
+        rentals = db.scalar(select(func.count()).select_from(Aluguel))
+        selected = {
+            name: path for name, path in paths(sample(db)).items()
+            if only is None or re.search(only, name)
+        }
+        for name, path in selected.items():
+            with Instrumentation(engine) as metrics:
+                try:
+                    timings = run_path(db, path, iterations, warmup)
+                except Exception as e:
+                    db.rollback()
+                    results[name] = {'error': f'{type(e).__name__}: {e}'}
+                    print(f"{'ERROR':>9} {name}: {results[name]['error']}")
+                    continue
+            stats = metrics.stats().get(name)
+            calls = (warmup + iterations) or 1
+            results[name] = {
+                'p50_ms': percentile(timings, 50) * 1000,
+                'p95_ms': percentile(timings, 95) * 1000,
+                'p99_ms': percentile(timings, 99) * 1000,
+                'mean_ms': statistics.fmean(timings) * 1000,
+                'statements': stats.statements / calls if stats else 0.0,
+                'rows': stats.rows / calls if stats else 0.0,
+            }
+            print(f"{results[name]['p50_ms']:>9.2f} {results[name]['p95_ms']:>9.2f} "
+                  f"{results[name]['p99_ms']:>9.2f} {results[name]['statements']:>6.1f}  {name}")
+    engine.dispose()
+    return {
+        'meta': {
+            'dialect': engine.dialect.name,
+            'rentals': rentals,
+            'iterations': iterations,
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'machine': platform.node(),
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        },
+        'methods': results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], metric: str,
+            threshold: float, min_delta_ms: float) -> List[str]:
+    """Every regression of `current` against `baseline`, as printable lines"""
+    for key in ('dialect', 'rentals'):
+        if current['meta'][key] != baseline['meta'][key]:
+            raise SystemExit(f"Baseline was taken with {key}={baseline['meta'][key]!r}, "
+                             f"this run has {current['meta'][key]!r}")
+    regressions = []
+    for name, before in sorted(baseline['methods'].items()):
+        after = current['methods'].get(name)
+        if after is None or 'error' in before:
+            continue
+        if 'error' in after:
+            regressions.append(f"{name}: now fails with {after['error']}")
+            continue
+        slower = after[metric] - before[metric]
+        if slower > min_delta_ms and after[metric] > before[metric] * (1 + threshold):
+            regressions.append(f"{name}: {metric} {before[metric]:.2f} ms -> {after[metric]:.2f} ms "
+                               f"(+{slower / before[metric]:.0%})")
+        if after['statements'] > before['statements']:
+            regressions.append(f"{name}: {before['statements']:g} -> {after['statements']:g} statements per call")
+    return regressions
+
+
+def ensure_dataset(url: str, rentals: int, workers: int):
+    engine = make_engine(url, PROFILES['batch'])
+    empty = not inspect(engine).has_table('alugueis')
+    if not empty:
+        with Session(engine) as db:
+            empty = db.scalar(select(func.count()).select_from(Aluguel)) == 0
+    engine.dispose()
+    if empty:
+        from generate_dataset import DatasetPlan, generate
+        generate(url, DatasetPlan(rentals=rentals), workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES, key=SCALES.get), default='10k')
+    parser.add_argument('--url', help='SQLAlchemy database URL (seeded when empty)')
+    parser.add_argument('--mysql', action='store_true',
+                        help='use the DB_* environment (docker-compose MySQL)')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'insight_places_bench'),
+                        help='where generated SQLite datasets are kept between runs')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--only', metavar='REGEX', help='benchmark only matching Repository.method names')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write the results as the new baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='fail on regressions against this baseline')
+    parser.add_argument('--metric', choices=('p50_ms', 'p95_ms', 'p99_ms'), default='p50_ms')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown as a fraction of the baseline (default 0.25)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help='ignore slowdowns smaller than this, which are noise')
+    args = parser.parse_args()
+
+    rentals = SCALES[args.scale]
+    if args.mysql:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+    elif args.url:
+        url = args.url
+    else:
+        os.makedirs(args.data_dir, exist_ok=True)
+        url = f"sqlite:///{os.path.join(args.data_dir, f'sqlite-{args.scale}.db')}"
+    ensure_dataset(url, rentals, args.workers)
+
+    print(f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'stmts':>6}  method")
+    results = benchmark(url, args.iterations, args.warmup, args.only)
+    print(f"\n{results['meta']['rentals']} alugueis on {results['meta']['dialect']}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+            print(f"Results written to {path}")
+
+    missing = [name for name in public_methods() if name not in results['methods']] if not args.only else []
+    for name in missing:
+        print(f"No benchmark for {name}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.metric, args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"{len(regressions)} regression(s) against {args.baseline}")
+        sys.exit(1 if regressions or missing else 0)
+
+
+if __name__ == '__main__':
+    main()
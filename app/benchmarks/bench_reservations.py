@@ -0,0 +1,175 @@
+"""Book a few hot hospedagens from many threads: bookings per second and overlaps
+
+Usage:
+    python benchmarks/bench_reservations.py                        # SQLite, 100k rentals
+    python benchmarks/bench_reservations.py --mysql --threads 32
+    python benchmarks/bench_reservations.py --hospedagens 5 --requests 500
+
+Uses the datasets of bench_repositories.py. Every thread asks for random
+stays of 1 to 5 nights in the same 60 days of 2100, so most requests
+compete for a hospedagem. `reserve` books under the hospedagem's row lock;
+`check-then-create` is check_availability followed by create, the two-step
+booking reserve replaces. Overlapping pairs among the new rentals are
+counted with SQL, then the rentals are deleted. Exits 1 if reserve
+double-booked.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import aliased, sessionmaker
+
+from bench_repositories import SCALES, ensure_dataset
+from database import PROFILES, make_engine
+from identifiers import uuid7
+from models import Aluguel, Cliente, Hospedagem
+from repositories import AluguelRepository
+
+FIRST_DAY = date(2100, 1, 1)
+DAYS = 60
+
+
+def reserve(repo, request):
+    return repo.reserve(**request) is not None
+
+
+def check_then_create(repo, request):
+    if not repo.check_availability(request['hospedagem_id'], request['start_date'],
+                                   request['end_date']):
+        return False
+    repo.create(Aluguel(aluguel_id=request['aluguel_id'], cliente_id=request['cliente_id'],
+                        hospedagem_id=request['hospedagem_id'],
+                        data_inicio=request['start_date'], data_fim=request['end_date'],
+                        preco_total=request['preco_total']))
+    return True
+
+
+MODES = {'reserve': reserve, 'check-then-create': check_then_create}
+
+
+def requests_for(cliente_ids, hospedagem_ids, count, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        start = FIRST_DAY + timedelta(days=rng.randrange(DAYS))
+        yield {
+            'aluguel_id': uuid7(),
+            'cliente_id': rng.choice(cliente_ids),
+            'hospedagem_id': rng.choice(hospedagem_ids),
+            'start_date': start,
+            'end_date': start + timedelta(days=rng.randint(1, 5)),
+            'preco_total': Decimal(rng.randrange(100, 2000)),
+        }
+
+
+def overlaps(db, aluguel_ids) -> int:
+    other = aliased(Aluguel)
+    return db.scalar(
+        select(func.count()).select_from(Aluguel).join(other, and_(
+            other.hospedagem_id == Aluguel.hospedagem_id,
+            other.aluguel_id > Aluguel.aluguel_id,
+            other.data_inicio <= Aluguel.data_fim,
+            other.data_fim >= Aluguel.data_inicio,
+        )).where(Aluguel.aluguel_id.in_(aluguel_ids), other.aluguel_id.in_(aluguel_ids))
+    )
+
+
+def run_mode(Session, book, cliente_ids, hospedagem_ids, threads, requests):
+    booked, rejected, failed = [], [0], [0]
+    lock = threading.Lock()
+
+    def worker(seed):
+        with Session() as db:
+            repo = AluguelRepository(db)
+            for request in requests_for(cliente_ids, hospedagem_ids, requests, seed):
+                try:
+                    ok = book(repo, request)
+                except Exception:
+                    db.rollback()
+                    ok = None
+                with lock:
+                    if ok:
+                        booked.append(request['aluguel_id'])
+                    elif ok is None:
+                        failed[0] += 1
+                    else:
+                        rejected[0] += 1
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with Session() as db:
+        overlapping = overlaps(db, booked) if booked else 0
+        AluguelRepository(db).delete_by_ids(booked)
+    return {'booked': len(booked), 'rejected': rejected[0], 'failed': failed[0],
+            'seconds': elapsed, 'overlaps': overlapping}
+
+
+def run(url: str, modes, threads: int, requests: int, hospedagens: int) -> bool:
+    engine = make_engine(url, PROFILES['batch'], pool_size=threads, max_overflow=0)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        hospedagem_ids = db.scalars(select(Hospedagem.hospedagem_id)
+                                    .order_by(Hospedagem.hospedagem_id).limit(hospedagens)).all()
+        cliente_ids = db.scalars(select(Cliente.cliente_id).order_by(Cliente.cliente_id).limit(100)).all()
+
+    print(f"{threads} threads x {requests} requests on {len(hospedagem_ids)} hospedagens")
+    print(f"{'mode':<18} {'booked':>7} {'rejected':>9} {'failed':>7} {'seconds':>8} "
+          f"{'bookings/s':>11} {'requests/s':>11} {'overlaps':>9}")
+    safe = True
+    for mode in modes:
+        result = run_mode(Session, MODES[mode], cliente_ids, hospedagem_ids, threads, requests)
+        total = result['booked'] + result['rejected'] + result['failed']
+        print(f"{mode:<18} {result['booked']:>7} {result['rejected']:>9} {result['failed']:>7} "
+              f"{result['seconds']:>8.2f} {result['booked'] / result['seconds']:>11.1f} "
+              f"{total / result['seconds']:>11.1f} {result['overlaps']:>9}")
+        if mode == 'reserve' and result['overlaps']:
+            safe = False
+    engine.dispose()
+    return safe
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES, key=SCALES.get), default='100k')
+    parser.add_argument('--url', help='SQLAlchemy database URL (seeded when empty)')
+    parser.add_argument('--mysql', action='store_true',
+                        help='use the DB_* environment (docker-compose MySQL)')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'insight_places_bench'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='booking requests per thread')
+    parser.add_argument('--hospedagens', type=int, default=20, help='hospedagens competed for')
+    parser.add_argument('--mode', choices=sorted(MODES), action='append',
+                        help='run only this mode (repeatable)')
+    args = parser.parse_args()
+
+    if args.mysql:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+    elif args.url:
+        url = args.url
+    else:
+        os.makedirs(args.data_dir, exist_ok=True)
+        url = f"sqlite:///{os.path.join(args.data_dir, f'sqlite-{args.scale}.db')}"
+    ensure_dataset(url, SCALES[args.scale], args.workers)
+
+    if not run(url, args.mode or list(MODES), args.threads, args.requests, args.hospedagens):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,12 @@
+from dataclasses import dataclass, replace
+from typing import Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker
 from models import Base
+from instrumentation import Instrumentation
+from routing import RoutingSession
 import os
 
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -10,10 +16,123 @@ DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 
 DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Optional read replica; @read_only repository methods are sent there
+DB_REPLICA_URL = os.getenv("DB_REPLICA_URL")
+# Per-repository-method query metrics, off unless set
+DB_INSTRUMENT = os.getenv("DB_INSTRUMENT", "").lower() in ('1', 'true', 'yes')
+
+
+@dataclass(frozen=True)
+class EngineProfile:
+    """Pool sizing and logging for one kind of process"""
+    pool_size: int = 10
+    max_overflow: int = 20
+    pool_timeout: float = 30.0
+    # Below MySQL's wait_timeout, so idle connections are replaced before
+    # the server drops them
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    echo: bool = False
+
+
+PROFILES = {
+    'production': EngineProfile(),
+    'development': EngineProfile(pool_size=5, max_overflow=5, echo=True),
+    # Scripts and batch jobs hold one or two long connections
+    'batch': EngineProfile(pool_size=2, max_overflow=0, pool_recycle=3600),
+}
+
+
+def profile_from_env(name: Optional[str] = None) -> EngineProfile:
+    """PROFILES[DB_PROFILE], with DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE and DB_ECHO overriding single settings"""
+    name = name or os.getenv("DB_PROFILE", "production")
+    if name not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {name!r}; expected one of {sorted(PROFILES)}")
+    overrides = {}
+    for setting, variable, parse in (
+        ('pool_size', 'DB_POOL_SIZE', int),
+        ('max_overflow', 'DB_MAX_OVERFLOW', int),
+        ('pool_timeout', 'DB_POOL_TIMEOUT', float),
+        ('pool_recycle', 'DB_POOL_RECYCLE', int),
+        ('echo', 'DB_ECHO', lambda value: value.lower() in ('1', 'true', 'yes')),
+    ):
+        if os.getenv(variable):
+            overrides[setting] = parse(os.getenv(variable))
+    return replace(PROFILES[name], **overrides)
+
+
+def _engine_options(url: str, profile: Optional[EngineProfile], kwargs: dict) -> dict:
+    profile = profile or profile_from_env()
+    options = {'echo': profile.echo, 'pool_pre_ping': profile.pool_pre_ping}
+    parsed = make_url(url)
+    # In-memory SQLite keeps one connection per thread and aiosqlite opens a
+    # fresh one per checkout; neither has a pool to size
+    unpooled = parsed.get_backend_name() == 'sqlite' and (
+        parsed.database in (None, '', ':memory:') or parsed.get_driver_name() == 'aiosqlite'
+    )
+    if not unpooled:
+        options.update(
+            pool_size=profile.pool_size,
+            max_overflow=profile.max_overflow,
+            pool_timeout=profile.pool_timeout,
+            pool_recycle=profile.pool_recycle,
+        )
+    options.update(kwargs)
+    return options
+
+
+def make_engine(url: str, profile: Optional[EngineProfile] = None, **kwargs) -> Engine:
+    return create_engine(url, **_engine_options(url, profile, kwargs))
+
+
+def async_url(url: str) -> str:
+    """The asyncio driver for a URL: aiomysql for MySQL, aiosqlite for SQLite"""
+    parsed = make_url(url)
+    driver = {'mysql': 'mysql+aiomysql', 'sqlite': 'sqlite+aiosqlite'}.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No asyncio driver configured for {parsed.get_backend_name()}")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
 
-engine = create_engine(DATABASE_URL, echo=True)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def make_async_engine(url: str, profile: Optional[EngineProfile] = None, **kwargs):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = async_url(url)
+    return create_async_engine(url, **_engine_options(url, profile, kwargs))
+
+
+engine = make_engine(DATABASE_URL)
+replica_engine = make_engine(DB_REPLICA_URL) if DB_REPLICA_URL else None
+# Read it with metrics.to_json() or metrics.to_prometheus()
+metrics = Instrumentation(engine, replica_engine).enable() if DB_INSTRUMENT else None
+
+SessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False,
+    primary=engine, replica=replica_engine
+)
+
+# The asyncio engines are built on first use, so sync-only processes do not
+# need aiomysql installed
+_async_sessionmaker = None
+
+
+def async_session_factory():
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+        async_engine = make_async_engine(DATABASE_URL)
+        async_replica = make_async_engine(DB_REPLICA_URL) if DB_REPLICA_URL else None
+        # Committed objects stay readable: attribute refreshes cannot lazy-load under asyncio
+        _async_sessionmaker = async_sessionmaker(
+            class_=AsyncSession, sync_session_class=RoutingSession,
+            autoflush=False, expire_on_commit=False,
+            primary=async_engine.sync_engine,
+            replica=async_replica.sync_engine if async_replica else None,
+        )
+    return _async_sessionmaker
+
 
 def get_db():
     db = SessionLocal()
@@ -22,5 +141,10 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    async with async_session_factory()() as db:
+        yield db
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
@@ -1,12 +1,35 @@
-import uuid
+from collections import OrderedDict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Iterator
 from faker import Faker
-from models import Proprietario
+from identifiers import uuid7
+from models import Proprietario, Cliente, Endereco, Hospedagem, Aluguel, Avaliacao
 
 fake = Faker('pt_BR')  # Brazilian Portuguese locale for realistic data
 
+TIPOS_HOSPEDAGEM = ('Apartamento', 'Casa', 'Chalé', 'Pousada', 'Quarto', 'Kitnet')
+PESOS_NOTA = OrderedDict([(1, 0.05), (2, 0.05), (3, 0.15), (4, 0.35), (5, 0.4)])
+
+
 class ProprietarioFactory:
     """Factory for creating Proprietario instances"""
-    
+
+    @staticmethod
+    def build(
+        proprietario_id: str = None,
+        nome: str = None,
+        cpf_cnpj: str = None,
+        contato: str = None
+    ) -> dict:
+        """Build the column values of a Proprietario as a plain dict"""
+        return {
+            'proprietario_id': proprietario_id or uuid7(),
+            'nome': nome or fake.name(),
+            'cpf_cnpj': cpf_cnpj or fake.cpf(),
+            'contato': contato or fake.phone_number(),
+        }
+
     @staticmethod
     def create(
         proprietario_id: str = None,
@@ -15,14 +38,205 @@ class ProprietarioFactory:
         contato: str = None
     ) -> Proprietario:
         """Create a Proprietario instance with default or custom values"""
-        return Proprietario(
-            proprietario_id=proprietario_id or str(uuid.uuid4()),
-            nome=nome or fake.name(),
-            cpf_cnpj=cpf_cnpj or fake.cpf(),
-            contato=contato or fake.phone_number()
-        )
-    
+        return Proprietario(**ProprietarioFactory.build(
+            proprietario_id, nome, cpf_cnpj, contato
+        ))
+
     @staticmethod
     def create_batch(count: int = 5) -> list[Proprietario]:
         """Create multiple Proprietario instances"""
-        return [ProprietarioFactory.create() for _ in range(count)]
\ No newline at end of file
+        return [ProprietarioFactory.create() for _ in range(count)]
+
+    @staticmethod
+    def iter_batch(count: int = 5) -> Iterator[dict]:
+        """Lazily build the column values of multiple Proprietarios"""
+        return (ProprietarioFactory.build() for _ in range(count))
+
+
+class ClienteFactory:
+    """Factory for creating Cliente instances"""
+
+    @staticmethod
+    def build(
+        cliente_id: str = None,
+        nome: str = None,
+        cpf: str = None,
+        contato: str = None
+    ) -> dict:
+        """Build the column values of a Cliente as a plain dict"""
+        return {
+            'cliente_id': cliente_id or uuid7(),
+            'nome': nome or fake.name(),
+            'cpf': cpf or fake.cpf(),
+            'contato': contato or fake.email(),
+        }
+
+    @staticmethod
+    def create(**kwargs) -> Cliente:
+        """Create a Cliente instance with default or custom values"""
+        return Cliente(**ClienteFactory.build(**kwargs))
+
+    @staticmethod
+    def create_batch(count: int = 5) -> list[Cliente]:
+        """Create multiple Cliente instances"""
+        return [ClienteFactory.create() for _ in range(count)]
+
+    @staticmethod
+    def iter_batch(count: int = 5) -> Iterator[dict]:
+        """Lazily build the column values of multiple Clientes"""
+        return (ClienteFactory.build() for _ in range(count))
+
+
+class EnderecoFactory:
+    """Factory for creating Endereco instances"""
+
+    @staticmethod
+    def build(
+        endereco_id: str = None,
+        rua: str = None,
+        numero: int = None,
+        bairro: str = None,
+        cidade: str = None,
+        estado: str = None,
+        cep: str = None
+    ) -> dict:
+        """Build the column values of an Endereco as a plain dict"""
+        return {
+            'endereco_id': endereco_id or uuid7(),
+            'rua': rua or fake.street_name(),
+            'numero': numero or fake.random_int(1, 9999),
+            'bairro': bairro or fake.bairro(),
+            'cidade': cidade or fake.city(),
+            'estado': estado or fake.estado_sigla(),
+            'cep': cep or fake.postcode(),
+        }
+
+    @staticmethod
+    def create(**kwargs) -> Endereco:
+        """Create an Endereco instance with default or custom values"""
+        return Endereco(**EnderecoFactory.build(**kwargs))
+
+    @staticmethod
+    def create_batch(count: int = 5) -> list[Endereco]:
+        """Create multiple Endereco instances"""
+        return [EnderecoFactory.create() for _ in range(count)]
+
+    @staticmethod
+    def iter_batch(count: int = 5) -> Iterator[dict]:
+        """Lazily build the column values of multiple Enderecos"""
+        return (EnderecoFactory.build() for _ in range(count))
+
+
+class HospedagemFactory:
+    """Factory for creating Hospedagem instances"""
+
+    @staticmethod
+    def build(
+        hospedagem_id: str = None,
+        tipo: str = None,
+        endereco_id: str = None,
+        proprietario_id: str = None,
+        ativo: bool = None
+    ) -> dict:
+        """Build the column values of a Hospedagem as a plain dict"""
+        return {
+            'hospedagem_id': hospedagem_id or uuid7(),
+            'tipo': tipo or fake.random_element(TIPOS_HOSPEDAGEM),
+            'endereco_id': endereco_id,
+            'proprietario_id': proprietario_id,
+            'ativo': fake.boolean(chance_of_getting_true=90) if ativo is None else ativo,
+        }
+
+    @staticmethod
+    def create(**kwargs) -> Hospedagem:
+        """Create a Hospedagem instance with default or custom values"""
+        return Hospedagem(**HospedagemFactory.build(**kwargs))
+
+    @staticmethod
+    def create_batch(count: int = 5, **kwargs) -> list[Hospedagem]:
+        """Create multiple Hospedagem instances"""
+        return [HospedagemFactory.create(**kwargs) for _ in range(count)]
+
+    @staticmethod
+    def iter_batch(count: int = 5, **kwargs) -> Iterator[dict]:
+        """Lazily build the column values of multiple Hospedagens"""
+        return (HospedagemFactory.build(**kwargs) for _ in range(count))
+
+
+class AluguelFactory:
+    """Factory for creating Aluguel instances"""
+
+    @staticmethod
+    def build(
+        aluguel_id: str = None,
+        cliente_id: str = None,
+        hospedagem_id: str = None,
+        data_inicio: date = None,
+        data_fim: date = None,
+        preco_total: Decimal = None
+    ) -> dict:
+        """Build the column values of an Aluguel as a plain dict"""
+        data_inicio = data_inicio or fake.date_between('-2y', '+1y')
+        data_fim = data_fim or data_inicio + timedelta(days=fake.random_int(1, 14))
+        if preco_total is None:
+            diaria = Decimal(fake.random_int(80, 900))
+            preco_total = diaria * max((data_fim - data_inicio).days, 1)
+        return {
+            'aluguel_id': aluguel_id or uuid7(),
+            'cliente_id': cliente_id,
+            'hospedagem_id': hospedagem_id,
+            'data_inicio': data_inicio,
+            'data_fim': data_fim,
+            'preco_total': preco_total,
+        }
+
+    @staticmethod
+    def create(**kwargs) -> Aluguel:
+        """Create an Aluguel instance with default or custom values"""
+        return Aluguel(**AluguelFactory.build(**kwargs))
+
+    @staticmethod
+    def create_batch(count: int = 5, **kwargs) -> list[Aluguel]:
+        """Create multiple Aluguel instances"""
+        return [AluguelFactory.create(**kwargs) for _ in range(count)]
+
+    @staticmethod
+    def iter_batch(count: int = 5, **kwargs) -> Iterator[dict]:
+        """Lazily build the column values of multiple Alugueis"""
+        return (AluguelFactory.build(**kwargs) for _ in range(count))
+
+
+class AvaliacaoFactory:
+    """Factory for creating Avaliacao instances"""
+
+    @staticmethod
+    def build(
+        avaliacao_id: str = None,
+        cliente_id: str = None,
+        hospedagem_id: str = None,
+        nota: int = None,
+        comentario: str = None
+    ) -> dict:
+        """Build the column values of an Avaliacao as a plain dict"""
+        return {
+            'avaliacao_id': avaliacao_id or uuid7(),
+            'cliente_id': cliente_id,
+            'hospedagem_id': hospedagem_id,
+            'nota': nota or fake.random_element(PESOS_NOTA),
+            'comentario': comentario or fake.sentence(nb_words=12),
+        }
+
+    @staticmethod
+    def create(**kwargs) -> Avaliacao:
+        """Create an Avaliacao instance with default or custom values"""
+        return Avaliacao(**AvaliacaoFactory.build(**kwargs))
+
+    @staticmethod
+    def create_batch(count: int = 5, **kwargs) -> list[Avaliacao]:
+        """Create multiple Avaliacao instances"""
+        return [AvaliacaoFactory.create(**kwargs) for _ in range(count)]
+
+    @staticmethod
+    def iter_batch(count: int = 5, **kwargs) -> Iterator[dict]:
+        """Lazily build the column values of multiple Avaliacoes"""
+        return (AvaliacaoFactory.build(**kwargs) for _ in range(count))
@@ -45,14 +45,16 @@ def seed_multiple_proprietarios(count: int = 5):
         repo = ProprietarioRepository(db)
         proprietarios = ProprietarioFactory.create_batch(count)
         
-        created_proprietarios = []
+        # One multi-row INSERT per batch instead of a commit per row; the
+        # rows are then read back, so like `create` this returns stored rows
+        keys = repo.create_many(proprietarios, return_keys=True)
+        stored = {proprietario.proprietario_id: proprietario for proprietario in repo.get_by_ids(keys)}
+        proprietarios = [stored[key] for key in keys]
         for proprietario in proprietarios:
-            created = repo.create(proprietario)
-            created_proprietarios.append(created)
-            print(f"✓ Proprietario created: {created.nome}")
+            print(f"✓ Proprietario created: {proprietario.nome}")
         
-        print(f"\n✓ Total: {len(created_proprietarios)} proprietarios created")
-        return created_proprietarios
+        print(f"\n✓ Total: {len(proprietarios)} proprietarios created")
+        return proprietarios
         
     except Exception as e:
         print(f"✗ Error creating proprietarios: {e}")
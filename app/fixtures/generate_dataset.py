@@ -0,0 +1,251 @@
+"""Generate a referentially consistent synthetic dataset at a chosen scale
+
+Usage:
+    python fixtures/generate_dataset.py --rentals 100000
+    python fixtures/generate_dataset.py --rentals 50000000 --workers 16 --url mysql+pymysql://...
+
+Rows are produced in chunks and written with `create_many`, so memory stays
+bounded regardless of scale. Work is split into shards executed by a process
+pool; every shard seeds its own Faker/Random from (--seed, shard) so the same
+arguments always produce the same dataset, whatever the number of workers.
+Primary keys are UUIDv7 derived from (--seed, entity, index), which lets any shard
+reference a cliente or proprietario without sharing state with other shards.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Iterator, List, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import factories
+from factories import (
+    ProprietarioFactory, ClienteFactory, EnderecoFactory,
+    HospedagemFactory, AluguelFactory, AvaliacaoFactory
+)
+from identifiers import uuid7
+from models import Base
+from repositories import (
+    ProprietarioRepository, ClienteRepository, EnderecoRepository,
+    HospedagemRepository, AluguelRepository, AvaliacaoRepository
+)
+
+ID_NAMESPACE = uuid.UUID('5b0f3c1e-8a43-4f7e-9d2a-6c1b7f0e2d94')
+ID_EPOCH_MS = 1_577_836_800_000  # 2020-01-01
+
+
+@dataclass(frozen=True)
+class DatasetPlan:
+    rentals: int
+    rentals_per_hospedagem: int = 40
+    hospedagens_per_proprietario: int = 3
+    rentals_per_cliente: int = 5
+    review_ratio: float = 0.3
+    start_date: date = date(2020, 1, 1)
+    seed: int = 42
+    chunk_size: int = 5000
+    people_per_shard: int = 50000
+    hospedagens_per_shard: int = 500
+
+    @property
+    def hospedagens(self) -> int:
+        return max(1, math.ceil(self.rentals / self.rentals_per_hospedagem))
+
+    @property
+    def proprietarios(self) -> int:
+        return max(1, math.ceil(self.hospedagens / self.hospedagens_per_proprietario))
+
+    @property
+    def clientes(self) -> int:
+        return max(1, math.ceil(self.rentals / self.rentals_per_cliente))
+
+    def entity_id(self, entity: str, index: int) -> str:
+        # UUIDv7 one millisecond apart per index, so ids follow creation order
+        entropy = uuid.uuid5(ID_NAMESPACE, f"{self.seed}:{entity}:{index}").bytes
+        return uuid7(timestamp_ms=ID_EPOCH_MS + index, entropy=entropy)
+
+    @staticmethod
+    def dated_id(rng: random.Random, day: date) -> str:
+        return uuid7(timestamp_ms=(day - date(1970, 1, 1)).days * 86_400_000 + rng.randrange(86_400_000),
+                     entropy=rng.getrandbits(80).to_bytes(10, 'big'))
+
+    def rentals_for(self, hospedagem_index: int) -> int:
+        base, remainder = divmod(self.rentals, self.hospedagens)
+        return base + (1 if hospedagem_index < remainder else 0)
+
+
+def shards(total: int, size: int) -> List[Tuple[int, int]]:
+    # Shard boundaries depend only on the plan, never on the worker count
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+def seed_shard(plan: DatasetPlan, entity: str, start: int) -> random.Random:
+    shard_seed = f"{plan.seed}:{entity}:{start}"
+    factories.fake.seed_instance(shard_seed)
+    return random.Random(shard_seed)
+
+
+_sessions = {}
+
+
+def session_for(url: str):
+    # One engine per worker process, reused across the shards it executes
+    if url not in _sessions:
+        connect_args = {'timeout': 60} if url.startswith('sqlite') else {}
+        engine = create_engine(url, connect_args=connect_args)
+        _sessions[url] = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return _sessions[url]()
+
+
+def generate_people(url: str, plan: DatasetPlan, entity: str, start: int, stop: int) -> int:
+    seed_shard(plan, entity, start)
+    with session_for(url) as db:
+        if entity == 'proprietario':
+            rows = (ProprietarioFactory.build(proprietario_id=plan.entity_id(entity, i))
+                    for i in range(start, stop))
+            ProprietarioRepository(db).create_many(rows, batch_size=plan.chunk_size)
+        else:
+            rows = (ClienteFactory.build(cliente_id=plan.entity_id(entity, i))
+                    for i in range(start, stop))
+            ClienteRepository(db).create_many(rows, batch_size=plan.chunk_size)
+    return stop - start
+
+
+def rental_calendar(plan: DatasetPlan, rng: random.Random, hospedagem_index: int) -> Iterator[Tuple[date, date]]:
+    """Non-overlapping stays walking forward from the plan start date"""
+    cursor = plan.start_date + timedelta(days=rng.randint(0, 30))
+    for _ in range(plan.rentals_for(hospedagem_index)):
+        data_inicio = cursor + timedelta(days=rng.choice((0, 0, 1, 2, 3, 5, 7, 10, 14)))
+        data_fim = data_inicio + timedelta(days=rng.choice((1, 2, 2, 3, 3, 4, 5, 7, 7, 10, 14)))
+        # Availability checks treat both ends as booked, so the next stay starts a day later
+        cursor = data_fim + timedelta(days=1)
+        yield data_inicio, data_fim
+
+
+def generate_listings(url: str, plan: DatasetPlan, start: int, stop: int) -> int:
+    rng = seed_shard(plan, 'hospedagem', start)
+    written = 0
+    block = max(1, plan.chunk_size // plan.rentals_per_hospedagem)
+
+    with session_for(url) as db:
+        enderecos = EnderecoRepository(db)
+        hospedagens = HospedagemRepository(db)
+        alugueis = AluguelRepository(db)
+        avaliacoes = AvaliacaoRepository(db)
+
+        for block_start in range(start, stop, block):
+            block_range = range(block_start, min(block_start + block, stop))
+            endereco_rows, hospedagem_rows, aluguel_rows, avaliacao_rows = [], [], [], []
+
+            for i in block_range:
+                hospedagem_id = plan.entity_id('hospedagem', i)
+                endereco_rows.append(EnderecoFactory.build(
+                    endereco_id=plan.entity_id('endereco', i)
+                ))
+                hospedagem_rows.append(HospedagemFactory.build(
+                    hospedagem_id=hospedagem_id,
+                    endereco_id=plan.entity_id('endereco', i),
+                    proprietario_id=plan.entity_id('proprietario', i // plan.hospedagens_per_proprietario)
+                ))
+
+                diaria = Decimal(rng.randrange(80, 900))
+                for data_inicio, data_fim in rental_calendar(plan, rng, i):
+                    cliente_id = plan.entity_id('cliente', rng.randrange(plan.clientes))
+                    aluguel_rows.append(AluguelFactory.build(
+                        aluguel_id=plan.dated_id(rng, data_inicio),
+                        cliente_id=cliente_id,
+                        hospedagem_id=hospedagem_id,
+                        data_inicio=data_inicio,
+                        data_fim=data_fim,
+                        preco_total=diaria * (data_fim - data_inicio).days
+                    ))
+                    if rng.random() < plan.review_ratio:
+                        avaliacao_rows.append(AvaliacaoFactory.build(
+                            avaliacao_id=plan.dated_id(rng, data_fim),
+                            cliente_id=cliente_id,
+                            hospedagem_id=hospedagem_id
+                        ))
+
+            enderecos.create_many(endereco_rows, batch_size=plan.chunk_size)
+            hospedagens.create_many(hospedagem_rows, batch_size=plan.chunk_size)
+            alugueis.create_many(aluguel_rows, batch_size=plan.chunk_size)
+            avaliacoes.create_many(avaliacao_rows, batch_size=plan.chunk_size)
+            written += len(aluguel_rows)
+
+    return written
+
+
+def generate(url: str, plan: DatasetPlan, workers: int = 1) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    print(f"Generating {plan.rentals} alugueis, {plan.hospedagens} hospedagens, "
+          f"{plan.clientes} clientes, {plan.proprietarios} proprietarios "
+          f"with {workers} worker(s)")
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Parents first: the listing shards reference them through foreign keys
+        people = [
+            pool.submit(generate_people, url, plan, entity, start, stop)
+            for entity, total in (('proprietario', plan.proprietarios), ('cliente', plan.clientes))
+            for start, stop in shards(total, plan.people_per_shard)
+        ]
+        for future in people:
+            future.result()
+        print(f"✓ Proprietarios and clientes written ({time.perf_counter() - started:.1f}s)")
+
+        listings = [
+            pool.submit(generate_listings, url, plan, start, stop)
+            for start, stop in shards(plan.hospedagens, plan.hospedagens_per_shard)
+        ]
+        written = 0
+        for future in listings:
+            written += future.result()
+            print(f"  {written}/{plan.rentals} alugueis")
+
+    print(f"✓ Dataset generated in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rentals', type=int, default=1000,
+                        help='number of alugueis to generate (1k to 50M)')
+    parser.add_argument('--url', help='SQLAlchemy database URL (defaults to database.DATABASE_URL)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rentals-per-hospedagem', type=int, default=40)
+    parser.add_argument('--review-ratio', type=float, default=0.3)
+    args = parser.parse_args()
+
+    if args.url:
+        url = args.url
+    else:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+
+    plan = DatasetPlan(
+        rentals=args.rentals,
+        rentals_per_hospedagem=args.rentals_per_hospedagem,
+        review_ratio=args.review_ratio,
+        seed=args.seed,
+        chunk_size=args.chunk_size
+    )
+    generate(url, plan, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
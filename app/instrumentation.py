@@ -0,0 +1,374 @@
+"""Per-repository-method query metrics, built on SQLAlchemy engine and session events
+
+Repository classes are decorated with `@instrumented`. While no
+Instrumentation is enabled their methods run untouched apart from one global
+check, and no event listener is registered.
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+import warnings
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# Seconds; the same upper bounds Prometheus client libraries default to
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class NPlusOneWarning(UserWarning):
+    """A repository method lazy-loaded a relationship, once per parent row"""
+
+
+class Histogram:
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        total = 0
+        buckets = []
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            buckets.append((bound, total))
+        return buckets
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {_bound(bound): count for bound, count in self.cumulative()},
+        }
+
+
+@dataclass
+class MethodStats:
+    calls: int = 0
+    errors: int = 0
+    statements: int = 0
+    rows: int = 0
+    sql_seconds: float = 0.0
+    pool_wait_seconds: float = 0.0
+    latency: Histogram = field(default_factory=Histogram)
+    lazy_loads: Counter = field(default_factory=Counter)
+
+    def as_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'statements': self.statements,
+            'rows': self.rows,
+            'sql_seconds': self.sql_seconds,
+            'pool_wait_seconds': self.pool_wait_seconds,
+            'latency_seconds': self.latency.as_dict(),
+            'lazy_loads': dict(self.lazy_loads),
+        }
+
+
+class _Call:
+    """One running repository method; nested calls roll up into their parent"""
+    __slots__ = ('method', 'parent', 'seconds', 'statements', 'rows', 'sql_seconds',
+                 'pool_wait_seconds', 'lazy_loads', 'failed')
+
+    def __init__(self, method: str, parent: Optional['_Call']):
+        self.method = method
+        self.parent = parent
+        self.seconds = 0.0
+        self.statements = 0
+        self.rows = 0
+        self.sql_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self.lazy_loads: Counter = Counter()
+        self.failed = False
+
+
+_active: Optional['Instrumentation'] = None
+_current: ContextVar[Optional[_Call]] = ContextVar('repository_call', default=None)
+
+
+def _bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def _row_count(result) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple, set, dict)):
+        return len(result)
+    items = getattr(result, 'items', None)
+    if isinstance(items, list):
+        return len(items)
+    return 1
+
+
+class Instrumentation:
+    """Latency histograms, statement and row counts, pool waits and lazy loads
+    per repository method
+
+    Use it as a context manager or call `enable(*engines)` / `disable()`.
+    Statements and lazy loads are seen on every engine and session; pool wait
+    is timed on the engines passed in. A relationship lazy-loaded inside a
+    repository method raises an NPlusOneWarning the first time, and again when
+    one call loads it `n_plus_one_threshold` times.
+    """
+
+    def __init__(self, *engines: Optional[Engine], n_plus_one_threshold: int = 3):
+        self.engines = [engine for engine in engines if engine is not None]
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self._methods: Dict[str, MethodStats] = {}
+        self._pool_wait = Histogram(POOL_WAIT_BUCKETS)
+        self._warned = set()
+
+    def __enter__(self) -> 'Instrumentation':
+        return self.enable()
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.disable()
+
+    def enable(self, *engines: Optional[Engine]) -> 'Instrumentation':
+        global _active
+        if _active is not None:
+            raise RuntimeError('Another Instrumentation is already enabled')
+        self.engines.extend(engine for engine in engines if engine is not None)
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Session, 'do_orm_execute', _on_orm_execute)
+        for engine in self.engines:
+            engine.raw_connection = self._timed_checkout(engine.raw_connection)
+        _active = self
+        return self
+
+    def disable(self):
+        global _active
+        if _active is not self:
+            return
+        event.remove(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.remove(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.remove(Session, 'do_orm_execute', _on_orm_execute)
+        for engine in self.engines:
+            del engine.raw_connection
+        _active = None
+
+    def _timed_checkout(self, raw_connection):
+        @functools.wraps(raw_connection)
+        def checkout():
+            started = time.perf_counter()
+            try:
+                return raw_connection()
+            finally:
+                waited = time.perf_counter() - started
+                call = _current.get()
+                if call is not None:
+                    call.pool_wait_seconds += waited
+                with self._lock:
+                    self._pool_wait.observe(waited)
+        return checkout
+
+    def _call(self, name: str, method, args, kwargs):
+        call = _Call(name, _current.get())
+        token = _current.set(call)
+        started = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            call.seconds += time.perf_counter() - started
+            _current.reset(token)
+            if call.failed:
+                self._finish(call)
+        if inspect.isgenerator(result):
+            return self._observe_generator(call, result)
+        call.rows = _row_count(result)
+        self._finish(call)
+        return result
+
+    def _observe_generator(self, call: _Call, iterator):
+        # Only the time spent producing rows counts, not the consumer's
+        try:
+            while True:
+                token = _current.set(call)
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                except BaseException:
+                    call.failed = True
+                    raise
+                finally:
+                    call.seconds += time.perf_counter() - started
+                    _current.reset(token)
+                call.rows += 1
+                yield item
+        finally:
+            self._finish(call)
+
+    def _finish(self, call: _Call):
+        with self._lock:
+            stats = self._methods.get(call.method)
+            if stats is None:
+                stats = self._methods[call.method] = MethodStats()
+            stats.calls += 1
+            stats.errors += call.failed
+            stats.statements += call.statements
+            stats.rows += call.rows
+            stats.sql_seconds += call.sql_seconds
+            stats.pool_wait_seconds += call.pool_wait_seconds
+            stats.latency.observe(call.seconds)
+            stats.lazy_loads.update(call.lazy_loads)
+        parent = call.parent
+        if parent is not None:
+            parent.statements += call.statements
+            parent.sql_seconds += call.sql_seconds
+            parent.pool_wait_seconds += call.pool_wait_seconds
+
+    def _lazy_load(self, call: _Call, relationship: str):
+        call.lazy_loads[relationship] += 1
+        loads = call.lazy_loads[relationship]
+        if (call.method, relationship) not in self._warned:
+            self._warned.add((call.method, relationship))
+            warnings.warn(
+                f"{call.method} lazy-loads {relationship}; every call costs an extra "
+                f"query per row. Eager-load it or query it directly.",
+                NPlusOneWarning,
+            )
+        elif loads == self.n_plus_one_threshold:
+            warnings.warn(
+                f"N+1 in {call.method}: {relationship} lazy-loaded "
+                f"{loads} times in one call",
+                NPlusOneWarning,
+            )
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+            self._pool_wait = Histogram(POOL_WAIT_BUCKETS)
+            self._warned.clear()
+
+    def stats(self) -> Dict[str, MethodStats]:
+        with self._lock:
+            return dict(self._methods)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'methods': {name: stats.as_dict() for name, stats in sorted(self._methods.items())},
+                'pool_wait_seconds': self._pool_wait.as_dict(),
+            }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix: str = 'insight_places') -> str:
+        """The metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+
+        def histogram(name: str, labels: str, values: Histogram):
+            separator = ',' if labels else ''
+            for bound, count in values.cumulative():
+                lines.append(f'{prefix}_{name}_bucket{{{labels}{separator}le="{_bound(bound)}"}} {count}')
+            suffix = f'{{{labels}}}' if labels else ''
+            lines.append(f'{prefix}_{name}_sum{suffix} {values.sum}')
+            lines.append(f'{prefix}_{name}_count{suffix} {values.count}')
+
+        with self._lock:
+            methods = sorted(self._methods.items())
+            metric('repository_call_seconds', 'histogram', 'Repository method latency')
+            for name, stats in methods:
+                histogram('repository_call_seconds', f'method="{name}"', stats.latency)
+            for counter, attribute, help_text in (
+                ('repository_errors_total', 'errors', 'Repository calls that raised'),
+                ('repository_statements_total', 'statements', 'SQL statements executed'),
+                ('repository_rows_total', 'rows', 'Rows or entities returned'),
+                ('repository_sql_seconds_total', 'sql_seconds', 'Time spent executing SQL'),
+                ('repository_pool_wait_seconds_total', 'pool_wait_seconds',
+                 'Time spent waiting for a pooled connection'),
+            ):
+                metric(counter, 'counter', help_text)
+                for name, stats in methods:
+                    lines.append(f'{prefix}_{counter}{{method="{name}"}} {getattr(stats, attribute)}')
+            metric('repository_lazy_loads_total', 'counter', 'Relationships lazy-loaded')
+            for name, stats in methods:
+                for relationship, count in sorted(stats.lazy_loads.items()):
+                    lines.append(f'{prefix}_repository_lazy_loads_total'
+                                 f'{{method="{name}",relationship="{relationship}"}} {count}')
+            metric('pool_wait_seconds', 'histogram', 'Connection pool checkout wait')
+            histogram('pool_wait_seconds', '', self._pool_wait)
+        return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._instrumentation_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    call = _current.get()
+    started = getattr(context, '_instrumentation_started', None)
+    if call is not None and started is not None:
+        call.statements += 1
+        call.sql_seconds += time.perf_counter() - started
+
+
+def _on_orm_execute(orm_execute_state):
+    call = _current.get()
+    if (call is not None and _active is not None and orm_execute_state.is_relationship_load
+            and orm_execute_state.lazy_loaded_from is not None):
+        _active._lazy_load(call, str(orm_execute_state.loader_strategy_path[-1]))
+
+
+def instrumented(cls):
+    """Class decorator: record every public method of a repository as Class.method"""
+    for name, member in list(vars(cls).items()):
+        if name.startswith('_') or not inspect.isfunction(member):
+            continue
+        setattr(cls, name, _instrument(f'{cls.__name__}.{name}', member))
+    return cls
+
+
+def _instrument(name: str, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        instrumentation = _active
+        if instrumentation is None:
+            return method(*args, **kwargs)
+        return instrumentation._call(name, method, args, kwargs)
+    return wrapper
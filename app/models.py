@@ -1,16 +1,30 @@
-from sqlalchemy import Column, String, Integer, Boolean, Date, Numeric, Text, ForeignKey
+from datetime import date
+
+from sqlalchemy import (Column, String, Integer, Boolean, Date, Numeric, Text, ForeignKey, Index,
+                        CheckConstraint)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
+
+from identifiers import BinaryUUID
+from text_normalization import digits, search_key
 
 Base = declarative_base()
 
 
+def fulltext_index(name: str, *columns: str) -> Index:
+    """FULLTEXT on MySQL and skipped elsewhere, where repositories.fulltext.InvertedIndex serves search"""
+    return Index(name, *columns, mysql_prefix='FULLTEXT').ddl_if(dialect='mysql')
+
+
 class Proprietario(Base):
     __tablename__ = 'proprietarios'
+    __table_args__ = (
+        fulltext_index('ft_proprietarios_nome', 'nome'),
+    )
     
-    proprietario_id = Column(String(255), primary_key=True)
+    proprietario_id = Column(BinaryUUID, primary_key=True)
     nome = Column(String(255))
-    cpf_cnpj = Column(String(20))
+    cpf_cnpj = Column(String(20), index=True)
     contato = Column(String(255))
     
     # Relationships
@@ -19,10 +33,13 @@ class Proprietario(Base):
 
 class Cliente(Base):
     __tablename__ = 'clientes'
+    __table_args__ = (
+        fulltext_index('ft_clientes_nome_cpf_contato', 'nome', 'cpf', 'contato'),
+    )
     
-    cliente_id = Column(String(255), primary_key=True)
+    cliente_id = Column(BinaryUUID, primary_key=True)
     nome = Column(String(255))
-    cpf = Column(String(14))
+    cpf = Column(String(14), index=True)
     contato = Column(String(255))
     
     # Relationships
@@ -30,28 +47,69 @@ class Cliente(Base):
     avaliacoes = relationship('Avaliacao', back_populates='cliente')
 
 
+def _normalized_default(source: str, normalize):
+    # Core inserts (bulk writes) that leave the search column out
+    def default(context):
+        return normalize(context.get_current_parameters().get(source)) or None
+    return default
+
+
 class Endereco(Base):
     __tablename__ = 'enderecos'
+    __table_args__ = (
+        Index('ix_enderecos_cidade_busca_bairro_busca', 'cidade_busca', 'bairro_busca'),
+        Index('ix_enderecos_estado_cidade_busca', 'estado', 'cidade_busca'),
+    )
     
-    endereco_id = Column(String(255), primary_key=True)
+    # Accent-free, lower-case copies of the address for indexed prefix search
+    SEARCH_COLUMNS = {
+        'rua': ('rua_busca', search_key),
+        'bairro': ('bairro_busca', search_key),
+        'cidade': ('cidade_busca', search_key),
+        'cep': ('cep_digitos', digits),
+    }
+    
+    endereco_id = Column(BinaryUUID, primary_key=True)
     rua = Column(String(255))
     numero = Column(Integer)
     bairro = Column(String(255))
     cidade = Column(String(255))
     estado = Column(String(2))
-    cep = Column(String(10))
+    cep = Column(String(10), index=True)
+    rua_busca = Column(String(255), index=True, default=_normalized_default('rua', search_key))
+    bairro_busca = Column(String(255), default=_normalized_default('bairro', search_key))
+    cidade_busca = Column(String(255), default=_normalized_default('cidade', search_key))
+    cep_digitos = Column(String(8), index=True, default=_normalized_default('cep', digits))
     
     # Relationships
     hospedagens = relationship('Hospedagem', back_populates='endereco')
+    
+    @validates('rua', 'bairro', 'cidade', 'cep')
+    def _normalize(self, key, value):
+        column, normalize = self.SEARCH_COLUMNS[key]
+        setattr(self, column, normalize(value) or None)
+        return value
+    
+    @classmethod
+    def with_search_columns(cls, values: dict) -> dict:
+        """Add the search columns matching the address fields present in `values`"""
+        values = dict(values)
+        for key, (column, normalize) in cls.SEARCH_COLUMNS.items():
+            if key in values:
+                values[column] = normalize(values[key]) or None
+        return values
 
 
 class Hospedagem(Base):
     __tablename__ = 'hospedagens'
+    __table_args__ = (
+        Index('ix_hospedagens_proprietario_id_ativo', 'proprietario_id', 'ativo'),
+    )
     
-    hospedagem_id = Column(String(255), primary_key=True)
+    hospedagem_id = Column(BinaryUUID, primary_key=True)
     tipo = Column(String(50))
-    endereco_id = Column(String(255), ForeignKey('enderecos.endereco_id'))
-    proprietario_id = Column(String(255), ForeignKey('proprietarios.proprietario_id'))
+    endereco_id = Column(BinaryUUID, ForeignKey('enderecos.endereco_id'), index=True)
+    proprietario_id = Column(BinaryUUID, ForeignKey('proprietarios.proprietario_id'))
     ativo = Column(Boolean)
     
     # Relationships
@@ -61,14 +119,50 @@ class Hospedagem(Base):
     avaliacoes = relationship('Avaliacao', back_populates='hospedagem')
 
 
+# Longest stay accepted, enforced by AluguelRepository and the CHECK below.
+# Bounding the length bounds data_inicio from below in date range queries,
+# which lets MySQL prune the monthly partitions of alugueis
+MAX_STAY_DAYS = 366
+
+# Days from data_inicio to data_fim, in each dialect's date arithmetic
+STAY_DAYS = {
+    'mysql': 'DATEDIFF(data_fim, data_inicio)',
+    'sqlite': 'julianday(data_fim) - julianday(data_inicio)',
+    'postgresql': 'data_fim - data_inicio',
+}
+
+
+def stay_length_check() -> tuple:
+    """CHECK that 0 <= data_fim - data_inicio <= MAX_STAY_DAYS on each dialect of STAY_DAYS"""
+    return tuple(
+        CheckConstraint(f'{days} BETWEEN 0 AND {MAX_STAY_DAYS}',
+                        name='ck_alugueis_duracao').ddl_if(dialect=dialect)
+        for dialect, days in STAY_DAYS.items()
+    )
+
+
+def check_stay_length(data_inicio, data_fim):
+    """Raise ValueError where the CHECK would reject the stay; missing dates pass"""
+    if not isinstance(data_inicio, date) or not isinstance(data_fim, date):
+        return
+    days = (data_fim - data_inicio).days
+    if not 0 <= days <= MAX_STAY_DAYS:
+        raise ValueError(f"A stay from {data_inicio} to {data_fim} lasts {days} days; "
+                         f"expected 0 to {MAX_STAY_DAYS}")
+
+
 class Aluguel(Base):
     __tablename__ = 'alugueis'
+    __table_args__ = (
+        Index('ix_alugueis_hospedagem_id_periodo', 'hospedagem_id', 'data_inicio', 'data_fim'),
+        *stay_length_check(),
+    )
     
-    aluguel_id = Column(String(255), primary_key=True)
-    cliente_id = Column(String(255), ForeignKey('clientes.cliente_id'))
-    hospedagem_id = Column(String(255), ForeignKey('hospedagens.hospedagem_id'))
-    data_inicio = Column(Date)
-    data_fim = Column(Date)
+    aluguel_id = Column(BinaryUUID, primary_key=True)
+    cliente_id = Column(BinaryUUID, ForeignKey('clientes.cliente_id'), index=True)
+    hospedagem_id = Column(BinaryUUID, ForeignKey('hospedagens.hospedagem_id'))
+    data_inicio = Column(Date, index=True)
+    data_fim = Column(Date, index=True)
     preco_total = Column(Numeric(10, 2))
     
     # Relationships
@@ -78,13 +172,100 @@ class Aluguel(Base):
 
 class Avaliacao(Base):
     __tablename__ = 'avaliacoes'
+    __table_args__ = (
+        Index('ix_avaliacoes_hospedagem_id_nota', 'hospedagem_id', 'nota'),
+        fulltext_index('ft_avaliacoes_comentario', 'comentario'),
+    )
     
-    avaliacao_id = Column(String(255), primary_key=True)
-    cliente_id = Column(String(255), ForeignKey('clientes.cliente_id'))
-    hospedagem_id = Column(String(255), ForeignKey('hospedagens.hospedagem_id'))
+    avaliacao_id = Column(BinaryUUID, primary_key=True)
+    cliente_id = Column(BinaryUUID, ForeignKey('clientes.cliente_id'), index=True)
+    hospedagem_id = Column(BinaryUUID, ForeignKey('hospedagens.hospedagem_id'))
     nota = Column(Integer)
     comentario = Column(Text)
     
     # Relationships
     cliente = relationship('Cliente', back_populates='avaliacoes')
     hospedagem = relationship('Hospedagem', back_populates='avaliacoes')
+
+
+class AluguelArquivo(Base):
+    """Finished rentals moved out of alugueis by repositories.archive, same columns"""
+    __tablename__ = 'alugueis_arquivo'
+    __table_args__ = (
+        Index('ix_alugueis_arquivo_hospedagem_id_periodo', 'hospedagem_id', 'data_inicio', 'data_fim'),
+    )
+    
+    aluguel_id = Column(BinaryUUID, primary_key=True)
+    cliente_id = Column(BinaryUUID, ForeignKey('clientes.cliente_id'), index=True)
+    hospedagem_id = Column(BinaryUUID, ForeignKey('hospedagens.hospedagem_id'))
+    data_inicio = Column(Date)
+    data_fim = Column(Date)
+    preco_total = Column(Numeric(10, 2))
+    
+    # Relationships
+    cliente = relationship('Cliente', viewonly=True)
+    hospedagem = relationship('Hospedagem', viewonly=True)
+
+
+class AvaliacaoArquivo(Base):
+    """Old reviews moved out of avaliacoes by repositories.archive, same columns"""
+    __tablename__ = 'avaliacoes_arquivo'
+    __table_args__ = (
+        Index('ix_avaliacoes_arquivo_hospedagem_id_nota', 'hospedagem_id', 'nota'),
+    )
+    
+    avaliacao_id = Column(BinaryUUID, primary_key=True)
+    cliente_id = Column(BinaryUUID, ForeignKey('clientes.cliente_id'), index=True)
+    hospedagem_id = Column(BinaryUUID, ForeignKey('hospedagens.hospedagem_id'))
+    nota = Column(Integer)
+    comentario = Column(Text)
+    
+    # Relationships
+    cliente = relationship('Cliente', viewonly=True)
+    hospedagem = relationship('Hospedagem', viewonly=True)
+
+
+class AvaliacaoResumo(Base):
+    """Running rating aggregates per hospedagem, maintained by AvaliacaoRepository
+
+    They cover the reviews in avaliacoes; archived reviews leave them.
+    """
+    __tablename__ = 'avaliacoes_resumo'
+    __table_args__ = (
+        Index('ix_avaliacoes_resumo_media_quantidade', 'media', 'quantidade'),
+    )
+    
+    hospedagem_id = Column(BinaryUUID, ForeignKey('hospedagens.hospedagem_id'), primary_key=True)
+    quantidade = Column(Integer, nullable=False, default=0)
+    soma = Column(Integer, nullable=False, default=0)
+    nota_1 = Column(Integer, nullable=False, default=0)
+    nota_2 = Column(Integer, nullable=False, default=0)
+    nota_3 = Column(Integer, nullable=False, default=0)
+    nota_4 = Column(Integer, nullable=False, default=0)
+    nota_5 = Column(Integer, nullable=False, default=0)
+    media = Column(Numeric(6, 4))
+    
+    # Relationships
+    hospedagem = relationship('Hospedagem')
+
+
+class ReceitaDiaria(Base):
+    """Revenue per hospedagem and night, prorated from alugueis by AluguelRepository
+
+    `proprietario_id` and `cidade` (the search key of the city, as in
+    Endereco.cidade_busca) are copied from the hospedagem, and kept current
+    when it moves to another owner or address, so revenue per owner or city
+    is an index range sum too.
+    """
+    __tablename__ = 'receita_diaria'
+    __table_args__ = (
+        Index('ix_receita_diaria_hospedagem_id_dia', 'hospedagem_id', 'dia'),
+        Index('ix_receita_diaria_proprietario_id_dia', 'proprietario_id', 'dia'),
+        Index('ix_receita_diaria_cidade_dia', 'cidade', 'dia'),
+    )
+    
+    dia = Column(Date, primary_key=True)
+    hospedagem_id = Column(BinaryUUID, ForeignKey('hospedagens.hospedagem_id'), primary_key=True)
+    proprietario_id = Column(BinaryUUID)
+    cidade = Column(String(255))
+    valor = Column(Numeric(12, 2), nullable=False, default=0)
@@ -4,6 +4,12 @@ from .endereco_repository import EnderecoRepository
 from .hospedagem_repository import HospedagemRepository
 from .aluguel_repository import AluguelRepository
 from .avaliacao_repository import AvaliacaoRepository
+from .availability import AvailabilityIndex
+from .fulltext import SearchBackend, MySQLFulltextBackend, InvertedIndex
+from .cache import CacheBackend, LocalLRUCache, SharedCache
+from .unit_of_work import UnitOfWork
+from .dataloader import DataLoader
+from .loading import LOAD_PROFILES, LoadProfile
 
 __all__ = [
     'ProprietarioRepository',
@@ -12,4 +18,15 @@ __all__ = [
     'HospedagemRepository',
     'AluguelRepository',
     'AvaliacaoRepository',
+    'AvailabilityIndex',
+    'SearchBackend',
+    'MySQLFulltextBackend',
+    'InvertedIndex',
+    'CacheBackend',
+    'LocalLRUCache',
+    'SharedCache',
+    'UnitOfWork',
+    'DataLoader',
+    'LoadProfile',
+    'LOAD_PROFILES',
 ]
\ No newline at end of file
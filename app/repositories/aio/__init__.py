@@ -0,0 +1,21 @@
+from .base import AsyncRepository
+from .dataloader import AsyncDataLoader
+from .repositories import (
+    AsyncProprietarioRepository,
+    AsyncClienteRepository,
+    AsyncEnderecoRepository,
+    AsyncHospedagemRepository,
+    AsyncAluguelRepository,
+    AsyncAvaliacaoRepository,
+)
+
+__all__ = [
+    'AsyncRepository',
+    'AsyncDataLoader',
+    'AsyncProprietarioRepository',
+    'AsyncClienteRepository',
+    'AsyncEnderecoRepository',
+    'AsyncHospedagemRepository',
+    'AsyncAluguelRepository',
+    'AsyncAvaliacaoRepository',
+]
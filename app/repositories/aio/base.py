@@ -0,0 +1,85 @@
+import functools
+import inspect
+from typing import AsyncIterator, Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from routing import read_only_scope
+from ..projection import project
+from ..streaming import DEFAULT_CHUNK_SIZE
+
+
+class AsyncRepository:
+    """Async face of a synchronous repository
+
+    Every public method of `sync_repository` is mirrored as a coroutine that
+    runs the synchronous method through `AsyncSession.run_sync`, so both
+    layers share one implementation. `streams` maps iter_* methods to the
+    query builders they stream; those become async generators over
+    `AsyncSession.stream`.
+
+    Relationships are not lazy-loaded under asyncio: ask for them with a
+    `load=` profile (see repositories.loading).
+    """
+
+    sync_repository: type = None
+    model: type = None
+    streams: Dict[str, str] = {}
+
+    def __init__(self, db: AsyncSession, **options):
+        self.db = db
+        self.options = options
+
+    def _sync(self, session):
+        return self.sync_repository(session, **self.options)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name, method in inspect.getmembers(cls.sync_repository, inspect.isfunction):
+            if name.startswith('_') or name in vars(cls):
+                continue
+            if name in cls.streams:
+                setattr(cls, name, _streamed(method, cls.streams[name]))
+            else:
+                setattr(cls, name, _delegated(name, method))
+
+
+def _delegated(name: str, method):
+    @functools.wraps(method)
+    async def call(self, *args, **kwargs):
+        return await self.db.run_sync(
+            lambda session: getattr(self._sync(session), name)(*args, **kwargs)
+        )
+    return call
+
+
+def _streamed(method, builder: str):
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    async def call(self, *args, **kwargs) -> AsyncIterator:
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        del arguments['self']
+        chunk_size = arguments.pop('chunk_size', DEFAULT_CHUNK_SIZE)
+        as_rows = arguments.pop('as_rows', False)
+        columns = arguments.pop('columns', None)
+
+        # Building the query does no I/O, so the sync session can do it here
+        query = getattr(self._sync(self.db.sync_session), builder)(**arguments)
+        if columns is not None:
+            query = project(query, self.model, columns, arguments.get('load'))
+            as_rows = False
+        elif as_rows:
+            query = query.with_entities(*self.model.__table__.columns)
+        statement = query.statement.execution_options(yield_per=chunk_size)
+
+        with read_only_scope():
+            if as_rows:
+                result = await self.db.stream(statement)
+            else:
+                result = await self.db.stream_scalars(statement)
+        async for item in result:
+            yield item
+    return call
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..cache import CacheBackend
+from ..dataloader import DEFAULT_MAX_BATCH_SIZE, Batches
+from ..loading import Load
+
+
+class AsyncDataLoader(Batches):
+    """Batches the get_by_id calls of one request on an AsyncSession
+
+    Every `await loader.load(...)` made before the event loop gets back to
+    the loader joins one batch, so keys loaded by coroutines gathered
+    together are fetched with one get_by_ids per model:
+
+        clientes = await asyncio.gather(*(loader.load(Cliente, avaliacao.cliente_id)
+                                          for avaliacao in avaliacoes))
+
+    A batch runs all its queries in one `run_sync`, one after the other, and
+    batches run one at a time, so the session is never used twice at once.
+    A key loaded again while its batch is queued or running waits for that
+    batch instead of being fetched twice.
+    """
+
+    def __init__(self, db: AsyncSession, load: Optional[Dict[type, Load]] = None,
+                 cache: Optional[CacheBackend] = None,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE):
+        super().__init__(load, cache, max_batch_size)
+        self.db = db
+        # Futures of the keys in the next batch, and in the batches running
+        self._waiting: Dict[Tuple[type, str], asyncio.Future] = {}
+        self._in_flight: Dict[Tuple[type, str], asyncio.Future] = {}
+        self._scheduled: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def load(self, model, key: Optional[str]) -> Optional[Any]:
+        self._check(model)
+        pending = self._waiting.get((model, key), self._in_flight.get((model, key)))
+        if pending is not None:
+            return await pending
+        if not self._enqueue(model, key):
+            return self._answer(model, key)
+        waiting = self._waiting[(model, key)] = asyncio.get_running_loop().create_future()
+        if self._scheduled is None:
+            self._scheduled = asyncio.get_running_loop().create_task(self._dispatch())
+        return await waiting
+
+    async def load_many(self, model, keys: Iterable[Optional[str]]) -> List[Optional[Any]]:
+        """The rows of `keys` in the same order, None where there is none"""
+        return list(await asyncio.gather(*(self.load(model, key) for key in keys)))
+
+    async def _dispatch(self):
+        # Let the coroutines already scheduled queue their keys first
+        await asyncio.sleep(0)
+        self._scheduled = None
+        waiting, self._waiting = self._waiting, {}
+        self._in_flight.update(waiting)
+        try:
+            # A batch queued while the previous one runs waits for it
+            async with self._lock:
+                if self._queue:
+                    await self.db.run_sync(self._fetch_queued)
+        except Exception as error:
+            failure = error
+        else:
+            failure = None
+        for (model, key), future in waiting.items():
+            self._in_flight.pop((model, key), None)
+            if future.done():
+                continue
+            if failure is not None:
+                future.set_exception(failure)
+            else:
+                future.set_result(self._answer(model, key))
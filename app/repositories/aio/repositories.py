@@ -0,0 +1,44 @@
+from models import Proprietario, Cliente, Endereco, Hospedagem, Aluguel, Avaliacao
+from ..proprietario_repository import ProprietarioRepository
+from ..cliente_repository import ClienteRepository
+from ..endereco_repository import EnderecoRepository
+from ..hospedagem_repository import HospedagemRepository
+from ..aluguel_repository import AluguelRepository
+from ..avaliacao_repository import AvaliacaoRepository
+from .base import AsyncRepository
+
+
+class AsyncProprietarioRepository(AsyncRepository):
+    sync_repository = ProprietarioRepository
+    model = Proprietario
+
+
+class AsyncClienteRepository(AsyncRepository):
+    sync_repository = ClienteRepository
+    model = Cliente
+
+
+class AsyncEnderecoRepository(AsyncRepository):
+    sync_repository = EnderecoRepository
+    model = Endereco
+    streams = {'iter_search_by_address': '_search_by_address_query'}
+
+
+class AsyncHospedagemRepository(AsyncRepository):
+    sync_repository = HospedagemRepository
+    model = Hospedagem
+
+
+class AsyncAluguelRepository(AsyncRepository):
+    sync_repository = AluguelRepository
+    model = Aluguel
+    streams = {
+        'iter_by_cliente': '_by_cliente_query',
+        'iter_active_rentals': '_active_rentals_query',
+        'iter_rentals_in_period': '_rentals_in_period_query',
+    }
+
+
+class AsyncAvaliacaoRepository(AsyncRepository):
+    sync_repository = AvaliacaoRepository
+    model = Avaliacao
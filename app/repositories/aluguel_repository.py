@@ -1,132 +1,529 @@
-from typing import List, Optional, Tuple
-from datetime import date, datetime
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, between
-from models import Aluguel, Cliente, Hospedagem
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple, Iterable, Union
+from datetime import date, timedelta
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, extract, func, select, update
+from identifiers import uuid7
+from models import Aluguel, Cliente, Hospedagem, ReceitaDiaria, check_stay_length
+from instrumentation import instrumented
+from routing import read_only
+from text_normalization import prefix_range, search_key
+from .bulk import (DEFAULT_BATCH_SIZE, Filters, bulk_insert, bulk_upsert, chain_hooks,
+                   checked_values, delete_rows, matching_keys, update_rows, where_clause)
+from .cache import (CacheBackend, evict, invalidate, mark_dirty, read_through, read_through_many,
+                    stored_row)
+from .archive import archive, archived, rentals_before
+from .availability import AvailabilityIndex
+from .loading import Load, with_load
+from .pagination import Page, paginate
+from .projection import Columns, project, projection
+from .streaming import DEFAULT_CHUNK_SIZE, stream
+from .partitions import is_partitioned, overlapping
+from .retry import DEFAULT_ATTEMPTS, run_in_transaction
+from .revenue_rollup import apply_rentals, rental_values
+from .unit_of_work import after_commit, commit
 
+if TYPE_CHECKING:
+    from analytics import OccupancyStats
+
+REVENUE_DIMENSIONS = {
+    'hospedagem': ReceitaDiaria.hospedagem_id,
+    'proprietario': ReceitaDiaria.proprietario_id,
+    'cidade': ReceitaDiaria.cidade,
+}
+
+# Columns the revenue rollup and the availability index are derived from
+ROLLUP_COLUMNS = {'hospedagem_id', 'data_inicio', 'data_fim', 'preco_total'}
+
+@instrumented
 class AluguelRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, availability: Optional[AvailabilityIndex] = None,
+                 cache: Optional[CacheBackend] = None):
         self.db = db
+        self.availability = availability
+        self.cache = cache
+
+    def _index(self, aluguel: Aluguel):
+        if self.availability is not None:
+            self.availability.add(aluguel.aluguel_id, aluguel.hospedagem_id,
+                                  aluguel.data_inicio, aluguel.data_fim)
+
+    def _index_rows(self, rows: List[dict]):
+        for row in rows:
+            self.availability.add(row['aluguel_id'], row.get('hospedagem_id'),
+                                  row.get('data_inicio'), row.get('data_fim'))
+
+    def _reindex_rows(self, rows: List[dict]):
+        # Upserted rows may be partial, so read the committed calendar back
+        stored = self.db.execute(
+            select(Aluguel.aluguel_id, Aluguel.hospedagem_id,
+                   Aluguel.data_inicio, Aluguel.data_fim)
+            .filter(Aluguel.aluguel_id.in_([row['aluguel_id'] for row in rows]))
+        )
+        for aluguel_id, hospedagem_id, data_inicio, data_fim in stored:
+            self.availability.add(aluguel_id, hospedagem_id, data_inicio, data_fim)
+
+    @staticmethod
+    def _rental(aluguel: Aluguel):
+        return (aluguel.hospedagem_id, aluguel.data_inicio,
+                aluguel.data_fim, aluguel.preco_total)
+
+    def _apply_rows(self, rows: List[dict]):
+        apply_rentals(self.db, (
+            (row.get('hospedagem_id'), row.get('data_inicio'),
+             row.get('data_fim'), row.get('preco_total'))
+            for row in rows
+        ))
+
+    def _overlapping(self, start_date: date, end_date: date):
+        # Both ends are inclusive: a stay ending on start_date still conflicts
+        return overlapping(start_date, end_date, is_partitioned(self.db))
+
+    @staticmethod
+    def _checked(aluguel: Union[Aluguel, dict]) -> Union[Aluguel, dict]:
+        if isinstance(aluguel, dict):
+            check_stay_length(aluguel.get('data_inicio'), aluguel.get('data_fim'))
+        else:
+            check_stay_length(aluguel.data_inicio, aluguel.data_fim)
+        return aluguel
+
+    def _evict_rows(self, rows: List[dict]):
+        evict(self.cache, Aluguel, [row['aluguel_id'] for row in rows])
+
+    def _mark_rows(self, rows: List[dict]):
+        mark_dirty(self.db, self.cache, Aluguel, [row['aluguel_id'] for row in rows])
+
+    def _lock_hospedagem(self, hospedagem_id: str) -> bool:
+        """Hold the hospedagem's row lock until the transaction ends; False
+        if there is no such hospedagem"""
+        if self.db.get_bind(Hospedagem).dialect.name == 'sqlite':
+            # SQLite has no FOR UPDATE: a no-op write takes the database write lock
+            return self.db.execute(
+                update(Hospedagem).where(Hospedagem.hospedagem_id == hospedagem_id)
+                .values(hospedagem_id=Hospedagem.hospedagem_id)
+                .execution_options(synchronize_session=False)
+            ).rowcount == 1
+        return self.db.execute(
+            select(Hospedagem.hospedagem_id).where(Hospedagem.hospedagem_id == hospedagem_id)
+            .with_for_update()
+        ).first() is not None
 
     def create(self, aluguel: Aluguel) -> Aluguel:
+        self._checked(aluguel)
         self.db.add(aluguel)
-        self.db.commit()
-        self.db.refresh(aluguel)
+        self.db.flush()
+        apply_rentals(self.db, [self._rental(aluguel)])
+        if commit(self.db):
+            self.db.refresh(aluguel)
+        after_commit(self.db, self._index, aluguel)
         return aluguel
 
-    def get_by_id(self, aluguel_id: str, with_relations: bool = False) -> Optional[Aluguel]:
-        query = self.db.query(Aluguel)
-        if with_relations:
-            query = query.options(
-                joinedload(Aluguel.cliente),
-                joinedload(Aluguel.hospedagem)
-            )
-        return query.filter(Aluguel.aluguel_id == aluguel_id).first()
+    def reserve(self, cliente_id: str, hospedagem_id: str, start_date: date, end_date: date,
+                preco_total, aluguel_id: Optional[str] = None,
+                attempts: int = DEFAULT_ATTEMPTS) -> Optional[Aluguel]:
+        """Book a hospedagem in one transaction; None if the period overlaps
+        another rental
+
+        The hospedagem row is locked (SELECT ... FOR UPDATE) before looking for
+        overlaps, so reservations of the same hospedagem run one at a time
+        and cannot double-book, while other hospedagens book in parallel.
+        Deadlocks and lock timeouts run the whole transaction again.
+        """
+        check_stay_length(start_date, end_date)
+        aluguel_id = aluguel_id or uuid7()
+
+        def book() -> Optional[Aluguel]:
+            if not self._lock_hospedagem(hospedagem_id):
+                raise ValueError(f"Unknown hospedagem: {hospedagem_id!r}")
+            # Read after taking the lock, so it sees every committed booking
+            conflict = self.db.query(Aluguel.aluguel_id).filter(
+                Aluguel.hospedagem_id == hospedagem_id,
+                self._overlapping(start_date, end_date)
+            ).first()
+            if conflict is not None:
+                return None
+            aluguel = Aluguel(aluguel_id=aluguel_id, cliente_id=cliente_id,
+                              hospedagem_id=hospedagem_id, data_inicio=start_date,
+                              data_fim=end_date, preco_total=preco_total)
+            self.db.add(aluguel)
+            self.db.flush()
+            apply_rentals(self.db, [self._rental(aluguel)])
+            return aluguel
 
+        aluguel = run_in_transaction(self.db, book, attempts)
+        if aluguel is not None:
+            after_commit(self.db, self._index, aluguel)
+        return aluguel
+
+    def create_many(self, alugueis: Iterable[Union[Aluguel, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        on_batch = self._index_rows if self.availability is not None else None
+        alugueis = (self._checked(aluguel) for aluguel in alugueis)
+        return bulk_insert(self.db, Aluguel, alugueis, batch_size, return_keys, on_batch,
+                           before_commit=self._apply_rows)
+
+    def upsert_many(self, alugueis: Iterable[Union[Aluguel, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        on_batch = chain_hooks(self._reindex_rows if self.availability is not None else None,
+                               self._evict_rows if self.cache is not None else None)
+        mark_rows = self._mark_rows if self.cache is not None else None
+        alugueis = (self._checked(aluguel) for aluguel in alugueis)
+
+        # Swap the stored version of each upserted rental for the new one
+        def remove_previous(rows: List[dict]):
+            apply_rentals(self.db, rental_values(self.db, (row['aluguel_id'] for row in rows)), sign=-1)
+            # Partitioned alugueis are keyed by (aluguel_id, data_inicio), so a
+            # rental moving to another data_inicio must replace the stored row
+            stored = {
+                row.aluguel_id: row._asdict() for row in self.db.execute(
+                    select(Aluguel.__table__)
+                    .where(Aluguel.aluguel_id.in_([row['aluguel_id'] for row in rows]))
+                )
+            }
+            moved = []
+            for row in rows:
+                previous = stored.get(row['aluguel_id'])
+                if previous is not None and row.setdefault('data_inicio', previous['data_inicio']) \
+                        != previous['data_inicio']:
+                    # Reinserted whole: keep the columns the upsert leaves out
+                    for column, value in previous.items():
+                        row.setdefault(column, value)
+                    moved.append(row['aluguel_id'])
+            if moved:
+                delete_rows(self.db, Aluguel, Aluguel.aluguel_id.in_(moved))
+
+        def add_current(rows: List[dict]):
+            apply_rentals(self.db, rental_values(self.db, (row['aluguel_id'] for row in rows)))
+
+        return bulk_upsert(self.db, Aluguel, alugueis, batch_size, return_keys, on_batch,
+                           before_write=remove_previous,
+                           before_commit=chain_hooks(add_current, mark_rows))
+
+    @read_only
+    def get_by_id(self, aluguel_id: str, load: Load = None) -> Optional[Aluguel]:
+        query = with_load(self.db.query(Aluguel), Aluguel, load)
+        query = query.filter(Aluguel.aluguel_id == aluguel_id)
+        if self.cache is not None and load is None:
+            return read_through(self.db, self.cache, Aluguel, aluguel_id, query.first)
+        return query.first()
+
+    @read_only
+    def get_by_ids(self, aluguel_ids: List[str], load: Load = None,
+                   columns: Columns = None) -> List[Aluguel]:
+        """The rows with these keys, in no particular order; unknown keys are skipped"""
+        query = with_load(self.db.query(Aluguel), Aluguel, load)
+        if self.cache is not None and load is None and columns is None:
+            return read_through_many(self.db, self.cache, Aluguel, aluguel_ids,
+                                     lambda missing: query.filter(Aluguel.aluguel_id.in_(missing)).all())
+        return project(query, Aluguel, columns, load).filter(
+            Aluguel.aluguel_id.in_(aluguel_ids)
+        ).all()
+
+    @read_only
     def get_all(self, skip: int = 0, limit: int = 100, 
-                with_relations: bool = False) -> List[Aluguel]:
-        query = self.db.query(Aluguel)
-        if with_relations:
-            query = query.options(
-                joinedload(Aluguel.cliente),
-                joinedload(Aluguel.hospedagem)
-            )
-        return query.offset(skip).limit(limit).all()
+                load: Load = None, columns: Columns = None) -> List[Aluguel]:
+        query = with_load(self.db.query(Aluguel), Aluguel, load)
+        return project(query, Aluguel, columns, load).offset(skip).limit(limit).all()
+
+    @read_only
+    def get_all_page(self, cursor: Optional[str] = None, limit: int = 100,
+                     reverse: bool = False, load: Load = None,
+                     columns: Columns = None) -> Page[Aluguel]:
+        query = with_load(self.db.query(Aluguel), Aluguel, load)
+        query = project(query, Aluguel, columns, load, keys=('aluguel_id',))
+        return paginate(query, [(Aluguel.aluguel_id, False)], cursor, limit, reverse)
 
-    def get_by_cliente(self, cliente_id: str, with_relations: bool = False) -> List[Aluguel]:
-        query = self.db.query(Aluguel).filter(
+    @read_only
+    def get_by_cliente(self, cliente_id: str, load: Load = None, columns: Columns = None,
+                       include_archived: bool = False) -> List[Aluguel]:
+        rows = project(self._by_cliente_query(cliente_id, load), Aluguel, columns, load).all()
+        if include_archived:
+            rows += archived(self.db, Aluguel, {'cliente_id': cliente_id}, load, columns)
+        return rows
+
+    def _by_cliente_query(self, cliente_id: str, load: Load = None):
+        return with_load(self.db.query(Aluguel), Aluguel, load).filter(
             Aluguel.cliente_id == cliente_id
         )
-        if with_relations:
-            query = query.options(
-                joinedload(Aluguel.cliente),
-                joinedload(Aluguel.hospedagem)
-            )
-        return query.all()
 
-    def get_by_hospedagem(self, hospedagem_id: str, with_relations: bool = False) -> List[Aluguel]:
-        query = self.db.query(Aluguel).filter(
+    @read_only
+    def iter_by_cliente(self, cliente_id: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        as_rows: bool = False, load: Load = None,
+                        columns: Columns = None) -> Iterator[Aluguel]:
+        return stream(self._by_cliente_query(cliente_id, load), Aluguel, chunk_size, as_rows,
+                      columns, load)
+
+    @read_only
+    def get_by_hospedagem(self, hospedagem_id: str, load: Load = None, columns: Columns = None,
+                          include_archived: bool = False) -> List[Aluguel]:
+        query = with_load(self.db.query(Aluguel), Aluguel, load)
+        rows = project(query, Aluguel, columns, load).filter(
             Aluguel.hospedagem_id == hospedagem_id
-        )
-        if with_relations:
-            query = query.options(
-                joinedload(Aluguel.cliente),
-                joinedload(Aluguel.hospedagem)
-            )
-        return query.all()
+        ).all()
+        if include_archived:
+            rows += archived(self.db, Aluguel, {'hospedagem_id': hospedagem_id}, load, columns)
+        return rows
 
     def update(self, aluguel_id: str, aluguel_data: dict) -> Optional[Aluguel]:
-        aluguel = self.get_by_id(aluguel_id)
+        # Writes start from the stored row, never from a cached snapshot
+        aluguel = stored_row(self.db, Aluguel, aluguel_id, self.cache)
         if aluguel:
+            check_stay_length(aluguel_data.get('data_inicio', aluguel.data_inicio),
+                              aluguel_data.get('data_fim', aluguel.data_fim))
+            previous = self._rental(aluguel)
             for key, value in aluguel_data.items():
                 if hasattr(aluguel, key):
                     setattr(aluguel, key, value)
-            self.db.commit()
-            self.db.refresh(aluguel)
+            if self._rental(aluguel) != previous:
+                apply_rentals(self.db, [previous], sign=-1)
+                apply_rentals(self.db, [self._rental(aluguel)])
+            if commit(self.db):
+                self.db.refresh(aluguel)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Aluguel, [aluguel_id])
+            after_commit(self.db, self._index, aluguel)
         return aluguel
 
     def delete(self, aluguel_id: str) -> bool:
-        aluguel = self.get_by_id(aluguel_id)
+        aluguel = stored_row(self.db, Aluguel, aluguel_id, self.cache)
         if aluguel:
+            apply_rentals(self.db, [self._rental(aluguel)], sign=-1)
             self.db.delete(aluguel)
-            self.db.commit()
+            commit(self.db)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Aluguel, [aluguel_id])
+            if self.availability is not None:
+                after_commit(self.db, self.availability.remove, aluguel_id)
             return True
         return False
 
-    def get_active_rentals(self, as_of_date: date = None) -> List[Aluguel]:
+    def update_where(self, filters: Filters, values: dict) -> int:
+        """Set `values` on every aluguel matching `filters` with one UPDATE
+
+        Nothing is loaded; returns the number of rows matched. When `values`
+        change dates, prices or hospedagens, the matched rentals are swapped
+        out of the revenue rollup before the UPDATE and back in after it.
+        """
+        condition = where_clause(Aluguel, filters)
+        values = checked_values(Aluguel, values)
+        # Setting one date alone is left to the stay length CHECK
+        check_stay_length(values.get('data_inicio'), values.get('data_fim'))
+        rollup = not ROLLUP_COLUMNS.isdisjoint(values)
+        if not rollup and self.cache is None:
+            count = update_rows(self.db, Aluguel, condition, values)
+            commit(self.db)
+            return count
+
+        keys = matching_keys(self.db, Aluguel, condition)
+        if not keys:
+            return 0
+        if rollup:
+            apply_rentals(self.db, rental_values(self.db, keys), sign=-1)
+        # Update exactly the rentals taken out of the rollup
+        count = update_rows(self.db, Aluguel, Aluguel.aluguel_id.in_(keys), values)
+        if rollup:
+            apply_rentals(self.db, rental_values(self.db, keys))
+        commit(self.db)
+        if self.cache is not None:
+            invalidate(self.db, self.cache, Aluguel, keys)
+        if rollup and self.availability is not None:
+            after_commit(self.db, self._reindex_rows, [{'aluguel_id': key} for key in keys])
+        return count
+
+    def delete_by_ids(self, aluguel_ids: Iterable[str]) -> int:
+        """Delete some alugueis with one DELETE; returns how many existed"""
+        aluguel_ids = list(aluguel_ids)
+        if not aluguel_ids:
+            return 0
+        apply_rentals(self.db, rental_values(self.db, aluguel_ids), sign=-1)
+        count = delete_rows(self.db, Aluguel, Aluguel.aluguel_id.in_(aluguel_ids))
+        commit(self.db)
+        if self.cache is not None:
+            invalidate(self.db, self.cache, Aluguel, aluguel_ids)
+        if self.availability is not None:
+            for aluguel_id in aluguel_ids:
+                after_commit(self.db, self.availability.remove, aluguel_id)
+        return count
+
+    def _forget(self, aluguel_ids: List[str]):
+        if self.cache is not None:
+            evict(self.cache, Aluguel, aluguel_ids)
+        if self.availability is not None:
+            for aluguel_id in aluguel_ids:
+                self.availability.remove(aluguel_id)
+
+    def archive_before(self, cutoff: date, batch_size: int = DEFAULT_BATCH_SIZE,
+                       pause: float = 0.0, max_batches: Optional[int] = None) -> int:
+        """Move the rentals that ended before `cutoff` to alugueis_arquivo
+
+        One transaction per batch, `pause` seconds apart; returns how many
+        moved. Their nights stay in the revenue rollup, and reads see them
+        again with include_archived=True.
+        """
+        return archive(self.db, Aluguel, rentals_before(cutoff), batch_size, pause, max_batches,
+                       on_batch=self._forget)
+
+    def _active_rentals_query(self, as_of_date: date = None, load: Load = None):
         if as_of_date is None:
             as_of_date = date.today()
         
-        return self.db.query(Aluguel).filter(
-            and_(
-                Aluguel.data_inicio <= as_of_date,
-                Aluguel.data_fim >= as_of_date
-            )
-        ).all()
+        return with_load(self.db.query(Aluguel), Aluguel, load).filter(
+            self._overlapping(as_of_date, as_of_date)
+        )
+
+    @read_only
+    def get_active_rentals(self, as_of_date: date = None, load: Load = None,
+                           columns: Columns = None) -> List[Aluguel]:
+        return project(self._active_rentals_query(as_of_date, load), Aluguel, columns, load).all()
+
+    @read_only
+    def iter_active_rentals(self, as_of_date: date = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                            as_rows: bool = False, load: Load = None,
+                            columns: Columns = None) -> Iterator[Aluguel]:
+        return stream(self._active_rentals_query(as_of_date, load), Aluguel, chunk_size, as_rows,
+                      columns, load)
 
+    @read_only
     def check_availability(self, hospedagem_id: str, start_date: date, end_date: date) -> bool:
+        if self.availability is not None and self.availability.loaded:
+            return self.availability.is_available(hospedagem_id, start_date, end_date)
+
         overlapping_rentals = self.db.query(Aluguel).filter(
             and_(
                 Aluguel.hospedagem_id == hospedagem_id,
-                or_(
-                    between(start_date, Aluguel.data_inicio, Aluguel.data_fim),
-                    between(end_date, Aluguel.data_inicio, Aluguel.data_fim),
-                    and_(Aluguel.data_inicio >= start_date, Aluguel.data_inicio <= end_date),
-                    and_(Aluguel.data_fim >= start_date, Aluguel.data_fim <= end_date)
-                )
+                self._overlapping(start_date, end_date)
             )
         ).count()
         
         return overlapping_rentals == 0
 
-    def get_rentals_in_period(self, start_date: date, end_date: date) -> List[Aluguel]:
-        return self.db.query(Aluguel).filter(
-            or_(
-                between(Aluguel.data_inicio, start_date, end_date),
-                between(Aluguel.data_fim, start_date, end_date),
-                and_(Aluguel.data_inicio <= start_date, Aluguel.data_fim >= end_date)
-            )
-        ).all()
+    @read_only
+    def check_availability_many(self, hospedagem_ids: Iterable[str],
+                                start_date: date, end_date: date) -> Dict[str, bool]:
+        hospedagem_ids = list(hospedagem_ids)
+        if self.availability is not None and self.availability.loaded:
+            return self.availability.availability(hospedagem_ids, start_date, end_date)
 
-    def get_revenue_by_period(self, start_date: date, end_date: date) -> float:
-        result = self.db.query(
-            sqlalchemy.func.sum(Aluguel.preco_total)
-        ).filter(
-            and_(
-                Aluguel.data_inicio >= start_date,
-                Aluguel.data_fim <= end_date
-            )
+        booked = {
+            hospedagem_id for (hospedagem_id,) in self.db.query(Aluguel.hospedagem_id).filter(
+                and_(
+                    Aluguel.hospedagem_id.in_(hospedagem_ids),
+                    self._overlapping(start_date, end_date)
+                )
+            ).distinct()
+        }
+        return {hospedagem_id: hospedagem_id not in booked for hospedagem_id in hospedagem_ids}
+
+    def _rentals_in_period_query(self, start_date: date, end_date: date, load: Load = None):
+        return with_load(self.db.query(Aluguel), Aluguel, load).filter(
+            self._overlapping(start_date, end_date)
+        )
+
+    @read_only
+    def get_rentals_in_period(self, start_date: date, end_date: date,
+                              load: Load = None, columns: Columns = None) -> List[Aluguel]:
+        return project(self._rentals_in_period_query(start_date, end_date, load),
+                       Aluguel, columns, load).all()
+
+    @read_only
+    def iter_rentals_in_period(self, start_date: date, end_date: date,
+                               chunk_size: int = DEFAULT_CHUNK_SIZE,
+                               as_rows: bool = False, load: Load = None,
+                               columns: Columns = None) -> Iterator[Aluguel]:
+        return stream(self._rentals_in_period_query(start_date, end_date, load),
+                      Aluguel, chunk_size, as_rows, columns, load)
+
+    def _revenue_query(self, start_date: date, end_date: date, hospedagem_id: str = None,
+                       proprietario_id: str = None, cidade: str = None):
+        query = self.db.query(func.sum(ReceitaDiaria.valor)).filter(
+            ReceitaDiaria.dia.between(start_date, end_date)
+        )
+        if hospedagem_id is not None:
+            query = query.filter(ReceitaDiaria.hospedagem_id == hospedagem_id)
+        if proprietario_id is not None:
+            query = query.filter(ReceitaDiaria.proprietario_id == proprietario_id)
+        if cidade is not None:
+            # Stored as the city's search key, matched like every cidade filter
+            query = query.filter(prefix_range(ReceitaDiaria.cidade, search_key(cidade)))
+        return query
+
+    @read_only
+    def get_revenue_by_period(self, start_date: date, end_date: date, hospedagem_id: str = None,
+                              proprietario_id: str = None, cidade: str = None) -> float:
+        """Revenue earned by the nights from start_date to end_date, both inclusive
+
+        Each rental's price is prorated by night, so a stay crossing the
+        period boundary contributes only the nights inside it.
+        """
+        result = self._revenue_query(
+            start_date, end_date, hospedagem_id, proprietario_id, cidade
         ).scalar()
-        
+
         return float(result) if result else 0.0
 
-    def get_most_frequent_clients(self, limit: int = 10) -> List[Tuple[Cliente, int]]:
-        from sqlalchemy import func
-        
-        result = self.db.query(
-            Cliente,
+    @read_only
+    def get_revenue_by_month(self, year: int, month: int, hospedagem_id: str = None,
+                             proprietario_id: str = None, cidade: str = None) -> float:
+        start_date = date(year, month, 1)
+        end_date = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        return self.get_revenue_by_period(start_date, end_date, hospedagem_id,
+                                          proprietario_id, cidade)
+
+    @read_only
+    def get_revenue_by_year(self, year: int, hospedagem_id: str = None,
+                            proprietario_id: str = None, cidade: str = None) -> float:
+        return self.get_revenue_by_period(date(year, 1, 1), date(year, 12, 31), hospedagem_id,
+                                          proprietario_id, cidade)
+
+    @read_only
+    def get_revenue_breakdown(self, start_date: date, end_date: date,
+                              by: str = 'hospedagem', limit: int = 100) -> List[Tuple[str, float]]:
+        """Top revenue per hospedagem, proprietario or cidade over a period
+
+        Cities are named by their search key ('sao paulo'), so spellings of
+        the same city add up.
+        """
+        if by not in REVENUE_DIMENSIONS:
+            raise ValueError(f"Unknown revenue dimension: {by!r}")
+        dimension = REVENUE_DIMENSIONS[by]
+        total = func.sum(ReceitaDiaria.valor)
+        rows = self.db.query(dimension, total).filter(
+            ReceitaDiaria.dia.between(start_date, end_date)
+        ).group_by(dimension).order_by(total.desc()).limit(limit).all()
+
+        return [(key, float(value)) for key, value in rows]
+
+    @read_only
+    def get_monthly_revenue(self, year: int, hospedagem_id: str = None,
+                            proprietario_id: str = None, cidade: str = None) -> Dict[int, float]:
+        month = extract('month', ReceitaDiaria.dia)
+        query = self._revenue_query(date(year, 1, 1), date(year, 12, 31), hospedagem_id,
+                                    proprietario_id, cidade)
+        rows = query.add_columns(month).group_by(month).all()
+        return {int(number): float(value) for value, number in rows}
+
+    @read_only
+    def get_occupancy(self, start_date: date, end_date: date, by: str = 'cidade',
+                      chunk_size: int = None) -> Dict[object, 'OccupancyStats']:
+        """Occupancy, average stay, nightly rate and gap distributions per
+        hospedagem, cidade, tipo or proprietario over a period
+
+        Streams the rentals in chunks of `chunk_size` and aggregates them with
+        NumPy (see analytics.occupancy).
+        """
+        from analytics import DEFAULT_CHUNK_SIZE as ANALYTICS_CHUNK_SIZE, occupancy
+        return occupancy(self.db, start_date, end_date, by, chunk_size or ANALYTICS_CHUNK_SIZE)
+
+    @read_only
+    def get_most_frequent_clients(self, limit: int = 10,
+                                  load: Load = None,
+                                  columns: Columns = None) -> List[Tuple[Cliente, int]]:
+        entity = Cliente if columns is None else projection(Cliente, columns, load)
+        result = with_load(self.db.query(
+            entity,
             func.count(Aluguel.aluguel_id).label('rental_count')
-        ).join(Aluguel).group_by(Cliente.cliente_id).order_by(
+        ), Cliente, load).join(Aluguel, Aluguel.cliente_id == Cliente.cliente_id).group_by(Cliente.cliente_id).order_by(
             func.count(Aluguel.aluguel_id).desc()
         ).limit(limit).all()
         
@@ -0,0 +1,135 @@
+"""Hot/cold archival of alugueis and avaliacoes
+
+Old rows move to `alugueis_arquivo` and `avaliacoes_arquivo`, tables with
+the same columns, so the hot tables and their indexes only hold what the
+application reads every day. Each batch copies up to `batch_size` rows and
+deletes them from the hot table in one transaction, so an interrupted run
+loses nothing and the next run picks up where it stopped: the cutoff
+condition selects whatever is left.
+
+A rental is old once it ended before the cutoff. Reviews have no date of
+their own, so their age is the timestamp of their UUIDv7 key. Reviews with
+keys of another UUID version (the UUID4 keys written before UUIDv7) fall
+back on the stays of their cliente at their hospedagem: they are old once
+all of those ended before the cutoff, and never archived without one.
+"""
+import time
+import uuid
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, exists, func, insert, inspect, not_, or_, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement
+
+from models import Aluguel, AluguelArquivo, Avaliacao, AvaliacaoArquivo
+from .bulk import DEFAULT_BATCH_SIZE
+from .loading import Load, with_load
+from .projection import Columns, project
+from .unit_of_work import after_commit, commit
+
+ARCHIVES: Dict[type, type] = {
+    Aluguel: AluguelArquivo,
+    Avaliacao: AvaliacaoArquivo,
+}
+
+
+def rentals_before(cutoff: date) -> ColumnElement:
+    """Rentals that ended before `cutoff`"""
+    return Aluguel.data_fim < cutoff
+
+
+def _uuid7_floor(cutoff: date) -> str:
+    """The smallest UUIDv7 made on `cutoff` (UTC); older ones sort below it"""
+    milliseconds = int(datetime(cutoff.year, cutoff.month, cutoff.day,
+                                tzinfo=timezone.utc).timestamp() * 1000)
+    return str(uuid.UUID(int=milliseconds << 80))
+
+
+def _stays(model, *conditions) -> ColumnElement:
+    """EXISTS a rental in `model` of the review's cliente at its hospedagem"""
+    return exists().where(model.cliente_id == Avaliacao.cliente_id,
+                          model.hospedagem_id == Avaliacao.hospedagem_id, *conditions)
+
+
+def reviews_before(cutoff: date) -> ColumnElement:
+    """Reviews whose UUIDv7 key was made before `cutoff`, and reviews with
+    other keys whose cliente's stays at the hospedagem all ended before it
+
+    BINARY(16) keys compare byte by byte and a UUIDv7 starts with its
+    timestamp, so the first case is a range of the primary key. The 7th
+    byte holds the version: other versions are random in the leading bytes.
+    """
+    version = func.substr(Avaliacao.avaliacao_id, 7, 1)
+    uuid7 = and_(version >= b'\x70', version < b'\x80')
+    return or_(
+        and_(Avaliacao.avaliacao_id < _uuid7_floor(cutoff), uuid7),
+        and_(
+            not_(uuid7),
+            or_(_stays(Aluguel), _stays(AluguelArquivo)),
+            not_(_stays(Aluguel, Aluguel.data_fim >= cutoff)),
+            not_(_stays(AluguelArquivo, AluguelArquivo.data_fim >= cutoff)),
+        ),
+    )
+
+
+def archived(db: Session, model, filters: Dict[str, Any], load: Load = None,
+             columns: Columns = None) -> list:
+    """The archived rows of `model` with these column values, read with the
+    same `load` or `columns` as the hot ones; entities are AluguelArquivo or
+    AvaliacaoArquivo"""
+    archive = ARCHIVES[model]
+    query = with_load(db.query(archive), archive, load)
+    return project(query, archive, columns, load).filter(
+        *(getattr(archive, name) == value for name, value in filters.items())
+    ).all()
+
+
+def archive_batch(db: Session, model, condition: ColumnElement,
+                  batch_size: int = DEFAULT_BATCH_SIZE,
+                  before_commit: Optional[Callable[[List[str]], None]] = None) -> List[str]:
+    """Move up to `batch_size` rows matching `condition`, oldest key first;
+    returns their keys, empty once nothing matches
+
+    `before_commit` gets the keys after the copy and the delete, in the same
+    transaction.
+    """
+    archive = ARCHIVES[model]
+    key = inspect(model).primary_key[0]
+    keys = db.scalars(select(key).where(condition).order_by(key).limit(batch_size)).all()
+    if not keys:
+        return []
+    table = model.__table__
+    db.execute(insert(archive.__table__).from_select(
+        [column.name for column in table.columns], select(table).where(key.in_(keys))
+    ))
+    db.execute(delete(table).where(key.in_(keys)))
+    if before_commit is not None:
+        before_commit(keys)
+    commit(db)
+    return keys
+
+
+def archive(db: Session, model, condition: ColumnElement,
+            batch_size: int = DEFAULT_BATCH_SIZE, pause: float = 0.0,
+            max_batches: Optional[int] = None,
+            before_commit: Optional[Callable[[List[str]], None]] = None,
+            on_batch: Optional[Callable[[List[str]], None]] = None) -> int:
+    """Move every row matching `condition`, batch by batch; returns how many moved
+
+    Sleeping `pause` seconds between batches leaves the database room for
+    the application. `max_batches` stops early; running again resumes.
+    `on_batch` gets the keys of each batch once it committed.
+    """
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        keys = archive_batch(db, model, condition, batch_size, before_commit)
+        if not keys:
+            break
+        moved += len(keys)
+        batches += 1
+        if on_batch is not None:
+            after_commit(db, on_batch, keys)
+        if pause and len(keys) == batch_size:
+            time.sleep(pause)
+    return moved
@@ -0,0 +1,145 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Aluguel
+
+
+class _Calendar:
+    """Booked intervals of one hospedagem, sorted by start date
+
+    `max_end[i]` holds the latest end among the first i + 1 intervals, so an
+    overlap check is a single bisect even if legacy rows overlap each other.
+    """
+
+    __slots__ = ('starts', 'ends', 'ids', 'max_end')
+
+    def __init__(self):
+        self.starts: List[date] = []
+        self.ends: List[date] = []
+        self.ids: List[str] = []
+        self.max_end: List[date] = []
+
+    def _refresh_max_end(self, position: int):
+        del self.max_end[position:]
+        current = self.max_end[-1] if self.max_end else None
+        for end in self.ends[position:]:
+            current = end if current is None or end > current else current
+            self.max_end.append(current)
+
+    def add(self, aluguel_id: str, start: date, end: date):
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.ids.insert(position, aluguel_id)
+        self._refresh_max_end(position)
+
+    def remove(self, aluguel_id: str, start: date) -> bool:
+        position = bisect_left(self.starts, start)
+        while position < len(self.starts) and self.starts[position] == start:
+            if self.ids[position] == aluguel_id:
+                del self.starts[position]
+                del self.ends[position]
+                del self.ids[position]
+                self._refresh_max_end(position)
+                return True
+            position += 1
+        return False
+
+    def is_free(self, start: date, end: date) -> bool:
+        # Both ends are inclusive, matching AluguelRepository.check_availability
+        candidates = bisect_right(self.starts, end)
+        return candidates == 0 or self.max_end[candidates - 1] < start
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+class AvailabilityIndex:
+    """In-memory availability engine built from `alugueis`
+
+    Share one instance across AluguelRepository objects (one per session) and
+    the repository keeps it in sync on every committed write. Until `rebuild`
+    has run, repositories keep answering availability from the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._calendars: Dict[str, _Calendar] = {}
+        self._bookings: Dict[str, Tuple[str, date]] = {}
+        self.loaded = False
+
+    def rebuild(self, db: Session, chunk_size: int = 10000) -> int:
+        """Reload every rental from the database, replacing the current state"""
+        calendars: Dict[str, _Calendar] = {}
+        bookings: Dict[str, Tuple[str, date]] = {}
+        rows = db.execute(
+            select(Aluguel.aluguel_id, Aluguel.hospedagem_id,
+                   Aluguel.data_inicio, Aluguel.data_fim)
+            .order_by(Aluguel.hospedagem_id, Aluguel.data_inicio)
+            .execution_options(yield_per=chunk_size)
+        )
+        for aluguel_id, hospedagem_id, start, end in rows:
+            if hospedagem_id is None or start is None or end is None:
+                continue
+            calendar = calendars.get(hospedagem_id)
+            if calendar is None:
+                calendar = calendars[hospedagem_id] = _Calendar()
+            # Rows arrive sorted by start, so appending keeps the order
+            calendar.starts.append(start)
+            calendar.ends.append(end)
+            calendar.ids.append(aluguel_id)
+            previous = calendar.max_end[-1] if calendar.max_end else end
+            calendar.max_end.append(max(previous, end))
+            bookings[aluguel_id] = (hospedagem_id, start)
+
+        with self._lock:
+            self._calendars = calendars
+            self._bookings = bookings
+            self.loaded = True
+        return len(bookings)
+
+    def add(self, aluguel_id: str, hospedagem_id: Optional[str],
+            start: Optional[date], end: Optional[date]):
+        """Record a rental, replacing any previous version of it"""
+        with self._lock:
+            self.remove(aluguel_id)
+            if hospedagem_id is None or start is None or end is None:
+                return
+            calendar = self._calendars.get(hospedagem_id)
+            if calendar is None:
+                calendar = self._calendars[hospedagem_id] = _Calendar()
+            calendar.add(aluguel_id, start, end)
+            self._bookings[aluguel_id] = (hospedagem_id, start)
+
+    def remove(self, aluguel_id: str) -> bool:
+        with self._lock:
+            booking = self._bookings.pop(aluguel_id, None)
+            if booking is None:
+                return False
+            hospedagem_id, start = booking
+            calendar = self._calendars[hospedagem_id]
+            calendar.remove(aluguel_id, start)
+            if not calendar:
+                del self._calendars[hospedagem_id]
+            return True
+
+    def is_available(self, hospedagem_id: str, start: date, end: date) -> bool:
+        with self._lock:
+            calendar = self._calendars.get(hospedagem_id)
+            return calendar is None or calendar.is_free(start, end)
+
+    def availability(self, hospedagem_ids: Iterable[str],
+                     start: date, end: date) -> Dict[str, bool]:
+        with self._lock:
+            return {
+                hospedagem_id: (
+                    hospedagem_id not in self._calendars
+                    or self._calendars[hospedagem_id].is_free(start, end)
+                )
+                for hospedagem_id in hospedagem_ids
+            }
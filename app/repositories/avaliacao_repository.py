@@ -1,122 +1,348 @@
-from typing import List, Optional, Tuple
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, func
-from models import Avaliacao, Cliente, Hospedagem
+from datetime import date
+from typing import List, Optional, Tuple, Iterable, Union
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, select
+from models import Avaliacao, AvaliacaoArquivo, AvaliacaoResumo, Cliente, Hospedagem
+from instrumentation import instrumented
+from routing import read_only
+from .archive import archive, archived, reviews_before
+from .bulk import (DEFAULT_BATCH_SIZE, Filters, bulk_insert, bulk_upsert, chain_hooks,
+                   checked_values, delete_rows, matching_keys, update_rows, where_clause)
+from .cache import (CacheBackend, evict, invalidate, mark_dirty, read_through, read_through_many,
+                    stored_row)
+from .loading import Load, with_load
+from .pagination import Page, paginate
+from .projection import Columns, project, projection
+from .rating_aggregates import apply_rating, refresh_ratings
+from .fulltext import SEARCH_ENTITIES, SearchBackend, load_hits
+from .unit_of_work import after_commit, commit
 
 
+@instrumented
 class AvaliacaoRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, search_backend: Optional[SearchBackend] = None,
+                 cache: Optional[CacheBackend] = None):
         self.db = db
+        self.search_backend = search_backend
+        self.cache = cache
+
+    def _index_rows(self, rows: List[dict]):
+        fields = SEARCH_ENTITIES['avaliacoes'].fields
+        for row in rows:
+            self.search_backend.index('avaliacoes', row['avaliacao_id'],
+                                      [row.get(field) for field in fields])
+
+    def _reindex_rows(self, rows: List[dict]):
+        self.search_backend.reindex(self.db, 'avaliacoes', [row['avaliacao_id'] for row in rows])
+
+    def _evict_rows(self, rows: List[dict]):
+        evict(self.cache, Avaliacao, [row['avaliacao_id'] for row in rows])
+
+    def _mark_rows(self, rows: List[dict]):
+        mark_dirty(self.db, self.cache, Avaliacao, [row['avaliacao_id'] for row in rows])
 
     def create(self, avaliacao: Avaliacao) -> Avaliacao:
         self.db.add(avaliacao)
-        self.db.commit()
-        self.db.refresh(avaliacao)
+        self.db.flush()
+        apply_rating(self.db, avaliacao.hospedagem_id, avaliacao.nota)
+        if commit(self.db):
+            self.db.refresh(avaliacao)
+        if self.search_backend is not None:
+            after_commit(self.db, self.search_backend.index_object, 'avaliacoes', avaliacao)
         return avaliacao
 
-    def get_by_id(self, avaliacao_id: str, with_relations: bool = False) -> Optional[Avaliacao]:
-        query = self.db.query(Avaliacao)
-        if with_relations:
-            query = query.options(
-                joinedload(Avaliacao.cliente),
-                joinedload(Avaliacao.hospedagem)
-            )
-        return query.filter(Avaliacao.avaliacao_id == avaliacao_id).first()
+    def _refresh_ratings_of(self, rows: List[dict]):
+        refresh_ratings(self.db, (row.get('hospedagem_id') for row in rows))
+
+    def create_many(self, avaliacoes: Iterable[Union[Avaliacao, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        on_batch = self._index_rows if self.search_backend is not None else None
+        return bulk_insert(self.db, Avaliacao, avaliacoes, batch_size, return_keys, on_batch,
+                           before_commit=self._refresh_ratings_of)
+
+    def upsert_many(self, avaliacoes: Iterable[Union[Avaliacao, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        affected = set()
+
+        def collect_previous(rows: List[dict]):
+            # Rows may move a review to another hospedagem; refresh both sides
+            affected.clear()
+            affected.update(self.db.scalars(
+                select(Avaliacao.hospedagem_id).where(
+                    Avaliacao.avaliacao_id.in_([row['avaliacao_id'] for row in rows])
+                )
+            ))
+
+        def refresh(rows: List[dict]):
+            affected.update(row.get('hospedagem_id') for row in rows)
+            refresh_ratings(self.db, affected)
+
+        on_batch = chain_hooks(self._reindex_rows if self.search_backend is not None else None,
+                               self._evict_rows if self.cache is not None else None)
+        mark_rows = self._mark_rows if self.cache is not None else None
+        return bulk_upsert(self.db, Avaliacao, avaliacoes, batch_size, return_keys, on_batch,
+                           before_write=collect_previous,
+                           before_commit=chain_hooks(refresh, mark_rows))
 
+    @read_only
+    def get_by_id(self, avaliacao_id: str, load: Load = None) -> Optional[Avaliacao]:
+        query = with_load(self.db.query(Avaliacao), Avaliacao, load)
+        query = query.filter(Avaliacao.avaliacao_id == avaliacao_id)
+        if self.cache is not None and load is None:
+            return read_through(self.db, self.cache, Avaliacao, avaliacao_id, query.first)
+        return query.first()
+
+    @read_only
+    def get_by_ids(self, avaliacao_ids: List[str], load: Load = None,
+                   columns: Columns = None) -> List[Avaliacao]:
+        """The rows with these keys, in no particular order; unknown keys are skipped"""
+        query = with_load(self.db.query(Avaliacao), Avaliacao, load)
+        if self.cache is not None and load is None and columns is None:
+            return read_through_many(self.db, self.cache, Avaliacao, avaliacao_ids,
+                                     lambda missing: query.filter(Avaliacao.avaliacao_id.in_(missing)).all())
+        return project(query, Avaliacao, columns, load).filter(
+            Avaliacao.avaliacao_id.in_(avaliacao_ids)
+        ).all()
+
+    @read_only
     def get_all(self, skip: int = 0, limit: int = 100, 
-                with_relations: bool = False) -> List[Avaliacao]:
-        query = self.db.query(Avaliacao)
-        if with_relations:
-            query = query.options(
-                joinedload(Avaliacao.cliente),
-                joinedload(Avaliacao.hospedagem)
-            )
-        return query.offset(skip).limit(limit).all()
+                load: Load = None, columns: Columns = None) -> List[Avaliacao]:
+        query = with_load(self.db.query(Avaliacao), Avaliacao, load)
+        return project(query, Avaliacao, columns, load).offset(skip).limit(limit).all()
 
-    def get_by_cliente(self, cliente_id: str, with_relations: bool = False) -> List[Avaliacao]:
-        query = self.db.query(Avaliacao).filter(
+    @read_only
+    def get_all_page(self, cursor: Optional[str] = None, limit: int = 100,
+                     reverse: bool = False, load: Load = None,
+                     columns: Columns = None) -> Page[Avaliacao]:
+        query = with_load(self.db.query(Avaliacao), Avaliacao, load)
+        query = project(query, Avaliacao, columns, load, keys=('avaliacao_id',))
+        return paginate(query, [(Avaliacao.avaliacao_id, False)], cursor, limit, reverse)
+
+    @read_only
+    def get_by_cliente(self, cliente_id: str, load: Load = None, columns: Columns = None,
+                       include_archived: bool = False) -> List[Avaliacao]:
+        query = with_load(self.db.query(Avaliacao), Avaliacao, load)
+        rows = project(query, Avaliacao, columns, load).filter(
             Avaliacao.cliente_id == cliente_id
-        )
-        if with_relations:
-            query = query.options(
-                joinedload(Avaliacao.cliente),
-                joinedload(Avaliacao.hospedagem)
-            )
-        return query.all()
-
-    def get_by_hospedagem(self, hospedagem_id: str, with_relations: bool = False) -> List[Avaliacao]:
-        query = self.db.query(Avaliacao).filter(
+        ).all()
+        if include_archived:
+            rows += archived(self.db, Avaliacao, {'cliente_id': cliente_id}, load, columns)
+        return rows
+
+    @read_only
+    def get_by_hospedagem(self, hospedagem_id: str, load: Load = None, columns: Columns = None,
+                          include_archived: bool = False) -> List[Avaliacao]:
+        query = with_load(self.db.query(Avaliacao), Avaliacao, load)
+        rows = project(query, Avaliacao, columns, load).filter(
             Avaliacao.hospedagem_id == hospedagem_id
-        )
-        if with_relations:
-            query = query.options(
-                joinedload(Avaliacao.cliente),
-                joinedload(Avaliacao.hospedagem)
-            )
-        return query.all()
+        ).all()
+        if include_archived:
+            rows += archived(self.db, Avaliacao, {'hospedagem_id': hospedagem_id}, load, columns)
+        return rows
 
     def update(self, avaliacao_id: str, avaliacao_data: dict) -> Optional[Avaliacao]:
-        avaliacao = self.get_by_id(avaliacao_id)
+        # Writes start from the stored row, never from a cached snapshot
+        avaliacao = stored_row(self.db, Avaliacao, avaliacao_id, self.cache)
         if avaliacao:
+            previous = (avaliacao.hospedagem_id, avaliacao.nota)
             for key, value in avaliacao_data.items():
                 if hasattr(avaliacao, key):
                     setattr(avaliacao, key, value)
-            self.db.commit()
-            self.db.refresh(avaliacao)
+            if previous != (avaliacao.hospedagem_id, avaliacao.nota):
+                apply_rating(self.db, *previous, sign=-1)
+                apply_rating(self.db, avaliacao.hospedagem_id, avaliacao.nota)
+            if commit(self.db):
+                self.db.refresh(avaliacao)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Avaliacao, [avaliacao_id])
+            if self.search_backend is not None:
+                after_commit(self.db, self.search_backend.index_object, 'avaliacoes', avaliacao)
         return avaliacao
 
     def delete(self, avaliacao_id: str) -> bool:
-        avaliacao = self.get_by_id(avaliacao_id)
+        avaliacao = stored_row(self.db, Avaliacao, avaliacao_id, self.cache)
         if avaliacao:
+            apply_rating(self.db, avaliacao.hospedagem_id, avaliacao.nota, sign=-1)
             self.db.delete(avaliacao)
-            self.db.commit()
+            commit(self.db)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Avaliacao, [avaliacao_id])
+            if self.search_backend is not None:
+                after_commit(self.db, self.search_backend.remove, 'avaliacoes', avaliacao_id)
             return True
         return False
 
-    def get_average_rating(self, hospedagem_id: str) -> Optional[float]:
-        result = self.db.query(
-            func.avg(Avaliacao.nota).label('average_rating')
-        ).filter(
-            Avaliacao.hospedagem_id == hospedagem_id
-        ).scalar()
+    def _rated_hospedagens(self, condition) -> set:
+        return set(self.db.scalars(
+            select(Avaliacao.hospedagem_id).where(condition).distinct()
+        ))
+
+    def update_where(self, filters: Filters, values: dict) -> int:
+        """Set `values` on every avaliacao matching `filters` with one UPDATE
+
+        Nothing is loaded; returns the number of rows matched. Changing notes
+        or hospedagens recomputes the rating aggregates of every hospedagem
+        involved.
+        """
+        condition = where_clause(Avaliacao, filters)
+        values = checked_values(Avaliacao, values)
+        rated = {'nota', 'hospedagem_id'} & set(values)
+        affected = self._rated_hospedagens(condition) if rated else set()
+        tracked = self.cache is not None or self.search_backend is not None
+        keys = matching_keys(self.db, Avaliacao, condition) if tracked else []
+        count = update_rows(self.db, Avaliacao, condition, values)
+        if rated:
+            affected.add(values.get('hospedagem_id'))
+            refresh_ratings(self.db, affected)
+        commit(self.db)
+        if self.cache is not None:
+            invalidate(self.db, self.cache, Avaliacao, keys)
+        if self.search_backend is not None:
+            after_commit(self.db, self.search_backend.reindex, self.db, 'avaliacoes', keys)
+        return count
+
+    def delete_by_ids(self, avaliacao_ids: Iterable[str]) -> int:
+        """Delete some avaliacoes with one DELETE; returns how many existed"""
+        avaliacao_ids = list(avaliacao_ids)
+        if not avaliacao_ids:
+            return 0
+        selected = Avaliacao.avaliacao_id.in_(avaliacao_ids)
+        affected = self._rated_hospedagens(selected)
+        count = delete_rows(self.db, Avaliacao, selected)
+        refresh_ratings(self.db, affected)
+        commit(self.db)
+        if self.cache is not None:
+            invalidate(self.db, self.cache, Avaliacao, avaliacao_ids)
+        if self.search_backend is not None:
+            for avaliacao_id in avaliacao_ids:
+                after_commit(self.db, self.search_backend.remove, 'avaliacoes', avaliacao_id)
+        return count
+
+    def _forget(self, avaliacao_ids: List[str]):
+        if self.cache is not None:
+            evict(self.cache, Avaliacao, avaliacao_ids)
+        if self.search_backend is not None:
+            for avaliacao_id in avaliacao_ids:
+                self.search_backend.remove('avaliacoes', avaliacao_id)
+
+    def _refresh_ratings_of_archived(self, avaliacao_ids: List[str]):
+        refresh_ratings(self.db, self.db.scalars(
+            select(AvaliacaoArquivo.hospedagem_id).distinct()
+            .where(AvaliacaoArquivo.avaliacao_id.in_(avaliacao_ids))
+        ))
+
+    def archive_before(self, cutoff: date, batch_size: int = DEFAULT_BATCH_SIZE,
+                       pause: float = 0.0, max_batches: Optional[int] = None) -> int:
+        """Move the reviews made before `cutoff` to avaliacoes_arquivo
+
+        Only UUIDv7 keys tell when a review was made; reviews with older keys
+        go once every stay of their cliente at the hospedagem ended before
+        `cutoff`, and stay if there is none. One transaction per batch, `pause` seconds apart; returns how many moved.
+        The rating aggregates and the search index drop the moved reviews.
+        """
+        return archive(self.db, Avaliacao, reviews_before(cutoff), batch_size, pause, max_batches,
+                       before_commit=self._refresh_ratings_of_archived, on_batch=self._forget)
+
+    @read_only
+    def get_average_rating(self, hospedagem_id: str,
+                           include_archived: bool = False) -> Optional[float]:
+        result = self.db.query(AvaliacaoResumo.soma, AvaliacaoResumo.quantidade).filter(
+            AvaliacaoResumo.hospedagem_id == hospedagem_id
+        ).first()
+        soma, quantidade = (result.soma, result.quantidade) if result else (0, 0)
+        if include_archived:
+            archived_soma, archived_quantidade = self.db.query(
+                func.coalesce(func.sum(AvaliacaoArquivo.nota), 0), func.count(AvaliacaoArquivo.nota)
+            ).filter(AvaliacaoArquivo.hospedagem_id == hospedagem_id).one()
+            soma, quantidade = soma + archived_soma, quantidade + archived_quantidade
         
-        return float(result) if result else None
+        # SUM over the archive comes back as a Decimal on MySQL
+        return float(soma) / quantidade if quantidade else None
 
-    def get_ratings_summary(self, hospedagem_id: str) -> dict:
-        result = self.db.query(
-            Avaliacao.nota,
-            func.count(Avaliacao.avaliacao_id).label('count')
-        ).filter(
-            Avaliacao.hospedagem_id == hospedagem_id
-        ).group_by(Avaliacao.nota).all()
+    @read_only
+    def get_ratings_summary(self, hospedagem_id: str, include_archived: bool = False) -> dict:
+        resumo = self.db.query(AvaliacaoResumo).filter(
+            AvaliacaoResumo.hospedagem_id == hospedagem_id
+        ).first()
         
         summary = {rating: 0 for rating in range(1, 6)}
-        for nota, count in result:
-            summary[nota] = count
+        if resumo:
+            for rating in summary:
+                summary[rating] = getattr(resumo, f'nota_{rating}')
+        if include_archived:
+            for rating, count in self.db.query(AvaliacaoArquivo.nota, func.count()).filter(
+                AvaliacaoArquivo.hospedagem_id == hospedagem_id,
+                AvaliacaoArquivo.nota.in_(list(summary))
+            ).group_by(AvaliacaoArquivo.nota):
+                summary[rating] += count
         
         return summary
 
-    def get_recent_reviews(self, hospedagem_id: str, limit: int = 5) -> List[Avaliacao]:
-        return self.db.query(Avaliacao).filter(
+    @read_only
+    def get_recent_reviews(self, hospedagem_id: str, limit: int = 5,
+                           load: Load = None, columns: Columns = None) -> List[Avaliacao]:
+        query = with_load(self.db.query(Avaliacao), Avaliacao, load)
+        return project(query, Avaliacao, columns, load).filter(
             Avaliacao.hospedagem_id == hospedagem_id
         ).order_by(Avaliacao.avaliacao_id.desc()).limit(limit).all()
 
-    def get_highest_rated_hospedagens(self, limit: int = 10) -> List[Tuple[Hospedagem, float]]:
-        from sqlalchemy import func
-        
-        result = self.db.query(
-            Hospedagem,
-            func.avg(Avaliacao.nota).label('average_rating'),
-            func.count(Avaliacao.avaliacao_id).label('review_count')
-        ).join(Avaliacao).group_by(Hospedagem.hospedagem_id).having(
-            func.count(Avaliacao.avaliacao_id) >= 3
+    @read_only
+    def get_highest_rated_hospedagens(self, limit: int = 10,
+                                      load: Load = None,
+                                      columns: Columns = None) -> List[Tuple[Hospedagem, float, int]]:
+        entity = Hospedagem if columns is None else projection(Hospedagem, columns, load)
+        result = with_load(self.db.query(
+            entity,
+            AvaliacaoResumo.media.label('average_rating'),
+            AvaliacaoResumo.quantidade.label('review_count')
+        ), Hospedagem, load).join(
+            AvaliacaoResumo, AvaliacaoResumo.hospedagem_id == Hospedagem.hospedagem_id
+        ).filter(
+            AvaliacaoResumo.quantidade >= 3
         ).order_by(
-            func.avg(Avaliacao.nota).desc()
+            AvaliacaoResumo.media.desc()
         ).limit(limit).all()
         
-        return result
+        # media is a NUMERIC column, read back as a Decimal
+        return [(hospedagem, float(average_rating), review_count)
+                for hospedagem, average_rating, review_count in result]
 
-    def search_by_comment(self, search_term: str, skip: int = 0, limit: int = 100) -> List[Avaliacao]:
-        return self.db.query(Avaliacao).filter(
+    def _search_by_comment_query(self, search_term: str, load: Load = None):
+        return with_load(self.db.query(Avaliacao), Avaliacao, load).filter(
             Avaliacao.comentario.ilike(f"%{search_term}%")
-        ).offset(skip).limit(limit).all()
\ No newline at end of file
+        )
+
+    @read_only
+    def search_by_comment(self, search_term: str, skip: int = 0, limit: int = 100,
+                          load: Load = None, columns: Columns = None) -> List[Avaliacao]:
+        if self.search_backend is not None and self.search_backend.ready('avaliacoes'):
+            ranked = self.search_by_comment_ranked(search_term, skip + limit, load, columns)
+            return [avaliacao for avaliacao, _ in ranked[skip:]]
+        query = project(self._search_by_comment_query(search_term, load), Avaliacao, columns, load)
+        return query.offset(skip).limit(limit).all()
+
+    @read_only
+    def search_by_comment_ranked(self, search_term: str,
+                                 limit: int = 20,
+                                 load: Load = None,
+                                 columns: Columns = None) -> List[Tuple[Avaliacao, float]]:
+        """Most relevant reviews first, by word or word prefix of the comment
+
+        Without a ready `search_backend` this falls back to the substring
+        search, with every match scored 0.0.
+        """
+        if self.search_backend is None or not self.search_backend.ready('avaliacoes'):
+            query = project(self._search_by_comment_query(search_term, load), Avaliacao, columns, load)
+            return [(avaliacao, 0.0) for avaliacao in query.limit(limit)]
+        hits = self.search_backend.search(self.db, 'avaliacoes', search_term, limit)
+        return load_hits(self.db, 'avaliacoes', hits, load, columns)
+
+    @read_only
+    def search_by_comment_page(self, search_term: str, cursor: Optional[str] = None,
+                               limit: int = 100, reverse: bool = False,
+                               load: Load = None, columns: Columns = None) -> Page[Avaliacao]:
+        return paginate(project(self._search_by_comment_query(search_term, load), Avaliacao,
+                                columns, load, keys=('avaliacao_id',)),
+                        [(Avaliacao.avaliacao_id, False)], cursor, limit, reverse)
\ No newline at end of file
@@ -0,0 +1,220 @@
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from sqlalchemy import and_, delete, insert, inspect, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement
+
+from identifiers import uuid7
+
+from .unit_of_work import after_commit, commit, rollback
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Column equalities ({'proprietario_id': ..., 'ativo': True}, a list or set
+# meaning IN) or any SQLAlchemy condition on the model
+Filters = Union[Dict[str, Any], ColumnElement]
+
+
+def to_row(model, item: Union[Dict[str, Any], Any]) -> Dict[str, Any]:
+    """Turn a model instance or a plain dict into a dict of column values"""
+    columns = model.__table__.columns
+    if isinstance(item, dict):
+        row = {key: value for key, value in item.items() if key in columns}
+    else:
+        row = {
+            column.key: getattr(item, column.key)
+            for column in columns
+            if getattr(item, column.key, None) is not None
+        }
+
+    pk = inspect(model).primary_key[0].key
+    if not row.get(pk):
+        row[pk] = uuid7()
+        if not isinstance(item, dict):
+            setattr(item, pk, row[pk])
+    return row
+
+
+def chain_hooks(*hooks: Optional[Callable]) -> Optional[Callable]:
+    """One batch hook running every hook given that is not None, or None"""
+    hooks = [hook for hook in hooks if hook is not None]
+    if not hooks:
+        return None
+    if len(hooks) == 1:
+        return hooks[0]
+
+    def run(rows: List[Dict[str, Any]]):
+        for hook in hooks:
+            hook(rows)
+    return run
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def group_by_keys(rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    # executemany needs every row of a statement to carry the same keys
+    groups: Dict[frozenset, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(frozenset(row), []).append(row)
+    return list(groups.values())
+
+
+def _upsert_statement(db: Session, model, rows: List[Dict[str, Any]]):
+    table = model.__table__
+    pk_names = {column.key for column in table.primary_key.columns}
+    update_keys = sorted({key for row in rows for key in row} - pk_names)
+    dialect = db.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table)
+        return stmt.on_duplicate_key_update(
+            {key: stmt.inserted[key] for key in update_keys}
+        )
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        if not update_keys:
+            return stmt.on_conflict_do_nothing(index_elements=list(pk_names))
+        return stmt.on_conflict_do_update(
+            index_elements=list(pk_names),
+            set_={key: stmt.excluded[key] for key in update_keys}
+        )
+
+    return None
+
+
+def bulk_insert(db: Session, model, items: Iterable,
+                batch_size: int = DEFAULT_BATCH_SIZE,
+                return_keys: bool = False,
+                on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                before_commit: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> Optional[List[str]]:
+    """Insert rows with one executemany per batch, committing each batch
+
+    `before_commit` runs inside each batch's transaction, after the write;
+    `on_batch` receives the rows of every batch once it is committed. Inside
+    a unit of work batches are only flushed and `on_batch` waits for its commit.
+    """
+    pk = inspect(model).primary_key[0].key
+    keys = [] if return_keys else None
+
+    for chunk in chunked(items, batch_size):
+        rows = [to_row(model, item) for item in chunk]
+        try:
+            for group in group_by_keys(rows):
+                db.execute(insert(model.__table__), group)
+            if before_commit is not None:
+                before_commit(rows)
+            commit(db)
+        except Exception:
+            rollback(db)
+            raise
+        if on_batch is not None:
+            after_commit(db, on_batch, rows)
+        if return_keys:
+            keys.extend(row[pk] for row in rows)
+
+    return keys
+
+
+def bulk_upsert(db: Session, model, items: Iterable,
+                batch_size: int = DEFAULT_BATCH_SIZE,
+                return_keys: bool = False,
+                on_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                before_write: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                before_commit: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> Optional[List[str]]:
+    """Insert rows or update the existing ones sharing the same primary key
+
+    The hooks work as in `bulk_insert`; `before_write` also runs inside the
+    batch's transaction, before any row is written.
+    """
+    pk = inspect(model).primary_key[0].key
+    keys = [] if return_keys else None
+
+    for chunk in chunked(items, batch_size):
+        rows = [to_row(model, item) for item in chunk]
+        try:
+            if before_write is not None:
+                before_write(rows)
+            for group in group_by_keys(rows):
+                stmt = _upsert_statement(db, model, group)
+                if stmt is not None:
+                    db.execute(stmt, group)
+                else:
+                    for row in group:
+                        db.merge(model(**row))
+            if before_commit is not None:
+                before_commit(rows)
+            commit(db)
+        except Exception:
+            rollback(db)
+            raise
+        if on_batch is not None:
+            after_commit(db, on_batch, rows)
+        if return_keys:
+            keys.extend(row[pk] for row in rows)
+
+    return keys
+
+
+def where_clause(model, filters: Filters) -> ColumnElement:
+    """The WHERE condition of a set-based write; refuses to match every row"""
+    if isinstance(filters, ColumnElement):
+        return filters
+    if not filters:
+        raise ValueError('A set-based write needs at least one filter')
+    columns = model.__table__.columns
+    conditions = []
+    for key, value in filters.items():
+        if key not in columns:
+            raise ValueError(f'{model.__name__} has no column {key!r}')
+        if isinstance(value, (list, tuple, set, frozenset)):
+            conditions.append(columns[key].in_(list(value)))
+        else:
+            conditions.append(columns[key] == value)
+    return and_(*conditions)
+
+
+def checked_values(model, values: Dict[str, Any]) -> Dict[str, Any]:
+    columns = model.__table__.columns
+    unknown = sorted(set(values) - set(columns.keys()))
+    if unknown:
+        raise ValueError(f'{model.__name__} has no column(s) {", ".join(unknown)}')
+    if not values:
+        raise ValueError('Nothing to update')
+    return values
+
+
+def matching_keys(db: Session, model, condition: ColumnElement) -> List[str]:
+    """Primary keys of the rows a set-based write is about to touch"""
+    pk = inspect(model).primary_key[0]
+    return list(db.scalars(select(pk).where(condition)))
+
+
+def update_rows(db: Session, model, condition: ColumnElement, values: Dict[str, Any]) -> int:
+    """One UPDATE over every matching row; loaded objects are updated in place"""
+    result = db.execute(
+        update(model).where(condition).values(**values)
+        .execution_options(synchronize_session='auto')
+    )
+    return result.rowcount
+
+
+def delete_rows(db: Session, model, condition: ColumnElement) -> int:
+    """One DELETE over every matching row; loaded objects leave the session"""
+    result = db.execute(
+        delete(model).where(condition).execution_options(synchronize_session='auto')
+    )
+    return result.rowcount
@@ -0,0 +1,269 @@
+import pickle
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from identifiers import parse_uuid
+from .unit_of_work import active_unit_of_work, after_commit
+
+# Column values of one row, never ORM state
+Snapshot = Dict[str, Any]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class CacheBackend(ABC):
+    """Where get_by_id snapshots live; share one instance across repositories"""
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def _count(self, **increments: int):
+        with self._stats_lock:
+            for name, value in increments.items():
+                setattr(self._stats, name, getattr(self._stats, name) + value)
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Snapshot]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, snapshot: Snapshot):
+        ...
+
+    @abstractmethod
+    def delete(self, keys: Iterable[str]):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    def stats(self) -> CacheStats:
+        with self._stats_lock:
+            return CacheStats(**vars(self._stats))
+
+
+class LocalLRUCache(CacheBackend):
+    """In-process LRU with a time-to-live, bounded to `max_entries` rows"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[float, Snapshot]]' = OrderedDict()
+
+    def get(self, key: str) -> Optional[Snapshot]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._count(misses=1)
+                return None
+            expires_at, snapshot = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._count(misses=1, expirations=1)
+                return None
+            self._entries.move_to_end(key)
+        self._count(hits=1)
+        return snapshot
+
+    def set(self, key: str, snapshot: Snapshot):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self._count(evictions=evicted)
+
+    def delete(self, keys: Iterable[str]):
+        removed = 0
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    removed += 1
+        self._count(invalidations=removed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        stats = super().stats()
+        with self._lock:
+            stats.size = len(self._entries)
+        return stats
+
+
+class SharedCache(CacheBackend):
+    """Snapshots in a shared key-value store such as Redis or Memcached
+
+    `client` needs `get(key)`, `set(key, value, ex=seconds)` and
+    `delete(*keys)`, plus `scan_iter(match=pattern)` for `clear`, all of
+    which redis.Redis provides. Bound its memory on the
+    server side (e.g. Redis `maxmemory-policy allkeys-lru`); evictions done
+    there are not counted here. Values are pickled, so only point it at a
+    store this application alone writes to.
+    """
+
+    def __init__(self, client, ttl: int = 60, prefix: str = 'insight_places:'):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Snapshot]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self._count(misses=1)
+            return None
+        self._count(hits=1)
+        return pickle.loads(raw)
+
+    def set(self, key: str, snapshot: Snapshot):
+        self.client.set(self.prefix + key, pickle.dumps(snapshot), ex=self.ttl)
+
+    def delete(self, keys: Iterable[str]):
+        keys = [self.prefix + key for key in keys]
+        if keys:
+            self.client.delete(*keys)
+            self._count(invalidations=len(keys))
+
+    def clear(self, batch_size: int = 500):
+        """Delete every entry under `prefix`, `batch_size` keys per round trip"""
+        batch = []
+        for key in self.client.scan_iter(match=self.prefix + '*', count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                self.client.delete(*batch)
+                self._count(invalidations=len(batch))
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+            self._count(invalidations=len(batch))
+
+
+def cache_key(model, key: str) -> str:
+    return f'{model.__tablename__}:{key}'
+
+
+def snapshot(obj) -> Snapshot:
+    return {attribute.key: getattr(obj, attribute.key) for attribute in inspect(obj).mapper.column_attrs}
+
+
+def restore(db: Session, model, values: Snapshot):
+    """Attach a snapshot to `db` as a persistent, unmodified object, without SQL
+
+    An object already in the session's identity map wins over the snapshot.
+    """
+    mapper = inspect(model)
+    identity = mapper.identity_key_from_primary_key(
+        [values[column.key] for column in mapper.primary_key]
+    )
+    existing = db.identity_map.get(identity)
+    if existing is not None:
+        return existing
+
+    obj = mapper.class_manager.new_instance()
+    for name, value in values.items():
+        setattr(obj, name, value)
+    make_transient_to_detached(obj)
+    db.add(obj)
+    return obj
+
+
+def read_through(db: Session, cache: CacheBackend, model, key: str,
+                 load: Callable[[], Optional[Any]]):
+    """Serve `model` row `key` from `cache`, falling back to `load()` on a miss
+
+    Misses are not cached, so a row created later is found right away.
+    Keys dirty in the active unit of work bypass the cache.
+    """
+    if _dirty(db, model, key):
+        return load()
+    values = cache.get(cache_key(model, key))
+    if values is not None:
+        return restore(db, model, values)
+    obj = load()
+    if obj is not None:
+        cache.set(cache_key(model, key), snapshot(obj))
+    return obj
+
+
+def read_through_many(db: Session, cache: CacheBackend, model, keys: Iterable[str],
+                      load: Callable[[List[str]], List[Any]]) -> List[Any]:
+    """Serve some `model` rows from `cache`, loading the misses with one `load(missing_keys)`"""
+    found, missing = [], []
+    for key in dict.fromkeys(keys):
+        values = None if _dirty(db, model, key) else cache.get(cache_key(model, key))
+        if values is not None:
+            found.append(restore(db, model, values))
+        else:
+            missing.append(key)
+    if missing:
+        key_name = inspect(model).primary_key[0].key
+        for obj in load(missing):
+            key = getattr(obj, key_name)
+            if not _dirty(db, model, key):
+                cache.set(cache_key(model, key), snapshot(obj))
+            found.append(obj)
+    return found
+
+
+def evict(cache: CacheBackend, model, keys: Iterable[str]):
+    cache.delete(cache_key(model, key) for key in keys)
+
+
+def _dirty(db: Session, model, key: str) -> bool:
+    unit_of_work = active_unit_of_work(db)
+    return unit_of_work is not None and cache_key(model, key) in unit_of_work.dirty
+
+
+def mark_dirty(db: Session, cache: CacheBackend, model, keys: Iterable[str]):
+    """Inside a unit of work, evict rows it just wrote and keep its reads of
+    them off the cache until it commits; outside one, do nothing"""
+    unit_of_work = active_unit_of_work(db)
+    if unit_of_work is not None:
+        keys = list(keys)
+        evict(cache, model, keys)
+        unit_of_work.dirty.update(cache_key(model, key) for key in keys)
+
+
+def invalidate(db: Session, cache: CacheBackend, model, keys: Iterable[str]):
+    """Evict rows a write changed once it commits; inside a unit of work
+    they are also marked dirty right away"""
+    keys = list(keys)
+    mark_dirty(db, cache, model, keys)
+    after_commit(db, evict, cache, model, keys)
+
+
+def stored_row(db: Session, model, key: str, cache: Optional[CacheBackend]):
+    """Row `key` as stored, for writes, never a cached snapshot; None if
+    there is none or `key` is not a UUID"""
+    if parse_uuid(key) is None:
+        return None
+    return db.get(model, key, populate_existing=cache is not None)
@@ -1,59 +1,202 @@
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Iterable, Union
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from models import Cliente
+from instrumentation import instrumented
+from routing import read_only
+from .bulk import (DEFAULT_BATCH_SIZE, Filters, bulk_insert, bulk_upsert, chain_hooks,
+                   checked_values, delete_rows, matching_keys, update_rows, where_clause)
+from .cache import (CacheBackend, evict, invalidate, mark_dirty, read_through, read_through_many,
+                    stored_row)
+from .pagination import Page, paginate
+from .projection import Columns, project
+from .fulltext import SEARCH_ENTITIES, SearchBackend, load_hits
+from .loading import Load, with_load
+from .unit_of_work import after_commit, commit
 
+@instrumented
 class ClienteRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, search_backend: Optional[SearchBackend] = None,
+                 cache: Optional[CacheBackend] = None):
         self.db = db
+        self.search_backend = search_backend
+        self.cache = cache
+
+    def _index_rows(self, rows: List[dict]):
+        fields = SEARCH_ENTITIES['clientes'].fields
+        for row in rows:
+            self.search_backend.index('clientes', row['cliente_id'],
+                                      [row.get(field) for field in fields])
+
+    def _reindex_rows(self, rows: List[dict]):
+        self.search_backend.reindex(self.db, 'clientes', [row['cliente_id'] for row in rows])
+
+    def _evict_rows(self, rows: List[dict]):
+        evict(self.cache, Cliente, [row['cliente_id'] for row in rows])
+
+    def _mark_rows(self, rows: List[dict]):
+        mark_dirty(self.db, self.cache, Cliente, [row['cliente_id'] for row in rows])
 
     def create(self, cliente: Cliente) -> Cliente:
         self.db.add(cliente)
-        self.db.commit()
-        self.db.refresh(cliente)
+        if commit(self.db):
+            self.db.refresh(cliente)
+        if self.search_backend is not None:
+            after_commit(self.db, self.search_backend.index_object, 'clientes', cliente)
         return cliente
 
-    def get_by_id(self, cliente_id: str) -> Optional[Cliente]:
-        return self.db.query(Cliente).filter(
+    def create_many(self, clientes: Iterable[Union[Cliente, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        on_batch = self._index_rows if self.search_backend is not None else None
+        return bulk_insert(self.db, Cliente, clientes, batch_size, return_keys, on_batch)
+
+    def upsert_many(self, clientes: Iterable[Union[Cliente, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        on_batch = chain_hooks(self._reindex_rows if self.search_backend is not None else None,
+                               self._evict_rows if self.cache is not None else None)
+        mark_rows = self._mark_rows if self.cache is not None else None
+        return bulk_upsert(self.db, Cliente, clientes, batch_size, return_keys, on_batch,
+                           before_commit=mark_rows)
+
+    @read_only
+    def get_by_id(self, cliente_id: str, load: Load = None) -> Optional[Cliente]:
+        query = with_load(self.db.query(Cliente), Cliente, load).filter(
             Cliente.cliente_id == cliente_id
-        ).first()
+        )
+        if self.cache is not None and load is None:
+            return read_through(self.db, self.cache, Cliente, cliente_id, query.first)
+        return query.first()
+
+    @read_only
+    def get_all(self, skip: int = 0, limit: int = 100, load: Load = None,
+                columns: Columns = None) -> List[Cliente]:
+        query = with_load(self.db.query(Cliente), Cliente, load)
+        return project(query, Cliente, columns, load).offset(skip).limit(limit).all()
 
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Cliente]:
-        return self.db.query(Cliente).offset(skip).limit(limit).all()
+    @read_only
+    def get_all_page(self, cursor: Optional[str] = None, limit: int = 100,
+                     reverse: bool = False, load: Load = None,
+                     columns: Columns = None) -> Page[Cliente]:
+        query = with_load(self.db.query(Cliente), Cliente, load)
+        return paginate(project(query, Cliente, columns, load, keys=('cliente_id',)),
+                        [(Cliente.cliente_id, False)], cursor, limit, reverse)
 
-    def get_by_cpf(self, cpf: str) -> Optional[Cliente]:
-        return self.db.query(Cliente).filter(
+    @read_only
+    def get_by_cpf(self, cpf: str, load: Load = None) -> Optional[Cliente]:
+        return with_load(self.db.query(Cliente), Cliente, load).filter(
             Cliente.cpf == cpf
         ).first()
 
     def update(self, cliente_id: str, cliente_data: dict) -> Optional[Cliente]:
-        cliente = self.get_by_id(cliente_id)
+        # Writes start from the stored row, never from a cached snapshot
+        cliente = stored_row(self.db, Cliente, cliente_id, self.cache)
         if cliente:
             for key, value in cliente_data.items():
                 if hasattr(cliente, key):
                     setattr(cliente, key, value)
-            self.db.commit()
-            self.db.refresh(cliente)
+            if commit(self.db):
+                self.db.refresh(cliente)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Cliente, [cliente_id])
+            if self.search_backend is not None:
+                after_commit(self.db, self.search_backend.index_object, 'clientes', cliente)
         return cliente
 
     def delete(self, cliente_id: str) -> bool:
-        cliente = self.get_by_id(cliente_id)
+        cliente = stored_row(self.db, Cliente, cliente_id, self.cache)
         if cliente:
             self.db.delete(cliente)
-            self.db.commit()
+            commit(self.db)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Cliente, [cliente_id])
+            if self.search_backend is not None:
+                after_commit(self.db, self.search_backend.remove, 'clientes', cliente_id)
             return True
         return False
 
-    def search(self, search_term: str, skip: int = 0, limit: int = 100) -> List[Cliente]:
-        return self.db.query(Cliente).filter(
+    def _after_set_write(self, keys: List[str], removed: bool = False):
+        if self.cache is not None:
+            invalidate(self.db, self.cache, Cliente, keys)
+        if self.search_backend is not None and removed:
+            for key in keys:
+                after_commit(self.db, self.search_backend.remove, 'clientes', key)
+        elif self.search_backend is not None:
+            after_commit(self.db, self.search_backend.reindex, self.db, 'clientes', keys)
+
+    def update_where(self, filters: Filters, values: dict) -> int:
+        """Set `values` on every cliente matching `filters` with one UPDATE
+
+        Nothing is loaded; returns the number of rows matched.
+        """
+        condition = where_clause(Cliente, filters)
+        values = checked_values(Cliente, values)
+        tracked = self.cache is not None or self.search_backend is not None
+        keys = matching_keys(self.db, Cliente, condition) if tracked else []
+        count = update_rows(self.db, Cliente, condition, values)
+        commit(self.db)
+        self._after_set_write(keys)
+        return count
+
+    def delete_by_ids(self, cliente_ids: Iterable[str]) -> int:
+        """Delete some clientes with one DELETE; returns how many existed"""
+        cliente_ids = list(cliente_ids)
+        if not cliente_ids:
+            return 0
+        count = delete_rows(self.db, Cliente, Cliente.cliente_id.in_(cliente_ids))
+        commit(self.db)
+        self._after_set_write(cliente_ids, removed=True)
+        return count
+
+    def _search_query(self, search_term: str, load: Load = None):
+        return with_load(self.db.query(Cliente), Cliente, load).filter(
             or_(
                 Cliente.nome.ilike(f"%{search_term}%"),
                 Cliente.cpf.ilike(f"%{search_term}%"),
                 Cliente.contato.ilike(f"%{search_term}%")
             )
-        ).offset(skip).limit(limit).all()
+        )
+
+    @read_only
+    def search(self, search_term: str, skip: int = 0, limit: int = 100,
+               load: Load = None, columns: Columns = None) -> List[Cliente]:
+        if self.search_backend is not None and self.search_backend.ready('clientes'):
+            ranked = self.search_ranked(search_term, skip + limit, load, columns)
+            return [cliente for cliente, _ in ranked[skip:]]
+        query = project(self._search_query(search_term, load), Cliente, columns, load)
+        return query.offset(skip).limit(limit).all()
+
+    @read_only
+    def search_ranked(self, search_term: str, limit: int = 20,
+                      load: Load = None, columns: Columns = None) -> List[Tuple[Cliente, float]]:
+        """Best matches on nome, cpf and contato first, by word or word prefix
+
+        Without a ready `search_backend` this falls back to the substring
+        search, with every match scored 0.0.
+        """
+        if self.search_backend is None or not self.search_backend.ready('clientes'):
+            query = project(self._search_query(search_term, load), Cliente, columns, load)
+            return [(cliente, 0.0) for cliente in query.limit(limit)]
+        hits = self.search_backend.search(self.db, 'clientes', search_term, limit)
+        return load_hits(self.db, 'clientes', hits, load, columns)
+
+    @read_only
+    def search_page(self, search_term: str, cursor: Optional[str] = None, limit: int = 100,
+                    reverse: bool = False, load: Load = None,
+                    columns: Columns = None) -> Page[Cliente]:
+        return paginate(project(self._search_query(search_term, load), Cliente, columns, load,
+                                keys=('cliente_id',)),
+                        [(Cliente.cliente_id, False)], cursor, limit, reverse)
 
-    def get_by_ids(self, cliente_ids: List[str]) -> List[Cliente]:
-        return self.db.query(Cliente).filter(
+    @read_only
+    def get_by_ids(self, cliente_ids: List[str], load: Load = None,
+                   columns: Columns = None) -> List[Cliente]:
+        """The rows with these keys, in no particular order; unknown keys are skipped"""
+        query = with_load(self.db.query(Cliente), Cliente, load)
+        if self.cache is not None and load is None and columns is None:
+            return read_through_many(self.db, self.cache, Cliente, cliente_ids,
+                                     lambda missing: query.filter(Cliente.cliente_id.in_(missing)).all())
+        return project(query, Cliente, columns, load).filter(
             Cliente.cliente_id.in_(cliente_ids)
         ).all()
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""Request-scoped batching of get_by_id calls
+
+Code that walks a list and looks up a related row per item (the cliente of
+each review, the hospedagem of each rental) pays one query per item. A
+loader collects the keys first and fetches them with one `get_by_ids`, a
+single `IN (...)` query, per entity type:
+
+    loader = DataLoader(db)
+    pending = [loader.load(Cliente, avaliacao.cliente_id) for avaliacao in avaliacoes]
+    nomes = [cliente.get().nome for cliente in pending]   # the first get() runs one query
+
+Keys are deduplicated, and every answer, misses included, is memoized for
+the life of the loader. The memo never sees writes made elsewhere, so make
+one loader per request and `clear` what the request itself changes.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from models import Proprietario, Cliente, Endereco, Hospedagem, Aluguel, Avaliacao
+from .proprietario_repository import ProprietarioRepository
+from .cliente_repository import ClienteRepository
+from .endereco_repository import EnderecoRepository
+from .hospedagem_repository import HospedagemRepository
+from .aluguel_repository import AluguelRepository
+from .avaliacao_repository import AvaliacaoRepository
+from .cache import CacheBackend
+from .loading import Load
+
+REPOSITORIES: Dict[type, type] = {
+    Proprietario: ProprietarioRepository,
+    Cliente: ClienteRepository,
+    Endereco: EnderecoRepository,
+    Hospedagem: HospedagemRepository,
+    Aluguel: AluguelRepository,
+    Avaliacao: AvaliacaoRepository,
+}
+
+# Keys per IN list; larger batches are split
+DEFAULT_MAX_BATCH_SIZE = 1000
+
+
+class Batches:
+    """The queue and memo shared by DataLoader and AsyncDataLoader
+
+    `load` maps models to the load profile their rows are fetched with;
+    `cache` is passed to the repositories, so get_by_ids reads through it.
+    """
+
+    def __init__(self, load: Optional[Dict[type, Load]] = None,
+                 cache: Optional[CacheBackend] = None,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE):
+        self.load_profiles = load or {}
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.queries = 0
+        self._memo: Dict[Tuple[type, str], Any] = {}
+        # Insertion-ordered sets of the keys waiting, per model
+        self._queue: Dict[type, Dict[str, None]] = {}
+
+    def _check(self, model):
+        if model not in REPOSITORIES:
+            raise ValueError(f"No repository loads {getattr(model, '__name__', model)!r}; "
+                             f"expected one of {sorted(m.__name__ for m in REPOSITORIES)}")
+
+    def _enqueue(self, model, key: Optional[str]) -> bool:
+        """Queue `key` unless it is None or already answered; True if it waits"""
+        self._check(model)
+        if key is None or (model, key) in self._memo:
+            return False
+        self._queue.setdefault(model, {})[key] = None
+        return True
+
+    def _answer(self, model, key: Optional[str]):
+        return None if key is None else self._memo.get((model, key))
+
+    def _fetch_queued(self, db: Session):
+        """Run one get_by_ids per model and batch for everything queued"""
+        queue, self._queue = self._queue, {}
+        for model, keys in queue.items():
+            repository = REPOSITORIES[model](db, cache=self.cache)
+            key_name = inspect(model).primary_key[0].key
+            keys = list(keys)
+            for start in range(0, len(keys), self.max_batch_size):
+                chunk = keys[start:start + self.max_batch_size]
+                found = repository.get_by_ids(chunk, load=self.load_profiles.get(model))
+                self.queries += 1
+                self._memo.update(((model, key), None) for key in chunk)
+                self._memo.update(((model, getattr(obj, key_name)), obj) for obj in found)
+
+    def prime(self, model, obj):
+        """Memoize a row already at hand, so loading its key costs nothing"""
+        self._check(model)
+        self._memo[(model, getattr(obj, inspect(model).primary_key[0].key))] = obj
+
+    def clear(self, model=None, key: Optional[str] = None):
+        """Forget one key, every key of `model`, or everything"""
+        if model is None:
+            self._memo.clear()
+        elif key is None:
+            for memo_key in [memo_key for memo_key in self._memo if memo_key[0] is model]:
+                del self._memo[memo_key]
+        else:
+            self._memo.pop((model, key), None)
+
+
+class Pending:
+    """A get_by_id waiting in a DataLoader; `get()` answers it"""
+    __slots__ = ('loader', 'model', 'key')
+
+    def __init__(self, loader: 'DataLoader', model, key: Optional[str]):
+        self.loader = loader
+        self.model = model
+        self.key = key
+
+    def get(self) -> Optional[Any]:
+        """The row, or None if there is none; runs the queued batch if needed"""
+        return self.loader.get(self.model, self.key)
+
+
+class DataLoader(Batches):
+    """Batches the get_by_id calls of one request on a synchronous Session
+
+    `load` queues a key and returns a Pending; the first `get()` that needs
+    a row fetches every key queued so far. `get` and `get_many` answer
+    at once, fetching what is queued along with their own keys.
+    """
+
+    def __init__(self, db: Session, load: Optional[Dict[type, Load]] = None,
+                 cache: Optional[CacheBackend] = None,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE):
+        super().__init__(load, cache, max_batch_size)
+        self.db = db
+
+    def load(self, model, key: Optional[str]) -> Pending:
+        self._enqueue(model, key)
+        return Pending(self, model, key)
+
+    def load_many(self, model, keys: Iterable[Optional[str]]) -> List[Pending]:
+        return [self.load(model, key) for key in keys]
+
+    def dispatch(self):
+        """Fetch every queued key now"""
+        if self._queue:
+            self._fetch_queued(self.db)
+
+    def get(self, model, key: Optional[str]) -> Optional[Any]:
+        if self._enqueue(model, key):
+            self.dispatch()
+        return self._answer(model, key)
+
+    def get_many(self, model, keys: Iterable[Optional[str]]) -> List[Optional[Any]]:
+        """The rows of `keys` in the same order, None where there is none"""
+        keys = list(keys)
+        for key in keys:
+            self._enqueue(model, key)
+        self.dispatch()
+        return [self._answer(model, key) for key in keys]
@@ -1,71 +1,260 @@
-from typing import List, Optional
+from typing import Iterator, List, Optional, Iterable, Union
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from models import Endereco
+from sqlalchemy import and_, exists, select
+from models import Endereco, Hospedagem
+from instrumentation import instrumented
+from routing import read_only
+from text_normalization import digits, prefix_range, search_key
+from .bulk import (DEFAULT_BATCH_SIZE, Filters, bulk_insert, bulk_upsert, chain_hooks,
+                   checked_values, delete_rows, matching_keys, update_rows, where_clause)
+from .cache import (CacheBackend, evict, invalidate, mark_dirty, read_through, read_through_many,
+                    stored_row)
+from .loading import Load, with_load
+from .pagination import Page, paginate
+from .projection import Columns, project
+from .revenue_rollup import reattribute_revenue
+from .streaming import DEFAULT_CHUNK_SIZE, stream
+from .unit_of_work import commit
 
 
+@instrumented
 class EnderecoRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, cache: Optional[CacheBackend] = None):
         self.db = db
+        self.cache = cache
+
+    def _evict_rows(self, rows: List[dict]):
+        evict(self.cache, Endereco, [row['endereco_id'] for row in rows])
+
+    def _mark_rows(self, rows: List[dict]):
+        mark_dirty(self.db, self.cache, Endereco, [row['endereco_id'] for row in rows])
 
     def create(self, endereco: Endereco) -> Endereco:
         self.db.add(endereco)
-        self.db.commit()
-        self.db.refresh(endereco)
+        if commit(self.db):
+            self.db.refresh(endereco)
         return endereco
 
-    def get_by_id(self, endereco_id: str) -> Optional[Endereco]:
-        return self.db.query(Endereco).filter(
+    @staticmethod
+    def _with_search_columns(enderecos: Iterable[Union[Endereco, dict]]):
+        # Instances get them from Endereco's validators already
+        for endereco in enderecos:
+            yield Endereco.with_search_columns(endereco) if isinstance(endereco, dict) else endereco
+
+    def create_many(self, enderecos: Iterable[Union[Endereco, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        return bulk_insert(self.db, Endereco, self._with_search_columns(enderecos),
+                           batch_size, return_keys)
+
+    def upsert_many(self, enderecos: Iterable[Union[Endereco, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        on_batch = self._evict_rows if self.cache is not None else None
+        mark_rows = self._mark_rows if self.cache is not None else None
+
+        def reattribute(rows: List[dict]):
+            self._reattribute([row['endereco_id'] for row in rows if 'cidade' in row])
+
+        return bulk_upsert(self.db, Endereco, self._with_search_columns(enderecos),
+                           batch_size, return_keys, on_batch,
+                           before_commit=chain_hooks(reattribute, mark_rows))
+
+    def _reattribute(self, endereco_ids: List[str]):
+        """Move the revenue rollup of the hospedagens at these addresses to their new cidade"""
+        if endereco_ids:
+            reattribute_revenue(self.db, self.db.scalars(
+                select(Hospedagem.hospedagem_id).where(Hospedagem.endereco_id.in_(endereco_ids))
+            ).all())
+
+    @read_only
+    def get_by_id(self, endereco_id: str, load: Load = None) -> Optional[Endereco]:
+        query = with_load(self.db.query(Endereco), Endereco, load).filter(
             Endereco.endereco_id == endereco_id
-        ).first()
+        )
+        if self.cache is not None and load is None:
+            return read_through(self.db, self.cache, Endereco, endereco_id, query.first)
+        return query.first()
+
+    @read_only
+    def get_by_ids(self, endereco_ids: List[str], load: Load = None,
+                   columns: Columns = None) -> List[Endereco]:
+        """The rows with these keys, in no particular order; unknown keys are skipped"""
+        query = with_load(self.db.query(Endereco), Endereco, load)
+        if self.cache is not None and load is None and columns is None:
+            return read_through_many(self.db, self.cache, Endereco, endereco_ids,
+                                     lambda missing: query.filter(Endereco.endereco_id.in_(missing)).all())
+        return project(query, Endereco, columns, load).filter(
+            Endereco.endereco_id.in_(endereco_ids)
+        ).all()
 
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Endereco]:
-        return self.db.query(Endereco).offset(skip).limit(limit).all()
+    @read_only
+    def get_all(self, skip: int = 0, limit: int = 100, load: Load = None,
+                columns: Columns = None) -> List[Endereco]:
+        query = with_load(self.db.query(Endereco), Endereco, load)
+        return project(query, Endereco, columns, load).offset(skip).limit(limit).all()
 
-    def get_by_cep(self, cep: str) -> List[Endereco]:
-        return self.db.query(Endereco).filter(
-            Endereco.cep == cep
+    @read_only
+    def get_all_page(self, cursor: Optional[str] = None, limit: int = 100,
+                     reverse: bool = False, load: Load = None,
+                     columns: Columns = None) -> Page[Endereco]:
+        query = with_load(self.db.query(Endereco), Endereco, load)
+        return paginate(project(query, Endereco, columns, load, keys=('endereco_id',)),
+                        [(Endereco.endereco_id, False)], cursor, limit, reverse)
+
+    @read_only
+    def get_by_cep(self, cep: str, load: Load = None, columns: Columns = None) -> List[Endereco]:
+        # '01310-100' and '01310100' are the same CEP
+        query = with_load(self.db.query(Endereco), Endereco, load)
+        return project(query, Endereco, columns, load).filter(
+            Endereco.cep_digitos == digits(cep)
         ).all()
 
-    def get_by_cidade(self, cidade: str, skip: int = 0, limit: int = 100) -> List[Endereco]:
-        return self.db.query(Endereco).filter(
-            Endereco.cidade.ilike(f"%{cidade}%")
-        ).offset(skip).limit(limit).all()
+    def _by_cep_prefix_query(self, cep_prefix: str, load: Load = None):
+        return with_load(self.db.query(Endereco), Endereco, load).filter(
+            prefix_range(Endereco.cep_digitos, digits(cep_prefix))
+        )
+
+    @read_only
+    def get_by_cep_prefix(self, cep_prefix: str, skip: int = 0, limit: int = 100,
+                          load: Load = None, columns: Columns = None) -> List[Endereco]:
+        """Addresses in a CEP region: '01310' is one sector of São Paulo, '013' its subregion"""
+        query = project(self._by_cep_prefix_query(cep_prefix, load), Endereco, columns, load)
+        return query.offset(skip).limit(limit).all()
+
+    @read_only
+    def get_by_cep_prefix_page(self, cep_prefix: str, cursor: Optional[str] = None,
+                               limit: int = 100, reverse: bool = False,
+                               load: Load = None, columns: Columns = None) -> Page[Endereco]:
+        return paginate(project(self._by_cep_prefix_query(cep_prefix, load), Endereco, columns, load,
+                                keys=('cep_digitos', 'endereco_id')),
+                        [(Endereco.cep_digitos, False), (Endereco.endereco_id, False)],
+                        cursor, limit, reverse)
+
+    def _by_cidade_query(self, cidade: str, load: Load = None):
+        # Accent- and case-insensitive prefix, so 'sao p' finds 'São Paulo'
+        return with_load(self.db.query(Endereco), Endereco, load).filter(
+            prefix_range(Endereco.cidade_busca, search_key(cidade))
+        )
+
+    @read_only
+    def get_by_cidade(self, cidade: str, skip: int = 0, limit: int = 100,
+                      load: Load = None, columns: Columns = None) -> List[Endereco]:
+        query = project(self._by_cidade_query(cidade, load), Endereco, columns, load)
+        return query.offset(skip).limit(limit).all()
+
+    @read_only
+    def get_by_cidade_page(self, cidade: str, cursor: Optional[str] = None, limit: int = 100,
+                           reverse: bool = False, load: Load = None,
+                           columns: Columns = None) -> Page[Endereco]:
+        return paginate(project(self._by_cidade_query(cidade, load), Endereco, columns, load,
+                                keys=('endereco_id',)),
+                        [(Endereco.endereco_id, False)], cursor, limit, reverse)
 
     def update(self, endereco_id: str, endereco_data: dict) -> Optional[Endereco]:
-        endereco = self.get_by_id(endereco_id)
+        # Writes start from the stored row, never from a cached snapshot
+        endereco = stored_row(self.db, Endereco, endereco_id, self.cache)
         if endereco:
+            moved = 'cidade' in endereco_data and endereco_data['cidade'] != endereco.cidade
             for key, value in endereco_data.items():
                 if hasattr(endereco, key):
                     setattr(endereco, key, value)
-            self.db.commit()
-            self.db.refresh(endereco)
+            if moved:
+                self._reattribute([endereco_id])
+            if commit(self.db):
+                self.db.refresh(endereco)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Endereco, [endereco_id])
         return endereco
 
     def delete(self, endereco_id: str) -> bool:
-        endereco = self.get_by_id(endereco_id)
+        endereco = stored_row(self.db, Endereco, endereco_id, self.cache)
         if endereco:
-            if endereco.hospedagens:
+            in_use = self.db.query(exists().where(Hospedagem.endereco_id == endereco_id)).scalar()
+            if in_use:
                 return False
             self.db.delete(endereco)
-            self.db.commit()
+            commit(self.db)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Endereco, [endereco_id])
             return True
         return False
 
-    def search_by_address(self, rua: str = None, bairro: str = None, 
-                         cidade: str = None, estado: str = None) -> List[Endereco]:
+    def update_where(self, filters: Filters, values: dict) -> int:
+        """Set `values` on every endereco matching `filters` with one UPDATE
+
+        Nothing is loaded; returns the number of rows matched. The search
+        columns of any address field in `values` are updated with it, and a
+        new cidade moves the revenue rollup of the hospedagens there along.
+        """
+        condition = where_clause(Endereco, filters)
+        values = Endereco.with_search_columns(checked_values(Endereco, values))
+        rollup = 'cidade' in values
+        keys = matching_keys(self.db, Endereco, condition) if self.cache is not None or rollup else []
+        count = update_rows(self.db, Endereco, condition, values)
+        if rollup:
+            self._reattribute(keys)
+        commit(self.db)
+        if self.cache is not None:
+            invalidate(self.db, self.cache, Endereco, keys)
+        return count
+
+    def delete_by_ids(self, endereco_ids: Iterable[str]) -> int:
+        """Delete the enderecos no hospedagem uses, with one DELETE
+
+        Like `delete`, addresses still in use are kept; returns how many
+        were deleted.
+        """
+        endereco_ids = list(endereco_ids)
+        if not endereco_ids:
+            return 0
+        in_use = exists().where(Hospedagem.endereco_id == Endereco.endereco_id)
+        count = delete_rows(self.db, Endereco,
+                            and_(Endereco.endereco_id.in_(endereco_ids), ~in_use))
+        commit(self.db)
+        if self.cache is not None:
+            invalidate(self.db, self.cache, Endereco, endereco_ids)
+        return count
+
+    def _search_by_address_query(self, rua: str = None, bairro: str = None,
+                                 cidade: str = None, estado: str = None, load: Load = None):
         filters = []
         if rua:
-            filters.append(Endereco.rua.ilike(f"%{rua}%"))
+            filters.append(prefix_range(Endereco.rua_busca, search_key(rua)))
         if bairro:
-            filters.append(Endereco.bairro.ilike(f"%{bairro}%"))
+            filters.append(prefix_range(Endereco.bairro_busca, search_key(bairro)))
         if cidade:
-            filters.append(Endereco.cidade.ilike(f"%{cidade}%"))
+            filters.append(prefix_range(Endereco.cidade_busca, search_key(cidade)))
         if estado:
             filters.append(Endereco.estado == estado.upper())
         
-        query = self.db.query(Endereco)
+        query = with_load(self.db.query(Endereco), Endereco, load)
         if filters:
             query = query.filter(and_(*filters))
-        
-        return query.all()
\ No newline at end of file
+        return query
+
+    @read_only
+    def search_by_address(self, rua: str = None, bairro: str = None, 
+                         cidade: str = None, estado: str = None,
+                         load: Load = None, columns: Columns = None) -> List[Endereco]:
+        return project(self._search_by_address_query(rua, bairro, cidade, estado, load),
+                       Endereco, columns, load).all()
+
+    @read_only
+    def iter_search_by_address(self, rua: str = None, bairro: str = None,
+                               cidade: str = None, estado: str = None,
+                               chunk_size: int = DEFAULT_CHUNK_SIZE,
+                               as_rows: bool = False, load: Load = None,
+                               columns: Columns = None) -> Iterator[Endereco]:
+        return stream(self._search_by_address_query(rua, bairro, cidade, estado, load),
+                      Endereco, chunk_size, as_rows, columns, load)
+
+    @read_only
+    def search_by_address_page(self, rua: str = None, bairro: str = None,
+                               cidade: str = None, estado: str = None,
+                               cursor: Optional[str] = None, limit: int = 100,
+                               reverse: bool = False, load: Load = None,
+                               columns: Columns = None) -> Page[Endereco]:
+        return paginate(project(self._search_by_address_query(rua, bairro, cidade, estado, load),
+                                Endereco, columns, load, keys=('endereco_id',)),
+                        [(Endereco.endereco_id, False)], cursor, limit, reverse)
\ No newline at end of file
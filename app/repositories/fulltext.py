@@ -0,0 +1,263 @@
+import heapq
+import math
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Avaliacao, Cliente, Proprietario
+from text_normalization import tokenize
+from .loading import Load, with_load
+from .projection import Columns, project
+
+# (primary key, relevance score)
+SearchHit = Tuple[str, float]
+
+# Prefix terms expanding to more words than this keep only the first ones
+MAX_EXPANSIONS = 256
+# A word matched only by prefix counts for this much of an exact match
+PREFIX_WEIGHT = 0.5
+
+
+@dataclass(frozen=True)
+class SearchEntity:
+    model: type
+    key: str
+    fields: Tuple[str, ...]
+
+    def key_column(self):
+        return getattr(self.model, self.key)
+
+    def columns(self):
+        return [getattr(self.model, field) for field in self.fields]
+
+
+SEARCH_ENTITIES: Dict[str, SearchEntity] = {
+    'avaliacoes': SearchEntity(Avaliacao, 'avaliacao_id', ('comentario',)),
+    'clientes': SearchEntity(Cliente, 'cliente_id', ('nome', 'cpf', 'contato')),
+    'proprietarios': SearchEntity(Proprietario, 'proprietario_id', ('nome',)),
+}
+
+
+class SearchBackend(ABC):
+    """Ranked, prefix-matching text search over SEARCH_ENTITIES
+
+    Repositories call `index` and `remove` after committed writes and only
+    route searches here once `ready(entity)` is true.
+    """
+
+    @abstractmethod
+    def ready(self, entity: str) -> bool:
+        ...
+
+    @abstractmethod
+    def search(self, db: Session, entity: str, query: str, limit: int = 100) -> List[SearchHit]:
+        """Best matches first; every query word must match a word or word prefix"""
+
+    def index(self, entity: str, key: str, values: Iterable[Optional[str]]):
+        pass
+
+    def remove(self, entity: str, key: str):
+        pass
+
+    def index_object(self, entity: str, obj):
+        spec = SEARCH_ENTITIES[entity]
+        self.index(entity, getattr(obj, spec.key), [getattr(obj, field) for field in spec.fields])
+
+    def reindex(self, db: Session, entity: str, keys: Iterable[str]):
+        """Read some rows back from the database and index their stored text"""
+        spec = SEARCH_ENTITIES[entity]
+        rows = db.execute(
+            select(spec.key_column(), *spec.columns()).where(spec.key_column().in_(list(keys)))
+        )
+        for key, *values in rows:
+            self.index(entity, key, values)
+
+
+def load_hits(db: Session, entity: str, hits: List[SearchHit], load: Load = None,
+              columns: Columns = None) -> List[Tuple[object, float]]:
+    """Fetch the entities (or `columns` projections) behind some hits in one
+    query, keeping the ranking"""
+    if not hits:
+        return []
+    spec = SEARCH_ENTITIES[entity]
+    query = with_load(db.query(spec.model), spec.model, load)
+    query = project(query, spec.model, columns, load, keys=(spec.key,))
+    found = {
+        getattr(obj, spec.key): obj
+        for obj in query.filter(spec.key_column().in_([key for key, _ in hits]))
+    }
+    return [(found[key], score) for key, score in hits if key in found]
+
+
+class MySQLFulltextBackend(SearchBackend):
+    """MATCH ... AGAINST over the FULLTEXT indexes of the add_fulltext_indexes migration
+
+    MySQL keeps the indexes current by itself. Accents are already ignored
+    by the default utf8mb4 collation; words shorter than
+    innodb_ft_min_token_size (3 by default) are not indexed.
+    """
+
+    def ready(self, entity: str) -> bool:
+        return entity in SEARCH_ENTITIES
+
+    def search(self, db: Session, entity: str, query: str, limit: int = 100) -> List[SearchHit]:
+        from sqlalchemy.dialects.mysql import match
+
+        # MySQL's parser splits on punctuation itself, so only plain words
+        words = tokenize(query, compounds=False)
+        if not words:
+            return []
+        spec = SEARCH_ENTITIES[entity]
+        score = match(*spec.columns(), against=' '.join(f'+{word}*' for word in words))
+        score = score.in_boolean_mode()
+        rows = db.execute(
+            select(spec.key_column(), score.label('score'))
+            .where(score > 0)
+            .order_by(score.desc(), spec.key_column())
+            .limit(limit)
+        )
+        return [(key, float(value)) for key, value in rows]
+
+
+class _Corpus:
+    """Postings of one entity: word -> {key: term frequency}"""
+
+    __slots__ = ('postings', 'documents', 'lengths', 'words', 'total_length')
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.documents: Dict[str, Counter] = {}
+        self.lengths: Dict[str, int] = {}
+        # Sorted vocabulary, so prefixes are a bisect away
+        self.words: List[str] = []
+        self.total_length = 0
+
+    def add(self, key: str, words: List[str], keep_sorted: bool = True):
+        self.remove(key)
+        if not words:
+            return
+        counts = Counter(words)
+        self.documents[key] = counts
+        self.lengths[key] = len(words)
+        self.total_length += len(words)
+        for word, count in counts.items():
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = {}
+                if keep_sorted:
+                    insort(self.words, word)
+            posting[key] = count
+
+    def remove(self, key: str) -> bool:
+        counts = self.documents.pop(key, None)
+        if counts is None:
+            return False
+        self.total_length -= self.lengths.pop(key)
+        for word in counts:
+            posting = self.postings[word]
+            del posting[key]
+            if not posting:
+                del self.postings[word]
+                del self.words[bisect_left(self.words, word)]
+        return True
+
+    def expansions(self, prefix: str) -> List[str]:
+        start = bisect_left(self.words, prefix)
+        found = []
+        for word in self.words[start:start + MAX_EXPANSIONS]:
+            if not word.startswith(prefix):
+                break
+            found.append(word)
+        return found
+
+    def scores(self, term: str) -> Dict[str, float]:
+        """tf-idf of every document containing `term` as a word or word prefix"""
+        total = len(self.documents)
+        average_length = self.total_length / total if total else 1.0
+        scores: Dict[str, float] = {}
+        for word in self.expansions(term):
+            posting = self.postings[word]
+            idf = math.log(1 + total / len(posting))
+            weight = 1.0 if word == term else PREFIX_WEIGHT
+            for key, count in posting.items():
+                # BM25-style saturation of repeated words in long documents
+                norm = 0.25 + 0.75 * self.lengths[key] / average_length
+                tf = count * 2.2 / (count + 1.2 * norm)
+                score = weight * tf * idf
+                if score > scores.get(key, 0.0):
+                    scores[key] = score
+        return scores
+
+
+class InvertedIndex(SearchBackend):
+    """In-process inverted index with accent folding, for SQLite and small deployments
+
+    Share one instance across repositories and call `rebuild` once per
+    entity at startup; repositories keep it in sync on every committed
+    write and fall back to `ilike` for entities that were never loaded.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._corpora: Dict[str, _Corpus] = {}
+        self._loaded: Set[str] = set()
+
+    def ready(self, entity: str) -> bool:
+        return entity in self._loaded
+
+    def rebuild(self, db: Session, entities: Iterable[str] = None, chunk_size: int = 10000) -> int:
+        """Reload entities (all of them by default) from the database"""
+        count = 0
+        for entity in entities or SEARCH_ENTITIES:
+            spec = SEARCH_ENTITIES[entity]
+            corpus = _Corpus()
+            rows = db.execute(
+                select(spec.key_column(), *spec.columns()).execution_options(yield_per=chunk_size)
+            )
+            for key, *values in rows:
+                corpus.add(key, self._words(values), keep_sorted=False)
+                count += 1
+            corpus.words = sorted(corpus.postings)
+            with self._lock:
+                self._corpora[entity] = corpus
+                self._loaded.add(entity)
+        return count
+
+    @staticmethod
+    def _words(values: Iterable[Optional[str]]) -> List[str]:
+        return [word for value in values for word in tokenize(value)]
+
+    def index(self, entity: str, key: str, values: Iterable[Optional[str]]):
+        words = self._words(values)
+        with self._lock:
+            corpus = self._corpora.setdefault(entity, _Corpus())
+            corpus.add(key, words)
+
+    def remove(self, entity: str, key: str):
+        with self._lock:
+            corpus = self._corpora.get(entity)
+            if corpus is not None:
+                corpus.remove(key)
+
+    def search(self, db: Session, entity: str, query: str, limit: int = 100) -> List[SearchHit]:
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            corpus = self._corpora.get(entity)
+            if corpus is None:
+                return []
+            # Intersect starting from the rarest term to keep candidates small
+            per_term = sorted((corpus.scores(term) for term in terms), key=len)
+            totals = dict(per_term[0])
+            for scores in per_term[1:]:
+                totals = {key: total + scores[key] for key, total in totals.items() if key in scores}
+                if not totals:
+                    return []
+        return heapq.nsmallest(limit, totals.items(), key=lambda hit: (-hit[1], hit[0]))
@@ -1,77 +1,200 @@
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_
-from models import Hospedagem, Proprietario, Endereco
+from typing import List, Optional, Dict, Any, Iterable, Union, Tuple
+from datetime import date
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, exists, func
+from models import Hospedagem, Proprietario, Endereco, Aluguel, AluguelArquivo, AvaliacaoResumo
+from instrumentation import instrumented
+from routing import read_only
+from text_normalization import digits, prefix_range, search_key
+from .bulk import (DEFAULT_BATCH_SIZE, Filters, bulk_insert, bulk_upsert, chain_hooks,
+                   checked_values, delete_rows, matching_keys, update_rows, where_clause)
+from .cache import (CacheBackend, evict, invalidate, mark_dirty, read_through, read_through_many,
+                    stored_row)
+from .loading import Load, with_load
+from .pagination import Page, paginate
+from .partitions import is_partitioned, overlapping
+from .projection import Columns, project, projection
+from .revenue_rollup import reattribute_revenue
+from .unit_of_work import commit
 
+# Columns the revenue rollup copies per night, through the owner and the address
+ROLLUP_COLUMNS = {'proprietario_id', 'endereco_id'}
 
+
+@instrumented
 class HospedagemRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, cache: Optional[CacheBackend] = None):
         self.db = db
+        self.cache = cache
+
+    def _evict_rows(self, rows: List[dict]):
+        evict(self.cache, Hospedagem, [row['hospedagem_id'] for row in rows])
+
+    def _mark_rows(self, rows: List[dict]):
+        mark_dirty(self.db, self.cache, Hospedagem, [row['hospedagem_id'] for row in rows])
 
     def create(self, hospedagem: Hospedagem) -> Hospedagem:
         self.db.add(hospedagem)
-        self.db.commit()
-        self.db.refresh(hospedagem)
+        if commit(self.db):
+            self.db.refresh(hospedagem)
         return hospedagem
 
-    def get_by_id(self, hospedagem_id: str, with_relations: bool = False) -> Optional[Hospedagem]:
-        query = self.db.query(Hospedagem)
-        if with_relations:
-            query = query.options(
-                joinedload(Hospedagem.proprietario),
-                joinedload(Hospedagem.endereco)
-            )
-        return query.filter(Hospedagem.hospedagem_id == hospedagem_id).first()
+    def create_many(self, hospedagens: Iterable[Union[Hospedagem, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        return bulk_insert(self.db, Hospedagem, hospedagens, batch_size, return_keys)
 
-    def get_all(self, skip: int = 0, limit: int = 100, 
-                only_active: bool = True, with_relations: bool = False) -> List[Hospedagem]:
-        query = self.db.query(Hospedagem)
+    def upsert_many(self, hospedagens: Iterable[Union[Hospedagem, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        on_batch = self._evict_rows if self.cache is not None else None
+        mark_rows = self._mark_rows if self.cache is not None else None
+
+        def reattribute(rows: List[dict]):
+            moved = [row['hospedagem_id'] for row in rows if not ROLLUP_COLUMNS.isdisjoint(row)]
+            if moved:
+                reattribute_revenue(self.db, moved)
+
+        return bulk_upsert(self.db, Hospedagem, hospedagens, batch_size, return_keys, on_batch,
+                           before_commit=chain_hooks(reattribute, mark_rows))
+
+    @read_only
+    def get_by_id(self, hospedagem_id: str, load: Load = None) -> Optional[Hospedagem]:
+        query = with_load(self.db.query(Hospedagem), Hospedagem, load)
+        query = query.filter(Hospedagem.hospedagem_id == hospedagem_id)
+        if self.cache is not None and load is None:
+            return read_through(self.db, self.cache, Hospedagem, hospedagem_id, query.first)
+        return query.first()
+
+    @read_only
+    def get_by_ids(self, hospedagem_ids: List[str], load: Load = None,
+                   columns: Columns = None) -> List[Hospedagem]:
+        """The rows with these keys, in no particular order; unknown keys are skipped"""
+        query = with_load(self.db.query(Hospedagem), Hospedagem, load)
+        if self.cache is not None and load is None and columns is None:
+            return read_through_many(self.db, self.cache, Hospedagem, hospedagem_ids,
+                                     lambda missing: query.filter(Hospedagem.hospedagem_id.in_(missing)).all())
+        return project(query, Hospedagem, columns, load).filter(
+            Hospedagem.hospedagem_id.in_(hospedagem_ids)
+        ).all()
+
+    def _all_query(self, only_active: bool, load: Load):
+        query = with_load(self.db.query(Hospedagem), Hospedagem, load)
         if only_active:
             query = query.filter(Hospedagem.ativo == True)
-        if with_relations:
-            query = query.options(
-                joinedload(Hospedagem.proprietario),
-                joinedload(Hospedagem.endereco)
-            )
+        return query
+
+    @read_only
+    def get_all(self, skip: int = 0, limit: int = 100, 
+                only_active: bool = True, load: Load = None,
+                columns: Columns = None) -> List[Hospedagem]:
+        query = project(self._all_query(only_active, load), Hospedagem, columns, load)
         return query.offset(skip).limit(limit).all()
 
-    def get_by_proprietario(self, proprietario_id: str, only_active: bool = True) -> List[Hospedagem]:
-        query = self.db.query(Hospedagem).filter(
+    @read_only
+    def get_all_page(self, cursor: Optional[str] = None, limit: int = 100, reverse: bool = False,
+                     only_active: bool = True, load: Load = None,
+                     columns: Columns = None) -> Page[Hospedagem]:
+        return paginate(project(self._all_query(only_active, load), Hospedagem, columns, load,
+                                keys=('hospedagem_id',)),
+                        [(Hospedagem.hospedagem_id, False)], cursor, limit, reverse)
+
+    @read_only
+    def get_by_proprietario(self, proprietario_id: str, only_active: bool = True,
+                            load: Load = None, columns: Columns = None) -> List[Hospedagem]:
+        query = with_load(self.db.query(Hospedagem), Hospedagem, load).filter(
             Hospedagem.proprietario_id == proprietario_id
         )
         if only_active:
             query = query.filter(Hospedagem.ativo == True)
-        return query.all()
+        return project(query, Hospedagem, columns, load).all()
 
-    def get_by_endereco(self, endereco_id: str) -> List[Hospedagem]:
-        return self.db.query(Hospedagem).filter(
+    @read_only
+    def get_by_endereco(self, endereco_id: str, load: Load = None,
+                        columns: Columns = None) -> List[Hospedagem]:
+        query = with_load(self.db.query(Hospedagem), Hospedagem, load)
+        return project(query, Hospedagem, columns, load).filter(
             Hospedagem.endereco_id == endereco_id
         ).all()
 
     def update(self, hospedagem_id: str, hospedagem_data: dict) -> Optional[Hospedagem]:
-        hospedagem = self.get_by_id(hospedagem_id)
+        # Writes start from the stored row, never from a cached snapshot
+        hospedagem = stored_row(self.db, Hospedagem, hospedagem_id, self.cache)
         if hospedagem:
+            moved = any(key in ROLLUP_COLUMNS and getattr(hospedagem, key) != value
+                        for key, value in hospedagem_data.items())
             for key, value in hospedagem_data.items():
                 if hasattr(hospedagem, key):
                     setattr(hospedagem, key, value)
-            self.db.commit()
-            self.db.refresh(hospedagem)
+            if moved:
+                reattribute_revenue(self.db, [hospedagem_id])
+            if commit(self.db):
+                self.db.refresh(hospedagem)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Hospedagem, [hospedagem_id])
         return hospedagem
 
     def delete(self, hospedagem_id: str) -> bool:
-        hospedagem = self.get_by_id(hospedagem_id)
+        hospedagem = stored_row(self.db, Hospedagem, hospedagem_id, self.cache)
         if hospedagem:
-            if hospedagem.alugueis:
+            # Archived rentals still reference the hospedagem
+            rented = self.db.query(or_(
+                exists().where(Aluguel.hospedagem_id == hospedagem_id),
+                exists().where(AluguelArquivo.hospedagem_id == hospedagem_id)
+            )).scalar()
+            if rented:
                 hospedagem.ativo = False
-                self.db.commit()
             else:
                 self.db.delete(hospedagem)
-                self.db.commit()
+            commit(self.db)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Hospedagem, [hospedagem_id])
             return True
         return False
 
-    def search(self, filters: Dict[str, Any], skip: int = 0, limit: int = 100) -> List[Hospedagem]:
-        query = self.db.query(Hospedagem)
+    def update_where(self, filters: Filters, values: dict) -> int:
+        """Set `values` on every hospedagem matching `filters` with one UPDATE
+
+        Nothing is loaded; returns the number of rows matched. Moving
+        hospedagens to another owner or address moves their revenue rollup
+        rows along, in the same transaction.
+        """
+        condition = where_clause(Hospedagem, filters)
+        values = checked_values(Hospedagem, values)
+        rollup = not ROLLUP_COLUMNS.isdisjoint(values)
+        keys = matching_keys(self.db, Hospedagem, condition) if self.cache is not None or rollup else []
+        count = update_rows(self.db, Hospedagem, condition, values)
+        if rollup:
+            reattribute_revenue(self.db, keys)
+        commit(self.db)
+        if self.cache is not None:
+            invalidate(self.db, self.cache, Hospedagem, keys)
+        return count
+
+    def deactivate_by_proprietario(self, proprietario_id: str) -> int:
+        """Deactivate every active listing of a proprietario; returns how many"""
+        return self.update_where({'proprietario_id': proprietario_id, 'ativo': True},
+                                 {'ativo': False})
+
+    def delete_by_ids(self, hospedagem_ids: Iterable[str]) -> int:
+        """`delete` for many hospedagens: one UPDATE deactivates those with
+        rentals, one DELETE removes the rest. Returns how many were found.
+        """
+        hospedagem_ids = list(hospedagem_ids)
+        if not hospedagem_ids:
+            return 0
+        rented = or_(exists().where(Aluguel.hospedagem_id == Hospedagem.hospedagem_id),
+                     exists().where(AluguelArquivo.hospedagem_id == Hospedagem.hospedagem_id))
+        selected = Hospedagem.hospedagem_id.in_(hospedagem_ids)
+        count = update_rows(self.db, Hospedagem, and_(selected, rented), {'ativo': False})
+        count += delete_rows(self.db, Hospedagem, and_(selected, ~rented))
+        commit(self.db)
+        if self.cache is not None:
+            invalidate(self.db, self.cache, Hospedagem, hospedagem_ids)
+        return count
+
+    def _search_query(self, filters: Dict[str, Any], load: Load = None):
+        query = with_load(self.db.query(Hospedagem), Hospedagem, load)
         
         if 'tipo' in filters:
             query = query.filter(Hospedagem.tipo.ilike(f"%{filters['tipo']}%"))
@@ -79,25 +202,99 @@ class HospedagemRepository:
         if 'ativo' in filters:
             query = query.filter(Hospedagem.ativo == filters['ativo'])
         
-        if 'cidade' in filters:
-            query = query.join(Endereco).filter(
-                Endereco.cidade.ilike(f"%{filters['cidade']}%")
-            )
-        
-        if 'estado' in filters:
-            query = query.join(Endereco).filter(
-                Endereco.estado == filters['estado'].upper()
-            )
+        if 'cidade' in filters or 'estado' in filters or 'cep_prefix' in filters:
+            query = self._filter_endereco(query, filters.get('cidade'), filters.get('estado'),
+                                          filters.get('cep_prefix'))
         
         if 'proprietario_nome' in filters:
             query = query.join(Proprietario).filter(
                 Proprietario.nome.ilike(f"%{filters['proprietario_nome']}%")
             )
         
+        return query
+
+    @staticmethod
+    def _filter_endereco(query, cidade: str = None, estado: str = None, cep_prefix: str = None):
+        # One join for every address filter, on the normalized search columns
+        query = query.join(Endereco, Endereco.endereco_id == Hospedagem.endereco_id)
+        if cidade:
+            query = query.filter(prefix_range(Endereco.cidade_busca, search_key(cidade)))
+        if estado:
+            query = query.filter(Endereco.estado == estado.upper())
+        if cep_prefix:
+            query = query.filter(prefix_range(Endereco.cep_digitos, digits(cep_prefix)))
+        return query
+
+    @read_only
+    def search(self, filters: Dict[str, Any], skip: int = 0, limit: int = 100,
+               load: Load = None, columns: Columns = None) -> List[Hospedagem]:
+        query = project(self._search_query(filters, load), Hospedagem, columns, load)
         return query.offset(skip).limit(limit).all()
 
+    @read_only
+    def search_page(self, filters: Dict[str, Any], cursor: Optional[str] = None, limit: int = 100,
+                    reverse: bool = False, load: Load = None,
+                    columns: Columns = None) -> Page[Hospedagem]:
+        return paginate(project(self._search_query(filters, load), Hospedagem, columns, load,
+                                keys=('hospedagem_id',)),
+                        [(Hospedagem.hospedagem_id, False)], cursor, limit, reverse)
+
+    @read_only
     def count_by_proprietario(self, proprietario_id: str) -> int:
         return self.db.query(Hospedagem).filter(
             Hospedagem.proprietario_id == proprietario_id,
             Hospedagem.ativo == True
-        ).count()
\ No newline at end of file
+        ).count()
+
+    @read_only
+    def search_available(self, start_date: date, end_date: date,
+                         cidade: str = None, estado: str = None, tipo: str = None,
+                         only_active: bool = True, order_by_rating: bool = True,
+                         cursor: Optional[str] = None, limit: int = 100,
+                         reverse: bool = False, load: Load = None,
+                         columns: Columns = None) -> Page[Tuple[Hospedagem, Optional[float]]]:
+        """Hospedagens free for the whole period, with their average rating
+
+        Ordered by average rating (highest first, unrated last) and paged by
+        keyset over (average_rating, hospedagem_id).
+        """
+        # NOT EXISTS stops at the first overlapping rental of each hospedagem,
+        # through the (hospedagem_id, data_inicio, data_fim) index
+        booked = exists().where(
+            Aluguel.hospedagem_id == Hospedagem.hospedagem_id,
+            overlapping(start_date, end_date, is_partitioned(self.db))
+        )
+        average_rating = AvaliacaoResumo.media
+        sort_rating = func.coalesce(average_rating, 0)
+
+        entity = Hospedagem
+        if columns is not None:
+            entity = projection(Hospedagem, columns, load, keys=('hospedagem_id',))
+
+        query = self.db.query(entity, average_rating).outerjoin(
+            AvaliacaoResumo, AvaliacaoResumo.hospedagem_id == Hospedagem.hospedagem_id
+        ).filter(~booked)
+        query = with_load(query, Hospedagem, load)
+
+        if only_active:
+            query = query.filter(Hospedagem.ativo == True)
+
+        if tipo:
+            query = query.filter(Hospedagem.tipo == tipo)
+
+        if cidade or estado:
+            query = self._filter_endereco(query, cidade, estado)
+
+        if order_by_rating:
+            keys = [(sort_rating, True), (Hospedagem.hospedagem_id, False)]
+            key_of = lambda row: [float(row[1] or 0), row[0].hospedagem_id]
+        else:
+            keys = [(Hospedagem.hospedagem_id, False)]
+            key_of = lambda row: [row[0].hospedagem_id]
+
+        page = paginate(query, keys, cursor, limit, reverse, key_of)
+        page.items = [
+            (hospedagem, float(rating) if rating is not None else None)
+            for hospedagem, rating in page.items
+        ]
+        return page
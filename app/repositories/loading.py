@@ -0,0 +1,113 @@
+import functools
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Query, joinedload, raiseload, selectinload
+from models import (Proprietario, Cliente, Endereco, Hospedagem, Aluguel, AluguelArquivo,
+                    Avaliacao, AvaliacaoArquivo)
+
+
+@dataclass(frozen=True)
+class LoadProfile:
+    """The relationship graph a read loads up front, as dotted paths
+
+    Collections ('alugueis') are loaded with selectinload, one
+    SELECT ... IN per collection in the graph; scalars ('hospedagem') with
+    joinedload, in the statement that loads their parent. A read therefore
+    issues at most 1 + (collections in the graph) statements whatever the
+    number of rows (SQLAlchemy splits IN lists every 500 parents).
+
+    `strict` makes every relationship outside the graph raise instead of
+    lazy-loading, so code that walks past the profile fails in tests rather
+    than costing one query per row. Identity-map hits are still allowed.
+    """
+    paths: Tuple[str, ...]
+    strict: bool = False
+
+
+# Ad-hoc graphs are a path ('alugueis.cliente') or a list of paths
+Load = Union[None, str, Sequence[str], LoadProfile]
+
+LOAD_PROFILES: Dict[type, Dict[str, LoadProfile]] = {
+    Proprietario: {
+        'hospedagens': LoadProfile(('hospedagens',)),
+        'listing': LoadProfile(('hospedagens.endereco',), strict=True),
+    },
+    Cliente: {
+        'history': LoadProfile(('alugueis.hospedagem.endereco', 'avaliacoes'), strict=True),
+    },
+    Endereco: {
+        'hospedagens': LoadProfile(('hospedagens',)),
+    },
+    Hospedagem: {
+        # What with_relations=True used to load
+        'relations': LoadProfile(('proprietario', 'endereco')),
+        'listing': LoadProfile(('proprietario', 'endereco'), strict=True),
+        'detail': LoadProfile(('proprietario', 'endereco', 'alugueis', 'avaliacoes.cliente'),
+                              strict=True),
+    },
+    Aluguel: {
+        'relations': LoadProfile(('cliente', 'hospedagem')),
+        'listing': LoadProfile(('cliente', 'hospedagem.endereco'), strict=True),
+    },
+    Avaliacao: {
+        'relations': LoadProfile(('cliente', 'hospedagem')),
+        'listing': LoadProfile(('cliente', 'hospedagem'), strict=True),
+    },
+}
+# Archived rows have the same relationships as the hot ones
+LOAD_PROFILES[AluguelArquivo] = LOAD_PROFILES[Aluguel]
+LOAD_PROFILES[AvaliacaoArquivo] = LOAD_PROFILES[Avaliacao]
+
+
+def resolve_profile(model, load: Load) -> Optional[LoadProfile]:
+    """A profile name, path, list of paths or LoadProfile as a LoadProfile"""
+    if load is None or isinstance(load, LoadProfile):
+        return load
+    if isinstance(load, str):
+        return LOAD_PROFILES.get(model, {}).get(load) or LoadProfile((load,))
+    return LoadProfile(tuple(load))
+
+
+def _chain(parent, model, name: str):
+    relationships = inspect(model).relationships
+    if name not in relationships:
+        raise ValueError(f"{model.__name__} has no relationship {name!r}; "
+                         f"expected one of {sorted(relationships.keys())}")
+    relationship = relationships[name]
+    attribute = getattr(model, name)
+    strategy = selectinload if relationship.uselist else joinedload
+    option = strategy(attribute) if parent is None else getattr(parent, strategy.__name__)(attribute)
+    return option, relationship.mapper.class_
+
+
+@functools.lru_cache(maxsize=256)
+def _options(model, profile: LoadProfile) -> Tuple:
+    options: List = []
+    nodes: Dict[str, Tuple] = {}
+    for path in profile.paths:
+        parent, current, prefix = None, model, ''
+        for name in path.split('.'):
+            prefix = f'{prefix}.{name}' if prefix else name
+            if prefix not in nodes:
+                nodes[prefix] = _chain(parent, current, name)
+                options.append(nodes[prefix][0])
+            parent, current = nodes[prefix]
+    if profile.strict:
+        options.append(raiseload('*', sql_only=True))
+        options.extend(option.raiseload('*', sql_only=True) for option, _ in nodes.values())
+    return tuple(options)
+
+
+def loader_options(model, load: Load) -> Tuple:
+    """The loader options for `load` on queries of `model`; () for None"""
+    profile = resolve_profile(model, load)
+    return _options(model, profile) if profile is not None else ()
+
+
+def with_load(query: Query, model, load: Load) -> Query:
+    """`query` with the loader options of `load` applied to its `model` entities"""
+    if load is None:
+        return query
+    return query.options(*loader_options(model, load))
@@ -0,0 +1,92 @@
+import base64
+import json
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+T = TypeVar('T')
+
+# (sort expression, descending)
+SortKey = Tuple[Any, bool]
+
+
+@dataclass
+class Page(Generic[T]):
+    """One page of a keyset-paginated listing
+
+    `next_cursor` continues in the same direction and is None on the last
+    page. `previous_cursor` points back at this page's first item: pass it
+    with the opposite `reverse` flag to walk back.
+    """
+    items: List[T] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    previous_cursor: Optional[str] = None
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """The key values in `cursor`; the last one, the primary key, must be a UUID"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or not values:
+            raise ValueError('not a list of key values')
+        # A malformed key would otherwise fail only when bound to BINARY(16)
+        uuid.UUID(values[-1])
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid pagination cursor: {cursor!r}") from e
+    return values
+
+
+def _after(keys: Sequence[SortKey], values: Sequence[Any], reverse: bool):
+    """Rows strictly after `values` in the (possibly reversed) sort order"""
+    clauses = []
+    for position, (expression, descending) in enumerate(keys):
+        equal_prefix = [keys[i][0] == values[i] for i in range(position)]
+        forward = descending == reverse
+        step = expression > values[position] if forward else expression < values[position]
+        clauses.append(and_(*equal_prefix, step))
+    return or_(*clauses)
+
+
+def paginate(query: Query, keys: Sequence[SortKey],
+             cursor: Optional[str] = None, limit: int = 100, reverse: bool = False,
+             key_of: Optional[Callable[[Any], Sequence[Any]]] = None) -> Page:
+    """Apply `WHERE key > :last ORDER BY key LIMIT n` to an existing query
+
+    `keys` must end with the primary key so the order is total. `key_of`
+    extracts the key values from a result row; by default it reads the
+    attributes named after each key column.
+    """
+    if key_of is None:
+        names = [expression.key for expression, _ in keys]
+
+        def key_of(row):
+            return [getattr(row, name) for name in names]
+
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise ValueError(f"Invalid pagination cursor: {cursor!r}")
+        query = query.filter(_after(keys, values, reverse))
+
+    ordering = [
+        expression.desc() if descending != reverse else expression.asc()
+        for expression, descending in keys
+    ]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    return Page(
+        items=items,
+        next_cursor=encode_cursor(key_of(items[-1])) if has_more else None,
+        previous_cursor=encode_cursor(key_of(items[0])) if items and cursor is not None else None
+    )
@@ -0,0 +1,219 @@
+"""Monthly RANGE COLUMNS(data_inicio) partitions of alugueis on MySQL
+
+Partition `p202401` holds the rentals starting in January 2024; the first
+partition also holds everything older, and `p_futuro` everything past the
+last month created. Date predicates prune partitions when they bound
+data_inicio on both sides, which `overlapping` does using MAX_STAY_DAYS
+once `is_partitioned` says the table is partitioned.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement
+
+from models import MAX_STAY_DAYS, Aluguel
+from .revenue_rollup import apply_rentals
+
+TABLE = 'alugueis'
+FUTURE = 'p_futuro'
+
+# Whether alugueis is partitioned, per database URL
+_partitioned: Dict[str, bool] = {}
+
+
+def overlapping(start_date: date, end_date: date, partitioned: bool = False) -> ColumnElement:
+    """Rentals sharing a day with start_date..end_date, both ends inclusive
+
+    On a partitioned table a lower bound on data_inicio, implied by the
+    other two conditions and the stay length CHECK, prunes the older
+    partitions. Elsewhere it would only risk missing a stay older than the
+    CHECK, so it is left out.
+    """
+    if not partitioned:
+        return and_(Aluguel.data_inicio <= end_date, Aluguel.data_fim >= start_date)
+    return and_(
+        Aluguel.data_inicio <= end_date,
+        Aluguel.data_inicio >= start_date - timedelta(days=MAX_STAY_DAYS),
+        Aluguel.data_fim >= start_date,
+    )
+
+
+def is_partitioned(db: Session) -> bool:
+    """Whether the alugueis of `db` are partitioned; looked up once per database"""
+    engine = db.get_bind(Aluguel).engine
+    if engine.dialect.name != 'mysql':
+        return False
+    key = str(engine.url)
+    if key not in _partitioned:
+        with engine.connect() as connection:
+            _partitioned[key] = bool(partitions(connection))
+    return _partitioned[key]
+
+
+def reset_partitioned(engine: Optional[Engine] = None):
+    """Forget what is_partitioned found for `engine`, or for every database
+
+    The functions below that change the partitions call it themselves; call
+    it after partitioning alugueis any other way, e.g. by migrating.
+    """
+    if engine is None:
+        _partitioned.clear()
+    else:
+        _partitioned.pop(str(engine.url), None)
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    # First day of the next partition; None for p_futuro
+    upper: Optional[date]
+    rows: int
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'p{month:%Y%m}'
+
+
+def _definitions(months: Iterable[date]) -> str:
+    clauses = [f"PARTITION {partition_name(month)} VALUES LESS THAN ('{next_month(month)}')"
+               for month in months]
+    clauses.append(f'PARTITION {FUTURE} VALUES LESS THAN (MAXVALUE)')
+    return ', '.join(clauses)
+
+
+def _months(first: date, last: date) -> List[date]:
+    months, month = [], month_start(first)
+    while month <= last:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def partitions(connection: Connection) -> List[Partition]:
+    """The partitions of alugueis in order; empty if it is not partitioned"""
+    rows = connection.execute(text(
+        'SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS '
+        'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL '
+        'ORDER BY PARTITION_ORDINAL_POSITION'
+    ), {'table': TABLE}).all()
+    return [
+        Partition(name, None if bound == 'MAXVALUE' else date.fromisoformat(bound.strip("'")), rows or 0)
+        for name, bound, rows in rows
+    ]
+
+
+def partition_table(connection: Connection, until: date) -> List[str]:
+    """Partition alugueis by month, from its oldest rental up to `until`
+
+    MySQL requires the partitioning column in every unique key and allows
+    no foreign keys on partitioned InnoDB tables, so the primary key becomes
+    (aluguel_id, data_inicio) and the foreign keys of alugueis are dropped.
+    The ALTER copies the table.
+    """
+    nulls = connection.execute(text(f'SELECT COUNT(*) FROM {TABLE} WHERE data_inicio IS NULL')).scalar()
+    if nulls:
+        raise ValueError(f'{nulls} alugueis have no data_inicio; they cannot be partitioned')
+    for foreign_key in inspect(connection).get_foreign_keys(TABLE):
+        connection.execute(text(f'ALTER TABLE {TABLE} DROP FOREIGN KEY {foreign_key["name"]}'))
+    connection.execute(text(
+        f'ALTER TABLE {TABLE} MODIFY data_inicio DATE NOT NULL, '
+        f'DROP PRIMARY KEY, ADD PRIMARY KEY (aluguel_id, data_inicio)'
+    ))
+    oldest = connection.execute(text(f'SELECT MIN(data_inicio) FROM {TABLE}')).scalar() or until
+    months = _months(min(oldest, until), until)
+    connection.execute(text(
+        f'ALTER TABLE {TABLE} PARTITION BY RANGE COLUMNS(data_inicio) ({_definitions(months)})'
+    ))
+    reset_partitioned(connection.engine)
+    return [partition_name(month) for month in months] + [FUTURE]
+
+
+def add_partitions(connection: Connection, until: date) -> List[str]:
+    """Split months up to `until` off p_futuro; returns the partitions added
+
+    Cheap while p_futuro is empty, so run it ahead of time.
+    """
+    bounded = [partition.upper for partition in partitions(connection) if partition.upper]
+    if not bounded:
+        raise ValueError(f'{TABLE} is not partitioned')
+    months = _months(max(bounded), until)
+    if months:
+        connection.execute(text(
+            f'ALTER TABLE {TABLE} REORGANIZE PARTITION {FUTURE} INTO ({_definitions(months)})'
+        ))
+    reset_partitioned(connection.engine)
+    return [partition_name(month) for month in months]
+
+
+def _before(connection: Connection, cutoff: date) -> List[Tuple[Partition, Optional[date]]]:
+    """The partitions before `cutoff`, each with the lower bound of its rows
+    (None for the first, which also holds everything older)"""
+    # Whole months only; p_futuro is never dropped
+    before, lower = [], None
+    for partition in partitions(connection):
+        if partition.upper is None or partition.upper > month_start(cutoff):
+            break
+        before.append((partition, lower))
+        lower = partition.upper
+    return before
+
+
+def _remove_revenue(connection: Connection, partition: Partition, lower: Optional[date]):
+    """Take the rentals of a partition out of the revenue rollup"""
+    condition = Aluguel.data_inicio < partition.upper
+    if lower is not None:
+        condition = and_(condition, Aluguel.data_inicio >= lower)
+    with Session(bind=connection) as db:
+        rentals = db.execute(select(Aluguel.hospedagem_id, Aluguel.data_inicio,
+                                    Aluguel.data_fim, Aluguel.preco_total).where(condition)).all()
+        apply_rentals(db, (tuple(rental) for rental in rentals), sign=-1)
+        db.flush()
+
+
+def drop_partitions(connection: Connection, cutoff: date) -> List[str]:
+    """Delete the rentals of the months before `cutoff`, one partition at a time
+
+    Dropping a partition is a metadata change, unlike a DELETE. The rentals
+    of each partition are taken out of the revenue rollup first, reading
+    only that partition; MySQL commits them as the DROP starts, so a DROP
+    that fails leaves drift for scripts/rebuild_revenue_rollup.py --verify.
+    Archive the months first (`archive_before`) to keep their revenue.
+    """
+    names = []
+    for partition, lower in _before(connection, cutoff):
+        _remove_revenue(connection, partition, lower)
+        connection.execute(text(f'ALTER TABLE {TABLE} DROP PARTITION {partition.name}'))
+        names.append(partition.name)
+    reset_partitioned(connection.engine)
+    return names
+
+
+def exchange_partitions(connection: Connection, cutoff: date) -> List[str]:
+    """Move the months before `cutoff` into standalone `alugueis_pYYYYMM`
+    tables, then drop the emptied partitions; returns the tables created
+
+    As with drop_partitions, their rentals leave the revenue rollup.
+    """
+    tables = []
+    for partition, lower in _before(connection, cutoff):
+        _remove_revenue(connection, partition, lower)
+        table = f'{TABLE}_{partition.name}'
+        connection.execute(text(f'CREATE TABLE {table} LIKE {TABLE}'))
+        connection.execute(text(f'ALTER TABLE {table} REMOVE PARTITIONING'))
+        connection.execute(text(f'ALTER TABLE {TABLE} EXCHANGE PARTITION {partition.name} WITH TABLE {table}'))
+        connection.execute(text(f'ALTER TABLE {TABLE} DROP PARTITION {partition.name}'))
+        tables.append(table)
+    reset_partitioned(connection.engine)
+    return tables
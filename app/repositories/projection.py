@@ -0,0 +1,61 @@
+import functools
+from collections import namedtuple
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Bundle, Query
+
+from .loading import Load
+
+# Column names of one model, e.g. ('hospedagem_id', 'tipo')
+Columns = Optional[Sequence[str]]
+
+
+class Projection(Bundle):
+    """Some columns of a model, yielded as one named tuple per row
+
+    The tuples are plain values: no identity map entry, no instance state,
+    no session attachment, several times smaller than the entity.
+    """
+    single_entity = True
+
+    def __init__(self, model, columns: Tuple[str, ...]):
+        super().__init__(model.__tablename__, *(getattr(model, name) for name in columns))
+        self.row_type = namedtuple(f'{model.__name__}Row', columns)
+
+    def create_row_processor(self, query, procs, labels):
+        make = self.row_type._make
+
+        def process(row):
+            return make([proc(row) for proc in procs])
+        return process
+
+
+@functools.lru_cache(maxsize=256)
+def _projection(model, columns: Tuple[str, ...]) -> Projection:
+    known = {column.key for column in inspect(model).column_attrs}
+    unknown = [name for name in columns if name not in known]
+    if unknown:
+        raise ValueError(f"{model.__name__} has no column {', '.join(map(repr, unknown))}")
+    return Projection(model, columns)
+
+
+def projection(model, columns: Sequence[str], load: Load = None,
+               keys: Sequence[str] = ()) -> Projection:
+    """The Projection of `columns`, plus any of `keys` (sort or lookup
+    columns the caller reads back) that are missing"""
+    if load is not None:
+        raise ValueError("load= loads relationships of entities; it cannot be combined with columns=")
+    if not columns:
+        raise ValueError("columns= needs at least one column")
+    columns = tuple(columns) + tuple(key for key in keys if key not in columns)
+    return _projection(model, columns)
+
+
+def project(query: Query, model, columns: Columns, load: Load = None,
+            keys: Sequence[str] = ()) -> Query:
+    """`query` selecting the named tuples of `columns` instead of `model`
+    entities; unchanged when `columns` is None"""
+    if columns is None:
+        return query
+    return query.with_entities(projection(model, columns, load, keys))
@@ -1,50 +1,200 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple, Iterable, Union
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 from models import Proprietario
+from instrumentation import instrumented
+from routing import read_only
+from .bulk import (DEFAULT_BATCH_SIZE, Filters, bulk_insert, bulk_upsert, chain_hooks,
+                   checked_values, delete_rows, matching_keys, update_rows, where_clause)
+from .cache import (CacheBackend, evict, invalidate, mark_dirty, read_through, read_through_many,
+                    stored_row)
+from .pagination import Page, paginate
+from .projection import Columns, project
+from .fulltext import SEARCH_ENTITIES, SearchBackend, load_hits
+from .loading import Load, with_load
+from .unit_of_work import after_commit, commit
 
+@instrumented
 class ProprietarioRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, search_backend: Optional[SearchBackend] = None,
+                 cache: Optional[CacheBackend] = None):
         self.db = db
+        self.search_backend = search_backend
+        self.cache = cache
+
+    def _index_rows(self, rows: List[dict]):
+        fields = SEARCH_ENTITIES['proprietarios'].fields
+        for row in rows:
+            self.search_backend.index('proprietarios', row['proprietario_id'],
+                                      [row.get(field) for field in fields])
+
+    def _reindex_rows(self, rows: List[dict]):
+        self.search_backend.reindex(self.db, 'proprietarios',
+                                    [row['proprietario_id'] for row in rows])
+
+    def _evict_rows(self, rows: List[dict]):
+        evict(self.cache, Proprietario, [row['proprietario_id'] for row in rows])
+
+    def _mark_rows(self, rows: List[dict]):
+        mark_dirty(self.db, self.cache, Proprietario, [row['proprietario_id'] for row in rows])
 
     def create(self, proprietario: Proprietario) -> Proprietario:
         self.db.add(proprietario)
-        self.db.commit()
-        self.db.refresh(proprietario)
+        if commit(self.db):
+            self.db.refresh(proprietario)
+        if self.search_backend is not None:
+            after_commit(self.db, self.search_backend.index_object, 'proprietarios', proprietario)
         return proprietario
 
-    def get_by_id(self, proprietario_id: str) -> Optional[Proprietario]:
-        return self.db.query(Proprietario).filter(
+    def create_many(self, proprietarios: Iterable[Union[Proprietario, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        on_batch = self._index_rows if self.search_backend is not None else None
+        return bulk_insert(self.db, Proprietario, proprietarios, batch_size, return_keys, on_batch)
+
+    def upsert_many(self, proprietarios: Iterable[Union[Proprietario, dict]],
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    return_keys: bool = False) -> Optional[List[str]]:
+        on_batch = chain_hooks(self._reindex_rows if self.search_backend is not None else None,
+                               self._evict_rows if self.cache is not None else None)
+        mark_rows = self._mark_rows if self.cache is not None else None
+        return bulk_upsert(self.db, Proprietario, proprietarios, batch_size, return_keys, on_batch,
+                           before_commit=mark_rows)
+
+    @read_only
+    def get_by_id(self, proprietario_id: str, load: Load = None) -> Optional[Proprietario]:
+        query = with_load(self.db.query(Proprietario), Proprietario, load).filter(
             Proprietario.proprietario_id == proprietario_id
-        ).first()
+        )
+        if self.cache is not None and load is None:
+            return read_through(self.db, self.cache, Proprietario, proprietario_id, query.first)
+        return query.first()
+
+    @read_only
+    def get_by_ids(self, proprietario_ids: List[str], load: Load = None,
+                   columns: Columns = None) -> List[Proprietario]:
+        """The rows with these keys, in no particular order; unknown keys are skipped"""
+        query = with_load(self.db.query(Proprietario), Proprietario, load)
+        if self.cache is not None and load is None and columns is None:
+            return read_through_many(self.db, self.cache, Proprietario, proprietario_ids,
+                                     lambda missing: query.filter(Proprietario.proprietario_id.in_(missing)).all())
+        return project(query, Proprietario, columns, load).filter(
+            Proprietario.proprietario_id.in_(proprietario_ids)
+        ).all()
+
+    @read_only
+    def get_all(self, skip: int = 0, limit: int = 100, load: Load = None,
+                columns: Columns = None) -> List[Proprietario]:
+        query = with_load(self.db.query(Proprietario), Proprietario, load)
+        return project(query, Proprietario, columns, load).offset(skip).limit(limit).all()
 
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Proprietario]:
-        return self.db.query(Proprietario).offset(skip).limit(limit).all()
+    @read_only
+    def get_all_page(self, cursor: Optional[str] = None, limit: int = 100,
+                     reverse: bool = False, load: Load = None,
+                     columns: Columns = None) -> Page[Proprietario]:
+        query = with_load(self.db.query(Proprietario), Proprietario, load)
+        return paginate(project(query, Proprietario, columns, load, keys=('proprietario_id',)),
+                        [(Proprietario.proprietario_id, False)], cursor, limit, reverse)
 
-    def get_by_cpf_cnpj(self, cpf_cnpj: str) -> Optional[Proprietario]:
-        return self.db.query(Proprietario).filter(
+    @read_only
+    def get_by_cpf_cnpj(self, cpf_cnpj: str, load: Load = None) -> Optional[Proprietario]:
+        return with_load(self.db.query(Proprietario), Proprietario, load).filter(
             Proprietario.cpf_cnpj == cpf_cnpj
         ).first()
 
     def update(self, proprietario_id: str, proprietario_data: dict) -> Optional[Proprietario]:
-        proprietario = self.get_by_id(proprietario_id)
+        # Writes start from the stored row, never from a cached snapshot
+        proprietario = stored_row(self.db, Proprietario, proprietario_id, self.cache)
         if proprietario:
             for key, value in proprietario_data.items():
                 if hasattr(proprietario, key):
                     setattr(proprietario, key, value)
-            self.db.commit()
-            self.db.refresh(proprietario)
+            if commit(self.db):
+                self.db.refresh(proprietario)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Proprietario, [proprietario_id])
+            if self.search_backend is not None:
+                after_commit(self.db, self.search_backend.index_object, 'proprietarios', proprietario)
         return proprietario
 
     def delete(self, proprietario_id: str) -> bool:
-        proprietario = self.get_by_id(proprietario_id)
+        proprietario = stored_row(self.db, Proprietario, proprietario_id, self.cache)
         if proprietario:
             self.db.delete(proprietario)
-            self.db.commit()
+            commit(self.db)
+            if self.cache is not None:
+                invalidate(self.db, self.cache, Proprietario, [proprietario_id])
+            if self.search_backend is not None:
+                after_commit(self.db, self.search_backend.remove, 'proprietarios', proprietario_id)
             return True
         return False
 
-    def search_by_name(self, name: str, skip: int = 0, limit: int = 100) -> List[Proprietario]:
-        return self.db.query(Proprietario).filter(
+    def _after_set_write(self, keys: List[str], removed: bool = False):
+        if self.cache is not None:
+            invalidate(self.db, self.cache, Proprietario, keys)
+        if self.search_backend is not None and removed:
+            for key in keys:
+                after_commit(self.db, self.search_backend.remove, 'proprietarios', key)
+        elif self.search_backend is not None:
+            after_commit(self.db, self.search_backend.reindex, self.db, 'proprietarios', keys)
+
+    def update_where(self, filters: Filters, values: dict) -> int:
+        """Set `values` on every proprietario matching `filters` with one UPDATE
+
+        Nothing is loaded; returns the number of rows matched.
+        """
+        condition = where_clause(Proprietario, filters)
+        values = checked_values(Proprietario, values)
+        tracked = self.cache is not None or self.search_backend is not None
+        keys = matching_keys(self.db, Proprietario, condition) if tracked else []
+        count = update_rows(self.db, Proprietario, condition, values)
+        commit(self.db)
+        self._after_set_write(keys)
+        return count
+
+    def delete_by_ids(self, proprietario_ids: Iterable[str]) -> int:
+        """Delete some proprietarios with one DELETE; returns how many existed"""
+        proprietario_ids = list(proprietario_ids)
+        if not proprietario_ids:
+            return 0
+        count = delete_rows(self.db, Proprietario, Proprietario.proprietario_id.in_(proprietario_ids))
+        commit(self.db)
+        self._after_set_write(proprietario_ids, removed=True)
+        return count
+
+    def _search_by_name_query(self, name: str, load: Load = None):
+        return with_load(self.db.query(Proprietario), Proprietario, load).filter(
             Proprietario.nome.ilike(f"%{name}%")
-        ).offset(skip).limit(limit).all()
\ No newline at end of file
+        )
+
+    @read_only
+    def search_by_name(self, name: str, skip: int = 0, limit: int = 100,
+                       load: Load = None, columns: Columns = None) -> List[Proprietario]:
+        if self.search_backend is not None and self.search_backend.ready('proprietarios'):
+            ranked = self.search_by_name_ranked(name, skip + limit, load, columns)
+            return [proprietario for proprietario, _ in ranked[skip:]]
+        query = project(self._search_by_name_query(name, load), Proprietario, columns, load)
+        return query.offset(skip).limit(limit).all()
+
+    @read_only
+    def search_by_name_ranked(self, name: str, limit: int = 20,
+                              load: Load = None,
+                              columns: Columns = None) -> List[Tuple[Proprietario, float]]:
+        """Best matches first, by word or word prefix of the name
+
+        Without a ready `search_backend` this falls back to the substring
+        search, with every match scored 0.0.
+        """
+        if self.search_backend is None or not self.search_backend.ready('proprietarios'):
+            query = project(self._search_by_name_query(name, load), Proprietario, columns, load)
+            return [(proprietario, 0.0) for proprietario in query.limit(limit)]
+        hits = self.search_backend.search(self.db, 'proprietarios', name, limit)
+        return load_hits(self.db, 'proprietarios', hits, load, columns)
+
+    @read_only
+    def search_by_name_page(self, name: str, cursor: Optional[str] = None, limit: int = 100,
+                            reverse: bool = False, load: Load = None,
+                            columns: Columns = None) -> Page[Proprietario]:
+        return paginate(project(self._search_by_name_query(name, load), Proprietario, columns, load,
+                                keys=('proprietario_id',)),
+                        [(Proprietario.proprietario_id, False)], cursor, limit, reverse)
\ No newline at end of file
@@ -0,0 +1,124 @@
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, delete, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import Avaliacao, AvaliacaoResumo
+
+NOTAS = range(1, 6)
+
+
+def _histogram_column(nota: int):
+    return getattr(AvaliacaoResumo, f'nota_{nota}')
+
+
+def _refresh_media(db: Session, hospedagem_id: str):
+    db.execute(
+        update(AvaliacaoResumo)
+        .where(AvaliacaoResumo.hospedagem_id == hospedagem_id)
+        .values(media=case(
+            (AvaliacaoResumo.quantidade > 0,
+             AvaliacaoResumo.soma * literal(1.0) / AvaliacaoResumo.quantidade),
+            else_=None
+        ))
+    )
+    db.execute(
+        delete(AvaliacaoResumo).where(
+            AvaliacaoResumo.hospedagem_id == hospedagem_id,
+            AvaliacaoResumo.quantidade <= 0
+        )
+    )
+
+
+def apply_rating(db: Session, hospedagem_id: Optional[str], nota: Optional[int], sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) one review from the aggregates
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    if hospedagem_id is None or nota is None:
+        return
+
+    values = {
+        'quantidade': AvaliacaoResumo.quantidade + sign,
+        'soma': AvaliacaoResumo.soma + sign * nota,
+    }
+    if nota in NOTAS:
+        values[f'nota_{nota}'] = _histogram_column(nota) + sign
+    stmt = update(AvaliacaoResumo).where(
+        AvaliacaoResumo.hospedagem_id == hospedagem_id
+    ).values(values)
+
+    if db.execute(stmt).rowcount == 0 and sign > 0:
+        row = {'hospedagem_id': hospedagem_id, 'quantidade': 1, 'soma': nota}
+        row.update({f'nota_{n}': int(n == nota) for n in NOTAS})
+        try:
+            with db.begin_nested():
+                db.execute(insert(AvaliacaoResumo), row)
+        except IntegrityError:
+            # A concurrent transaction created the row first
+            db.execute(stmt)
+
+    _refresh_media(db, hospedagem_id)
+
+
+def _computed(hospedagem_ids: Optional[List[str]] = None):
+    stmt = select(
+        Avaliacao.hospedagem_id,
+        func.count(Avaliacao.nota).label('quantidade'),
+        func.coalesce(func.sum(Avaliacao.nota), 0).label('soma'),
+        *[
+            func.count(case((Avaliacao.nota == nota, 1))).label(f'nota_{nota}')
+            for nota in NOTAS
+        ],
+        (func.sum(Avaliacao.nota) * literal(1.0) / func.count(Avaliacao.nota)).label('media'),
+    ).where(
+        Avaliacao.hospedagem_id != None,
+        Avaliacao.nota != None
+    ).group_by(Avaliacao.hospedagem_id)
+    if hospedagem_ids is not None:
+        stmt = stmt.where(Avaliacao.hospedagem_id.in_(hospedagem_ids))
+    return stmt
+
+
+def _insert_computed(db: Session, hospedagem_ids: Optional[List[str]] = None):
+    columns = ['hospedagem_id', 'quantidade', 'soma',
+               *[f'nota_{nota}' for nota in NOTAS], 'media']
+    db.execute(insert(AvaliacaoResumo).from_select(columns, _computed(hospedagem_ids)))
+
+
+def refresh_ratings(db: Session, hospedagem_ids: Iterable[str]):
+    """Recompute the aggregates of some hospedagens from `avaliacoes`
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    hospedagem_ids = sorted({h for h in hospedagem_ids if h is not None})
+    for start in range(0, len(hospedagem_ids), 500):
+        chunk = hospedagem_ids[start:start + 500]
+        db.execute(delete(AvaliacaoResumo).where(AvaliacaoResumo.hospedagem_id.in_(chunk)))
+        _insert_computed(db, chunk)
+
+
+def rebuild_ratings(db: Session) -> int:
+    """Recompute every aggregate from `avaliacoes` in one transaction"""
+    db.execute(delete(AvaliacaoResumo))
+    _insert_computed(db)
+    db.commit()
+    return db.query(AvaliacaoResumo).count()
+
+
+def verify_ratings(db: Session) -> List[str]:
+    """Return the hospedagem_ids whose stored aggregates drifted from `avaliacoes`"""
+    fields = ['quantidade', 'soma', *[f'nota_{nota}' for nota in NOTAS]]
+    expected: Dict[str, tuple] = {
+        row.hospedagem_id: tuple(getattr(row, name) for name in fields)
+        for row in db.execute(_computed())
+    }
+    stored: Dict[str, tuple] = {
+        row.hospedagem_id: tuple(getattr(row, name) for name in fields)
+        for row in db.execute(select(AvaliacaoResumo.__table__))
+    }
+    return sorted(
+        hospedagem_id for hospedagem_id in expected.keys() | stored.keys()
+        if expected.get(hospedagem_id) != stored.get(hospedagem_id)
+    )
@@ -0,0 +1,51 @@
+import random
+import time
+from typing import Callable, TypeVar
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from .unit_of_work import active_unit_of_work
+
+T = TypeVar('T')
+
+DEFAULT_ATTEMPTS = 5
+# MySQL: lock wait timeout, deadlock. PostgreSQL: serialization failure, deadlock
+RETRYABLE_CODES = {1205, 1213, '40001', '40P01'}
+# SQLite reports a busy database by message only
+RETRYABLE_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_retryable(error: DBAPIError) -> bool:
+    """True for deadlocks, lock timeouts and serialization failures, which
+    succeed when the whole transaction is run again"""
+    orig = error.orig
+    code = getattr(orig, 'pgcode', None) or (orig.args[0] if getattr(orig, 'args', None) else None)
+    if code in RETRYABLE_CODES:
+        return True
+    return any(message in str(orig) for message in RETRYABLE_MESSAGES)
+
+
+def run_in_transaction(db: Session, work: Callable[[], T], attempts: int = DEFAULT_ATTEMPTS,
+                       backoff: float = 0.005) -> T:
+    """Run `work()` and commit, rolling back and running it again on
+    retryable errors, up to `attempts` times with jittered exponential backoff
+
+    Inside a unit of work the transaction belongs to the caller, so `work()`
+    runs once and errors propagate for the whole block to roll back.
+    """
+    if active_unit_of_work(db) is not None:
+        return work()
+    for attempt in range(1, attempts + 1):
+        try:
+            result = work()
+            db.commit()
+            return result
+        except DBAPIError as error:
+            db.rollback()
+            if attempt == attempts or not is_retryable(error):
+                raise
+        except Exception:
+            db.rollback()
+            raise
+        time.sleep(random.uniform(0, backoff * 2 ** attempt))
@@ -0,0 +1,220 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_DOWN
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, select, union_all, update
+from sqlalchemy.orm import Session
+
+from models import Aluguel, AluguelArquivo, Endereco, Hospedagem, ReceitaDiaria
+
+CENT = Decimal('0.01')
+
+# (hospedagem_id, data_inicio, data_fim, preco_total) of one aluguel
+Rental = Tuple[Optional[str], Optional[date], Optional[date], Optional[Decimal]]
+
+
+def nightly_amounts(data_inicio: date, data_fim: date, preco_total) -> List[Tuple[date, Decimal]]:
+    """Split a rental price across its nights, to the cent
+
+    The night of day d covers d to d + 1, so a stay from the 1st to the 4th
+    has three nights. Same-day stays book their whole price on data_inicio.
+    Rounding leftovers go to the last night, so the parts always add up.
+    """
+    preco_total = Decimal(preco_total)
+    nights = max((data_fim - data_inicio).days, 1)
+    share = (preco_total / nights).quantize(CENT, rounding=ROUND_DOWN)
+    amounts = [(data_inicio + timedelta(days=night), share) for night in range(nights)]
+    last_day, _ = amounts[-1]
+    amounts[-1] = (last_day, preco_total - share * (nights - 1))
+    return amounts
+
+
+def _dimensions(db: Session, hospedagem_ids: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+    """(proprietario_id, cidade) per hospedagem; cidade is the search key of
+    the city, as in Endereco.cidade_busca"""
+    rows = db.execute(
+        select(Hospedagem.hospedagem_id, Hospedagem.proprietario_id, Endereco.cidade_busca)
+        .outerjoin(Endereco, Endereco.endereco_id == Hospedagem.endereco_id)
+        .where(Hospedagem.hospedagem_id.in_(set(hospedagem_ids)))
+    )
+    return {hospedagem_id: (proprietario_id, cidade) for hospedagem_id, proprietario_id, cidade in rows}
+
+
+def reattribute_revenue(db: Session, hospedagem_ids: Iterable[str]):
+    """Copy the current proprietario and cidade of some hospedagens onto
+    their rollup rows, after a write moved them to another owner or address
+
+    Runs inside the caller's transaction, after flushing it; the caller commits.
+    """
+    db.flush()
+    grouped: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+    for hospedagem_id, dimensions in _dimensions(db, hospedagem_ids).items():
+        grouped[dimensions].append(hospedagem_id)
+    for (proprietario_id, cidade), ids in grouped.items():
+        db.execute(
+            update(ReceitaDiaria)
+            .where(ReceitaDiaria.hospedagem_id.in_(ids))
+            .values(proprietario_id=proprietario_id, cidade=cidade)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _increment_statement(db: Session, rows: List[dict]):
+    table = ReceitaDiaria.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table)
+        return stmt.on_duplicate_key_update(valor=table.c.valor + stmt.inserted.valor)
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=['dia', 'hospedagem_id'],
+            set_={'valor': table.c.valor + stmt.excluded.valor}
+        )
+
+    return None
+
+
+def apply_rentals(db: Session, rentals: Iterable[Rental], sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) rentals from the daily rollup
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    totals: Dict[Tuple[date, str], Decimal] = defaultdict(Decimal)
+    for hospedagem_id, data_inicio, data_fim, preco_total in rentals:
+        if None in (hospedagem_id, data_inicio, data_fim, preco_total):
+            continue
+        for dia, valor in nightly_amounts(data_inicio, data_fim, preco_total):
+            totals[(dia, hospedagem_id)] += sign * valor
+    if not totals:
+        return
+
+    dimensions = _dimensions(db, (hospedagem_id for _, hospedagem_id in totals))
+    rows = [
+        {
+            'dia': dia,
+            'hospedagem_id': hospedagem_id,
+            'proprietario_id': dimensions.get(hospedagem_id, (None, None))[0],
+            'cidade': dimensions.get(hospedagem_id, (None, None))[1],
+            'valor': valor,
+        }
+        for (dia, hospedagem_id), valor in totals.items()
+    ]
+
+    stmt = _increment_statement(db, rows)
+    if stmt is not None:
+        db.execute(stmt, rows)
+    else:
+        for row in rows:
+            updated = db.execute(
+                update(ReceitaDiaria)
+                .where(ReceitaDiaria.dia == row['dia'],
+                       ReceitaDiaria.hospedagem_id == row['hospedagem_id'])
+                .values(valor=ReceitaDiaria.valor + row['valor'])
+            )
+            if updated.rowcount == 0:
+                db.add(ReceitaDiaria(**row))
+        db.flush()
+
+    if sign < 0:
+        # Drop the nights that no longer earn anything
+        days = [dia for dia, _ in totals]
+        db.execute(
+            delete(ReceitaDiaria).where(
+                ReceitaDiaria.hospedagem_id.in_({hospedagem_id for _, hospedagem_id in totals}),
+                ReceitaDiaria.dia.between(min(days), max(days)),
+                ReceitaDiaria.valor == 0
+            )
+        )
+
+
+def rental_values(db: Session, aluguel_ids: Iterable[str]) -> List[Rental]:
+    """The stored (hospedagem_id, data_inicio, data_fim, preco_total) of some rentals"""
+    return [
+        tuple(row) for row in db.execute(
+            select(Aluguel.hospedagem_id, Aluguel.data_inicio,
+                   Aluguel.data_fim, Aluguel.preco_total)
+            .where(Aluguel.aluguel_id.in_(list(aluguel_ids)))
+        )
+    ]
+
+
+def rebuild_revenue(db: Session, chunk_size: int = 10000) -> int:
+    """Recompute the whole rollup from `alugueis` and `alugueis_arquivo`,
+    committing once at the end"""
+    db.execute(delete(ReceitaDiaria))
+    count = 0
+    for model in (Aluguel, AluguelArquivo):
+        last_id = None
+        # Keyset batches rather than one streamed cursor: MySQL cannot write on
+        # a connection while an unbuffered result is still open on it
+        while True:
+            stmt = select(model.aluguel_id, model.hospedagem_id, model.data_inicio,
+                          model.data_fim, model.preco_total)
+            if last_id is not None:
+                stmt = stmt.where(model.aluguel_id > last_id)
+            chunk = db.execute(stmt.order_by(model.aluguel_id).limit(chunk_size)).all()
+            if not chunk:
+                break
+            apply_rentals(db, (tuple(row[1:]) for row in chunk))
+            count += len(chunk)
+            last_id = chunk[-1].aluguel_id
+    db.commit()
+    return count
+
+
+def _drifted(db: Session, hospedagem_ids: List[str]) -> List[str]:
+    rentals = union_all(*(
+        select(model.hospedagem_id, model.data_inicio, model.data_fim, model.preco_total)
+        .where(model.hospedagem_id.in_(hospedagem_ids), model.data_inicio != None,
+               model.data_fim != None, model.preco_total != None)
+        for model in (Aluguel, AluguelArquivo)
+    )).subquery()
+    expected: Dict[Tuple[date, str], Decimal] = defaultdict(Decimal)
+    for hospedagem_id, data_inicio, data_fim, preco_total in db.execute(select(rentals)):
+        for dia, valor in nightly_amounts(data_inicio, data_fim, preco_total):
+            expected[(dia, hospedagem_id)] += valor
+    dimensions = _dimensions(db, hospedagem_ids)
+
+    drifted = set()
+    stored = db.execute(
+        select(ReceitaDiaria.dia, ReceitaDiaria.hospedagem_id, ReceitaDiaria.proprietario_id,
+               ReceitaDiaria.cidade, ReceitaDiaria.valor)
+        .where(ReceitaDiaria.hospedagem_id.in_(hospedagem_ids))
+    )
+    for dia, hospedagem_id, proprietario_id, cidade, valor in stored:
+        if (Decimal(expected.pop((dia, hospedagem_id), 0)).quantize(CENT)
+                != Decimal(valor).quantize(CENT)
+                or dimensions.get(hospedagem_id) != (proprietario_id, cidade)):
+            drifted.add(hospedagem_id)
+    # Nights earning something with no rollup row
+    drifted.update(hospedagem_id for (_, hospedagem_id), valor in expected.items() if valor)
+    return sorted(drifted)
+
+
+def verify_revenue(db: Session, chunk_size: int = 1000) -> List[str]:
+    """Return the hospedagem_ids whose rollup drifted from `alugueis` and
+    `alugueis_arquivo`
+
+    Every (hospedagem, day) row is compared: its value against the nights of
+    the rentals, and its proprietario_id and cidade against the current
+    hospedagem and address. Hospedagens are checked `chunk_size` at a time.
+    """
+    drifted, last_id = [], None
+    while True:
+        stmt = select(Hospedagem.hospedagem_id)
+        if last_id is not None:
+            stmt = stmt.where(Hospedagem.hospedagem_id > last_id)
+        chunk = list(db.scalars(stmt.order_by(Hospedagem.hospedagem_id).limit(chunk_size)))
+        if not chunk:
+            return drifted
+        drifted.extend(_drifted(db, chunk))
+        last_id = chunk[-1]
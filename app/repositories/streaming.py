@@ -0,0 +1,25 @@
+from typing import Iterator
+
+from sqlalchemy.orm import Query
+
+from .loading import Load
+from .projection import Columns, project
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def stream(query: Query, model, chunk_size: int = DEFAULT_CHUNK_SIZE,
+           as_rows: bool = False, columns: Columns = None, load: Load = None) -> Iterator:
+    """Iterate a query through a server-side cursor, `chunk_size` rows at a time
+
+    With `as_rows` only the table columns are selected and plain Row tuples
+    are yielded, skipping entity hydration and the identity map entirely;
+    `columns` does the same for some columns, as named tuples.
+    Entities are yielded otherwise; the session only holds weak references
+    to them, so memory stays flat as long as the caller does not keep them.
+    """
+    if columns is not None:
+        query = project(query, model, columns, load)
+    elif as_rows:
+        query = query.with_entities(*model.__table__.columns)
+    yield from query.yield_per(chunk_size)
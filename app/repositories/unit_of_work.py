@@ -0,0 +1,90 @@
+from typing import Callable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+_ACTIVE = 'unit_of_work'
+
+
+class UnitOfWork:
+    """One transaction for several repository calls
+
+    Inside `with UnitOfWork(db):` every repository on `db` flushes instead of
+    committing. The block commits once when it ends, or rolls back if it
+    raises. Work that must only see committed data (cache eviction, search
+    and availability index updates) is queued and runs after the commit.
+    A unit of work opened inside another one joins it.
+
+    Cache keys written in the block are also evicted at once and kept in
+    `dirty` until the commit, so reads inside the block skip the cache for
+    them and never see a snapshot older than the block's own writes.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dirty: Set[str] = set()
+        self._after_commit: List[Tuple[Callable, tuple]] = []
+        self._joined: Optional['UnitOfWork'] = None
+
+    def __enter__(self) -> 'UnitOfWork':
+        active = self.db.info.get(_ACTIVE)
+        if active is not None:
+            self._joined = active
+            return active
+        self.db.info[_ACTIVE] = self
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self._joined is not None:
+            self._joined = None
+            return
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            del self.db.info[_ACTIVE]
+
+    def after_commit(self, callback: Callable, *args):
+        self._after_commit.append((callback, args))
+
+    def commit(self):
+        """Commit what the block wrote so far, then run the queued work"""
+        self.db.commit()
+        pending, self._after_commit = self._after_commit, []
+        for callback, args in pending:
+            callback(*args)
+        self.dirty.clear()
+
+    def rollback(self):
+        self._after_commit.clear()
+        self.db.rollback()
+        self.dirty.clear()
+
+
+def active_unit_of_work(db: Session) -> Optional[UnitOfWork]:
+    return db.info.get(_ACTIVE)
+
+
+def commit(db: Session) -> bool:
+    """Commit, or only flush inside a unit of work; True if it committed"""
+    if active_unit_of_work(db) is not None:
+        db.flush()
+        return False
+    db.commit()
+    return True
+
+
+def rollback(db: Session):
+    # A unit of work rolls back as a whole when its block raises
+    if active_unit_of_work(db) is None:
+        db.rollback()
+
+
+def after_commit(db: Session, callback: Callable, *args):
+    """Run `callback(*args)` now, or once the active unit of work commits"""
+    unit_of_work = active_unit_of_work(db)
+    if unit_of_work is not None:
+        unit_of_work.after_commit(callback, *args)
+    else:
+        callback(*args)
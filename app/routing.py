@@ -0,0 +1,91 @@
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+_read_only: ContextVar[bool] = ContextVar('read_only', default=False)
+
+
+def is_read_only() -> bool:
+    return _read_only.get()
+
+
+@contextmanager
+def read_only_scope():
+    """Statements executed inside may be answered by a read replica"""
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def _first_on_replica(iterator: Iterator) -> Iterator:
+    # A streamed query picks its connection on the first fetch; later chunks
+    # keep reading from that connection, so only the first step is marked
+    with read_only_scope():
+        try:
+            first = next(iterator)
+        except StopIteration:
+            return
+    yield first
+    yield from iterator
+
+
+def read_only(method):
+    """Mark a repository method as safe to answer from a read replica
+
+    Only a RoutingSession acts on the mark; other sessions ignore it.
+    Generators returned by the method (iter_* streaming) are routed too.
+    """
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with read_only_scope():
+            result = method(*args, **kwargs)
+        if inspect.isgenerator(result):
+            return _first_on_replica(result)
+        return result
+    return wrapper
+
+
+class RoutingSession(Session):
+    """Session that sends @read_only repository reads to a replica
+
+    Everything else goes to the primary: flushes, INSERT/UPDATE/DELETE,
+    SELECT ... FOR UPDATE and reads outside @read_only methods. After a
+    session writes, its reads stay on the primary for `stickiness` seconds
+    so it always sees its own writes despite replication lag.
+    """
+
+    def __init__(self, *args, primary: Engine, replica: Optional[Engine] = None,
+                 stickiness: float = 5.0, **kwargs):
+        kwargs.setdefault('bind', primary)
+        super().__init__(*args, **kwargs)
+        self.primary = primary
+        self.replica = replica
+        self.stickiness = stickiness
+        self._primary_until = 0.0
+
+    def stick_to_primary(self, seconds: Optional[float] = None):
+        seconds = self.stickiness if seconds is None else seconds
+        self._primary_until = max(self._primary_until, time.monotonic() + seconds)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replica is None:
+            return self.primary
+        writing = (
+            self._flushing
+            or getattr(clause, 'is_dml', False)
+            or getattr(clause, '_for_update_arg', None) is not None
+        )
+        if writing:
+            self.stick_to_primary()
+            return self.primary
+        if is_read_only() and time.monotonic() >= self._primary_until:
+            return self.replica
+        return self.primary
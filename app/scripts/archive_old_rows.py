@@ -0,0 +1,54 @@
+"""Move old alugueis and avaliacoes into their archive tables
+
+Usage:
+    python scripts/archive_old_rows.py --before 2022-01-01
+    python scripts/archive_old_rows.py --before 2022-01-01 --only alugueis --pause 0.5
+    python scripts/archive_old_rows.py --before 2022-01-01 --max-batches 100   # resume later
+
+Rentals that ended before the date and reviews made before it (judged by
+their UUIDv7 key, or by the cliente's stays for older UUID4 keys) are moved in batches, one transaction each, so the run
+can be stopped at any point and started again.
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from repositories import AluguelRepository, AvaliacaoRepository
+
+REPOSITORIES = {'alugueis': AluguelRepository, 'avaliacoes': AvaliacaoRepository}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='SQLAlchemy database URL (defaults to database.DATABASE_URL)')
+    parser.add_argument('--before', type=date.fromisoformat, required=True,
+                        help='cutoff date (YYYY-MM-DD); newer rows stay')
+    parser.add_argument('--only', choices=sorted(REPOSITORIES), action='append',
+                        help='archive only this table (repeatable)')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--pause', type=float, default=0.1, help='seconds to sleep between batches')
+    parser.add_argument('--max-batches', type=int, help='stop after this many batches per table')
+    args = parser.parse_args()
+
+    if args.url:
+        url = args.url
+    else:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+
+    with sessionmaker(bind=create_engine(url))() as db:
+        for table in args.only or list(REPOSITORIES):
+            moved = REPOSITORIES[table](db).archive_before(
+                args.before, args.batch_size, args.pause, args.max_batches
+            )
+            print(f"✓ Archived {moved} {table}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Check that lookups by keys that are not UUIDs miss instead of raising
+
+Usage:
+    python scripts/check_malformed_ids.py
+
+Keys are stored as BINARY(16), so a string like 'abc' cannot even be bound
+as a parameter. Reads by such a key must answer like reads by an unknown
+key, while writing one must still fail. Runs against an in-memory SQLite
+database; exits with status 1 if any check fails.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from identifiers import uuid7
+from models import Base, Cliente
+from repositories import (AluguelRepository, AvaliacaoRepository, ClienteRepository, DataLoader,
+                          EnderecoRepository, HospedagemRepository, LocalLRUCache,
+                          ProprietarioRepository)
+from repositories.pagination import encode_cursor
+
+MALFORMED = 'abc'
+REPOSITORIES = (ProprietarioRepository, ClienteRepository, EnderecoRepository,
+                HospedagemRepository, AluguelRepository, AvaliacaoRepository)
+
+
+def main():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    failures = []
+
+    def check(description, work):
+        try:
+            condition = work()
+        except Exception as error:
+            description = f"{description} ({type(error).__name__}: {str(error).splitlines()[0]})"
+            condition = False
+        print(f"{'✓' if condition else '✗'} {description}")
+        if not condition:
+            failures.append(description)
+
+    with Session(engine) as db:
+        cliente_id = uuid7()
+        ClienteRepository(db).create(Cliente(cliente_id=cliente_id, nome='Bruno'))
+
+        check('get_by_id returns None on every repository',
+              lambda: all(repository(db).get_by_id(MALFORMED) is None for repository in REPOSITORIES))
+        check('get_by_id through the cache returns None',
+              lambda: ClienteRepository(db, cache=LocalLRUCache()).get_by_id(MALFORMED) is None)
+        check('get_by_ids skips malformed keys and finds the others',
+              lambda: [cliente.cliente_id for cliente in
+                       ClienteRepository(db).get_by_ids([MALFORMED, cliente_id])] == [cliente_id])
+        check('DataLoader answers None for malformed keys',
+              lambda: DataLoader(db).get(Cliente, MALFORMED) is None and
+              [cliente and cliente.cliente_id for cliente in
+               DataLoader(db).get_many(Cliente, [MALFORMED, cliente_id])] == [None, cliente_id])
+        check('lookups by a malformed foreign key find nothing',
+              lambda: AluguelRepository(db).get_by_cliente(MALFORMED) == [] and
+              AvaliacaoRepository(db).get_average_rating(MALFORMED) is None)
+        def page_after_malformed():
+            try:
+                ClienteRepository(db).get_all_page(cursor=encode_cursor([MALFORMED]))
+            except ValueError:
+                return True
+            return False
+        check('a cursor holding a malformed key is rejected as invalid', page_after_malformed)
+        check('update and delete of a malformed key find nothing',
+              lambda: all(repository(db).update(MALFORMED, {}) is None and
+                          repository(db).delete(MALFORMED) is False for repository in REPOSITORIES))
+
+        def write_malformed():
+            db.add(Cliente(cliente_id=MALFORMED, nome='Nobody'))
+            try:
+                db.flush()
+            except Exception:
+                return True
+            finally:
+                db.rollback()
+            return False
+        check('writing a malformed key still fails', write_malformed)
+
+    engine.dispose()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
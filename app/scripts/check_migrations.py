@@ -0,0 +1,139 @@
+"""Run the Alembic migrations against SQLite files and check the result
+
+Usage:
+    python scripts/check_migrations.py
+
+Two databases are upgraded to head: an empty one, and one seeded with rows
+at the schema of the initial migration (string UUID4 keys, no rollups).
+The seeded rows must come out readable through the repositories, with the
+revenue and rating rollups matching them. Then everything is downgraded to
+base. A third database, seeded with a stay longer than MAX_STAY_DAYS, must
+stop at the stay length CHECK. Exits with status 1 if any check fails.
+"""
+import os
+import sys
+import tempfile
+import uuid
+from datetime import date
+from decimal import Decimal
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+
+from models import MAX_STAY_DAYS, Base
+from repositories import AluguelRepository, AvaliacaoRepository, ClienteRepository, HospedagemRepository
+from repositories.rating_aggregates import verify_ratings
+from repositories.revenue_rollup import verify_revenue
+
+APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INITIAL = 'f541e2ec362c'
+
+
+def alembic_config() -> Config:
+    config = Config(os.path.join(APP, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(APP, 'alembic'))
+    return config
+
+
+def migrate(engine, step, revision: str):
+    config = alembic_config()
+    with engine.begin() as connection:
+        config.attributes['connection'] = connection
+        step(config, revision)
+
+
+def seed(engine, too_long: bool = False) -> dict:
+    """Rows written the way the application wrote them before any later migration"""
+    ids = {name: str(uuid.uuid4()) for name in
+           ('proprietario', 'endereco', 'hospedagem', 'cliente', 'aluguel', 'longo', 'avaliacao')}
+    with engine.begin() as connection:
+        for statement, values in (
+            ("INSERT INTO proprietarios VALUES (:proprietario, 'Ana', '12345678901', 'ana@example.com')", {}),
+            ("INSERT INTO enderecos VALUES (:endereco, 'Rua A', 10, 'Boa Viagem', 'Recife', 'PE', '51020-000')", {}),
+            ("INSERT INTO hospedagens VALUES (:hospedagem, 'Casa', :endereco, :proprietario, 1)", {}),
+            ("INSERT INTO clientes VALUES (:cliente, 'Bruno', '98765432100', 'bruno@example.com')", {}),
+            ("INSERT INTO alugueis VALUES (:aluguel, :cliente, :hospedagem, '2021-03-01', '2021-03-04', 300.00)", {}),
+            # Exactly MAX_STAY_DAYS
+            ("INSERT INTO alugueis VALUES (:longo, :cliente, :hospedagem, '2019-06-01', '2020-06-01', 9000.00)", {}),
+            ("INSERT INTO avaliacoes VALUES (:avaliacao, :cliente, :hospedagem, 4, 'Ótima casa')", {}),
+        ):
+            connection.execute(text(statement), {**ids, **values})
+        if too_long:
+            connection.execute(text("INSERT INTO alugueis VALUES (:aluguel, :cliente, :hospedagem, "
+                                    "'2017-01-01', '2018-06-01', 9000.00)"),
+                               {**ids, 'aluguel': str(uuid.uuid4())})
+    return ids
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+    failures = []
+
+    def check(description, condition):
+        print(f"{'✓' if condition else '✗'} {description}")
+        if not condition:
+            failures.append(description)
+
+    def attempt(description, work):
+        try:
+            work()
+        except Exception as error:
+            check(f"{description} ({type(error).__name__}: {str(error).splitlines()[0]})", False)
+            return False
+        return True
+
+    empty = create_engine(f"sqlite:///{os.path.join(directory, 'empty.db')}")
+    if attempt('upgrade an empty database to head', lambda: migrate(empty, command.upgrade, 'head')):
+        tables = set(inspect(empty).get_table_names())
+        check('an empty database upgrades to head',
+              tables >= set(Base.metadata.tables) and
+              empty.connect().exec_driver_sql("SELECT version_num FROM alembic_version").scalar() == head)
+        check('downgrade to base drops every table',
+              attempt('downgrade to base', lambda: migrate(empty, command.downgrade, 'base')) and
+              set(inspect(empty).get_table_names()) <= {'alembic_version'})
+
+    seeded = create_engine(f"sqlite:///{os.path.join(directory, 'seeded.db')}")
+    migrate(seeded, command.upgrade, INITIAL)
+    ids = seed(seeded)
+    if attempt('upgrade a seeded database to head', lambda: migrate(seeded, command.upgrade, 'head')):
+        with Session(seeded) as db:
+            check('seeded rows are found by their old keys',
+                  ClienteRepository(db).get_by_id(ids['cliente']) is not None and
+                  HospedagemRepository(db).get_by_id(ids['hospedagem']) is not None and
+                  len(AluguelRepository(db).get_by_cliente(ids['cliente'])) == 2)
+            check('the revenue rollup matches the seeded rentals',
+                  AluguelRepository(db).get_revenue_by_period(date(2019, 1, 1), date(2021, 12, 31))
+                  == float(Decimal('9300.00')) and verify_revenue(db) == [])
+            check('the rating aggregates match the seeded reviews',
+                  AvaliacaoRepository(db).get_average_rating(ids['hospedagem']) == 4.0 and
+                  verify_ratings(db) == [])
+            check(f'a stay of {MAX_STAY_DAYS} days still blocks its last dates',
+                  not AluguelRepository(db).check_availability(ids['hospedagem'],
+                                                               date(2020, 5, 30), date(2020, 5, 31)))
+
+    legacy = create_engine(f"sqlite:///{os.path.join(directory, 'legacy.db')}")
+    migrate(legacy, command.upgrade, INITIAL)
+    seed(legacy, too_long=True)
+    try:
+        migrate(legacy, command.upgrade, 'head')
+        stopped = None
+    except ValueError as error:
+        stopped = str(error)
+    check(f'a stay longer than {MAX_STAY_DAYS} days stops the upgrade',
+          stopped is not None and 'last more than' in stopped and
+          legacy.connect().exec_driver_sql("SELECT version_num FROM alembic_version").scalar() != head)
+
+    empty.dispose()
+    seeded.dispose()
+    legacy.dispose()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Run EXPLAIN on every repository read path and flag full table scans
+
+Usage:
+    python scripts/index_advisor.py                        # DB_* environment (MySQL)
+    python scripts/index_advisor.py --url sqlite:///local.db
+    python scripts/index_advisor.py --url sqlite:///local.db --seed 10000
+
+Each repository method is called with arguments sampled from the database
+while the SQL it emits is captured; every captured statement is then
+explained on the same connection. Exits with status 1 when any method still
+scans a whole table, so it can run in CI against a seeded database.
+"""
+import argparse
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Callable, Dict, List, Tuple
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(APP_DIR)
+sys.path.append(os.path.join(APP_DIR, 'fixtures'))
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import Base, Proprietario, Cliente, Endereco, Hospedagem, Aluguel, Avaliacao
+from repositories import (
+    ProprietarioRepository, ClienteRepository, EnderecoRepository,
+    HospedagemRepository, AluguelRepository, AvaliacaoRepository
+)
+
+
+@dataclass
+class Finding:
+    method: str
+    statements: List[str] = field(default_factory=list)
+    full_scans: List[Tuple[str, str]] = field(default_factory=list)
+    error: str = None
+
+
+def sample(db: Session) -> Dict[str, object]:
+    aluguel = db.query(Aluguel).first()
+    avaliacao = db.query(Avaliacao).first()
+    cliente = db.query(Cliente).first()
+    endereco = db.query(Endereco).first()
+    proprietario = db.query(Proprietario).first()
+    hospedagem = db.query(Hospedagem).first()
+    if None in (aluguel, avaliacao, cliente, endereco, proprietario, hospedagem):
+        raise SystemExit('The database needs at least one row per table; use --seed')
+    return {
+        'aluguel': aluguel, 'avaliacao': avaliacao, 'cliente': cliente,
+        'endereco': endereco, 'proprietario': proprietario, 'hospedagem': hospedagem,
+    }
+
+
+def read_paths(s: Dict[str, object]) -> Dict[str, Callable[[Session], object]]:
+    aluguel, cliente, endereco = s['aluguel'], s['cliente'], s['endereco']
+    proprietario, hospedagem = s['proprietario'], s['hospedagem']
+    start, end = aluguel.data_inicio, aluguel.data_inicio + timedelta(days=7)
+    return {
+        'ProprietarioRepository.get_by_id': lambda db: ProprietarioRepository(db).get_by_id(proprietario.proprietario_id),
+        'ProprietarioRepository.get_by_cpf_cnpj': lambda db: ProprietarioRepository(db).get_by_cpf_cnpj(proprietario.cpf_cnpj),
+        'ProprietarioRepository.search_by_name': lambda db: ProprietarioRepository(db).search_by_name(proprietario.nome[:4]),
+        'ClienteRepository.get_by_id': lambda db: ClienteRepository(db).get_by_id(cliente.cliente_id),
+        'ClienteRepository.get_by_cpf': lambda db: ClienteRepository(db).get_by_cpf(cliente.cpf),
+        'ClienteRepository.get_by_ids': lambda db: ClienteRepository(db).get_by_ids([cliente.cliente_id]),
+        'ClienteRepository.search': lambda db: ClienteRepository(db).search(cliente.nome[:4]),
+        'EnderecoRepository.get_by_id': lambda db: EnderecoRepository(db).get_by_id(endereco.endereco_id),
+        'EnderecoRepository.get_by_cep': lambda db: EnderecoRepository(db).get_by_cep(endereco.cep),
+        'EnderecoRepository.get_by_cidade': lambda db: EnderecoRepository(db).get_by_cidade(endereco.cidade),
+        'EnderecoRepository.search_by_address': lambda db: EnderecoRepository(db).search_by_address(cidade=endereco.cidade),
+        'EnderecoRepository.get_by_cep_prefix': lambda db: EnderecoRepository(db).get_by_cep_prefix(endereco.cep[:5]),
+        'HospedagemRepository.get_by_id': lambda db: HospedagemRepository(db).get_by_id(hospedagem.hospedagem_id, load='relations'),
+        'HospedagemRepository.get_by_proprietario': lambda db: HospedagemRepository(db).get_by_proprietario(proprietario.proprietario_id),
+        'HospedagemRepository.get_by_endereco': lambda db: HospedagemRepository(db).get_by_endereco(endereco.endereco_id),
+        'HospedagemRepository.count_by_proprietario': lambda db: HospedagemRepository(db).count_by_proprietario(proprietario.proprietario_id),
+        'HospedagemRepository.search': lambda db: HospedagemRepository(db).search({'cidade': endereco.cidade}),
+        'HospedagemRepository.search_available': lambda db: HospedagemRepository(db).search_available(start, end, cidade=endereco.cidade),
+        'AluguelRepository.get_by_id': lambda db: AluguelRepository(db).get_by_id(aluguel.aluguel_id, load='relations'),
+        'AluguelRepository.get_by_cliente': lambda db: AluguelRepository(db).get_by_cliente(aluguel.cliente_id),
+        'AluguelRepository.get_by_hospedagem': lambda db: AluguelRepository(db).get_by_hospedagem(aluguel.hospedagem_id),
+        'AluguelRepository.get_active_rentals': lambda db: AluguelRepository(db).get_active_rentals(start),
+        'AluguelRepository.check_availability': lambda db: AluguelRepository(db).check_availability(aluguel.hospedagem_id, start, end),
+        'AluguelRepository.check_availability_many': lambda db: AluguelRepository(db).check_availability_many([aluguel.hospedagem_id], start, end),
+        'AluguelRepository.get_rentals_in_period': lambda db: AluguelRepository(db).get_rentals_in_period(start, end),
+        'AluguelRepository.get_revenue_by_period': lambda db: AluguelRepository(db).get_revenue_by_period(start, end),
+        'AluguelRepository.get_revenue_by_month': lambda db: AluguelRepository(db).get_revenue_by_month(start.year, start.month, proprietario_id=proprietario.proprietario_id),
+        'AluguelRepository.get_most_frequent_clients': lambda db: AluguelRepository(db).get_most_frequent_clients(),
+        'AvaliacaoRepository.get_by_id': lambda db: AvaliacaoRepository(db).get_by_id(s['avaliacao'].avaliacao_id, load='relations'),
+        'AvaliacaoRepository.get_by_cliente': lambda db: AvaliacaoRepository(db).get_by_cliente(cliente.cliente_id),
+        'AvaliacaoRepository.get_by_hospedagem': lambda db: AvaliacaoRepository(db).get_by_hospedagem(hospedagem.hospedagem_id),
+        'AvaliacaoRepository.get_average_rating': lambda db: AvaliacaoRepository(db).get_average_rating(hospedagem.hospedagem_id),
+        'AvaliacaoRepository.get_ratings_summary': lambda db: AvaliacaoRepository(db).get_ratings_summary(hospedagem.hospedagem_id),
+        'AvaliacaoRepository.get_recent_reviews': lambda db: AvaliacaoRepository(db).get_recent_reviews(hospedagem.hospedagem_id),
+        'AvaliacaoRepository.get_highest_rated_hospedagens': lambda db: AvaliacaoRepository(db).get_highest_rated_hospedagens(),
+        'AvaliacaoRepository.search_by_comment': lambda db: AvaliacaoRepository(db).search_by_comment('bom'),
+    }
+
+
+def full_scans(connection, statement: str, parameters, tables: set) -> List[Tuple[str, str]]:
+    """Return (table, plan detail) for every full table scan in the plan"""
+    dialect = connection.dialect.name
+    scans = []
+    if dialect == 'sqlite':
+        for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters):
+            detail = row[-1]
+            words = detail.split()
+            # "SCAN alugueis" reads the whole table; "SCAN alugueis USING
+            # [COVERING] INDEX ..." walks an index instead
+            if len(words) >= 2 and words[0] == 'SCAN' and words[1] in tables:
+                if 'USING' not in words:
+                    scans.append((words[1], detail))
+    elif dialect == 'mysql':
+        result = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        for row in result.mappings():
+            if row['type'] == 'ALL' and row['table'] in tables:
+                scans.append((row['table'], f"type=ALL rows={row['rows']}"))
+    else:
+        raise SystemExit(f'EXPLAIN parsing is not implemented for {dialect}')
+    return scans
+
+
+def advise(url: str) -> List[Finding]:
+    engine = create_engine(url)
+    tables = set(Base.metadata.tables)
+    captured: List[Tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    findings = []
+    with sessionmaker(bind=engine)() as db:
+        paths = read_paths(sample(db))
+        event.listen(engine, 'before_cursor_execute', capture)
+        for method, call in paths.items():
+            captured.clear()
+            db.expunge_all()
+            finding = Finding(method)
+            try:
+                call(db)
+            except Exception as e:
+                db.rollback()
+                finding.error = f"{type(e).__name__}: {e}"
+            connection = db.connection()
+            for statement, parameters in list(captured):
+                finding.statements.append(statement)
+                finding.full_scans.extend(full_scans(connection, statement, parameters, tables))
+            findings.append(finding)
+        event.remove(engine, 'before_cursor_execute', capture)
+    engine.dispose()
+    return findings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='SQLAlchemy database URL (defaults to database.DATABASE_URL)')
+    parser.add_argument('--seed', type=int, metavar='RENTALS',
+                        help='generate this many rentals first when the database is empty')
+    args = parser.parse_args()
+
+    if args.url:
+        url = args.url
+    else:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+
+    if args.seed:
+        engine = create_engine(url)
+        empty = not inspect(engine).has_table('alugueis')
+        if not empty:
+            with sessionmaker(bind=engine)() as db:
+                empty = db.query(Aluguel).first() is None
+        engine.dispose()
+        if empty:
+            from generate_dataset import DatasetPlan, generate
+            generate(url, DatasetPlan(rentals=args.seed), workers=1)
+
+    findings = advise(url)
+    flagged = [finding for finding in findings if finding.full_scans]
+    for finding in findings:
+        status = 'ERROR' if finding.error else 'FULL SCAN' if finding.full_scans else 'ok'
+        print(f"{status:<10} {finding.method} ({len(finding.statements)} statements)")
+        for table, detail in finding.full_scans:
+            print(f"{'':<10}   {table}: {detail}")
+        if finding.error:
+            print(f"{'':<10}   {finding.error}")
+
+    print(f"\n{len(flagged)} of {len(findings)} methods scan a full table")
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == '__main__':
+    main()
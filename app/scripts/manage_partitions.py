@@ -0,0 +1,73 @@
+"""List and maintain the monthly partitions of alugueis (MySQL)
+
+Usage:
+    python scripts/manage_partitions.py list
+    python scripts/manage_partitions.py add --months-ahead 12     # run monthly, from cron
+    python scripts/manage_partitions.py drop --before 2020-01-01
+    python scripts/manage_partitions.py exchange --before 2020-01-01
+
+`add` splits the coming months off p_futuro while it is still empty. `drop`
+deletes whole months of rentals; `exchange` moves them into standalone
+alugueis_pYYYYMM tables instead, to archive or dump. Run the Alembic
+migrations first: they partition the table.
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from repositories.partitions import (add_partitions, drop_partitions, exchange_partitions,
+                                     month_start, next_month, partitions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='SQLAlchemy database URL (defaults to database.DATABASE_URL)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='partitions with their upper bound and estimated rows')
+    add = commands.add_parser('add', help='create the partitions of the coming months')
+    add.add_argument('--months-ahead', type=int, default=12)
+    for name, help in (('drop', 'delete the months before a date'),
+                       ('exchange', 'move the months before a date into their own tables')):
+        command = commands.add_parser(name, help=help)
+        command.add_argument('--before', type=date.fromisoformat, required=True,
+                             help='first day kept (YYYY-MM-DD); only whole months go')
+    args = parser.parse_args()
+
+    if args.url:
+        url = args.url
+    else:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+
+    engine = create_engine(url)
+    if engine.dialect.name != 'mysql':
+        sys.exit(f"✗ Partitions need MySQL, not {engine.dialect.name}")
+
+    with engine.begin() as connection:
+        if args.command == 'list':
+            for partition in partitions(connection):
+                print(f"{partition.name:<10} < {partition.upper or 'MAXVALUE'!s:<10} {partition.rows:>10}")
+            return
+        if args.command == 'add':
+            until = month_start(date.today())
+            for _ in range(args.months_ahead):
+                until = next_month(until)
+            changed = add_partitions(connection, until)
+        elif args.command == 'drop':
+            changed = drop_partitions(connection, args.before)
+        else:
+            changed = exchange_partitions(connection, args.before)
+
+    for name in changed:
+        print(f"✓ {args.command}: {name}")
+    if not changed:
+        print("✓ Nothing to do")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Verify or rebuild the avaliacoes_resumo rating aggregates
+
+Usage:
+    python scripts/rebuild_rating_aggregates.py --verify     # report drift, exit 1 if any
+    python scripts/rebuild_rating_aggregates.py --repair     # recompute drifted hospedagens only
+    python scripts/rebuild_rating_aggregates.py              # recompute everything
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from repositories.rating_aggregates import rebuild_ratings, refresh_ratings, verify_ratings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='SQLAlchemy database URL (defaults to database.DATABASE_URL)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--verify', action='store_true', help='only report drifted hospedagens')
+    mode.add_argument('--repair', action='store_true', help='recompute drifted hospedagens only')
+    args = parser.parse_args()
+
+    if args.url:
+        url = args.url
+    else:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+
+    with sessionmaker(bind=create_engine(url))() as db:
+        if not (args.verify or args.repair):
+            print(f"✓ Rebuilt aggregates for {rebuild_ratings(db)} hospedagens")
+            return
+
+        drifted = verify_ratings(db)
+        for hospedagem_id in drifted:
+            print(f"✗ Drift: {hospedagem_id}")
+
+        if args.repair and drifted:
+            refresh_ratings(db, drifted)
+            db.commit()
+            print(f"✓ Repaired {len(drifted)} hospedagens")
+        elif not drifted:
+            print("✓ Aggregates match avaliacoes")
+
+        sys.exit(1 if drifted and args.verify else 0)
+
+
+if __name__ == '__main__':
+    main()
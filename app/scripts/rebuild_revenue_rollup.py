@@ -0,0 +1,49 @@
+"""Verify or rebuild the receita_diaria revenue rollup
+
+Usage:
+    python scripts/rebuild_revenue_rollup.py --verify     # report drift, exit 1 if any
+    python scripts/rebuild_revenue_rollup.py              # recompute everything
+
+--verify checks each (hospedagem, day) row: its value against the rentals,
+its proprietario_id and cidade against the hospedagem and its address.
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from repositories.revenue_rollup import rebuild_revenue, verify_revenue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='SQLAlchemy database URL (defaults to database.DATABASE_URL)')
+    parser.add_argument('--verify', action='store_true', help='only report drifted hospedagens')
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    if args.url:
+        url = args.url
+    else:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+
+    with sessionmaker(bind=create_engine(url))() as db:
+        if not args.verify:
+            print(f"✓ Rebuilt the rollup from {rebuild_revenue(db, args.chunk_size)} alugueis")
+            return
+
+        drifted = verify_revenue(db)
+        for hospedagem_id in drifted:
+            print(f"✗ Drift: {hospedagem_id}")
+        if not drifted:
+            print("✓ Rollup matches alugueis")
+        sys.exit(1 if drifted else 0)
+
+
+if __name__ == '__main__':
+    main()
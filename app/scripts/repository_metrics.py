@@ -0,0 +1,78 @@
+"""Call every repository read path with instrumentation on and print the metrics
+
+Usage:
+    python scripts/repository_metrics.py                        # DB_* environment (MySQL)
+    python scripts/repository_metrics.py --url sqlite:///local.db --repeat 20
+    python scripts/repository_metrics.py --url sqlite:///local.db --format prometheus
+
+Uses the same read paths and sampled arguments as index_advisor.py. Lazy
+loads inside repository methods are reported as NPlusOneWarning on stderr;
+exits with status 1 when any method lazy-loads a relationship.
+"""
+import argparse
+import os
+import sys
+import warnings
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(APP_DIR)
+
+from sqlalchemy.orm import sessionmaker
+
+from database import PROFILES, make_engine
+from index_advisor import read_paths, sample
+from instrumentation import Instrumentation, NPlusOneWarning
+
+
+def collect(url: str, repeat: int) -> Instrumentation:
+    engine = make_engine(url, PROFILES['batch'])
+    with sessionmaker(bind=engine)() as db:
+        paths = read_paths(sample(db))
+        with Instrumentation(engine) as metrics:
+            for _ in range(repeat):
+                for call in paths.values():
+                    db.expunge_all()
+                    try:
+                        call(db)
+                    except Exception:
+                        db.rollback()
+    engine.dispose()
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='SQLAlchemy database URL (defaults to database.DATABASE_URL)')
+    parser.add_argument('--repeat', type=int, default=10, help='calls per read path')
+    parser.add_argument('--format', choices=('table', 'json', 'prometheus'), default='table')
+    args = parser.parse_args()
+
+    if args.url:
+        url = args.url
+    else:
+        from database import DATABASE_URL
+        url = DATABASE_URL
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', NPlusOneWarning)
+        metrics = collect(url, args.repeat)
+    lazy = [warning for warning in caught if issubclass(warning.category, NPlusOneWarning)]
+    for warning in lazy:
+        print(f"NPlusOneWarning: {warning.message}", file=sys.stderr)
+
+    if args.format == 'json':
+        print(metrics.to_json())
+    elif args.format == 'prometheus':
+        print(metrics.to_prometheus(), end='')
+    else:
+        print(f"{'method':<52} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8} {'stmts/call':>10} {'rows/call':>10}")
+        for name, stats in sorted(metrics.stats().items()):
+            per_call = lambda value: value / stats.calls
+            print(f"{name:<52} {stats.calls:>6} {stats.latency.quantile(0.5) * 1000:>8.1f} "
+                  f"{stats.latency.quantile(0.95) * 1000:>8.1f} "
+                  f"{per_call(stats.statements):>10.1f} {per_call(stats.rows):>10.1f}")
+    sys.exit(1 if lazy else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import re
+import unicodedata
+from typing import List, Optional
+
+from sqlalchemy import and_, true
+
+_WORD = re.compile(r'[a-z0-9]+')
+# Words joined by punctuation, as in CPFs, CEPs, phone numbers and e-mails
+_COMPOUND = re.compile(r'[a-z0-9]+(?:[.\-/@_][a-z0-9]+)+')
+_SEPARATOR = re.compile(r'[.\-/@_]')
+_NON_DIGIT = re.compile(r'\D')
+
+
+def fold(text: Optional[str]) -> str:
+    """Lowercase and strip accents: 'São João' -> 'sao joao'"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def search_key(text: Optional[str]) -> str:
+    """Folded text with runs of whitespace collapsed: ' São  Paulo' -> 'sao paulo'"""
+    return ' '.join(fold(text).split())
+
+
+def digits(text: Optional[str]) -> str:
+    """Keep only the digits: '01310-100' -> '01310100'"""
+    return _NON_DIGIT.sub('', text) if text else ''
+
+
+def prefix_range(column, prefix: str):
+    """`column` starts with `prefix`, as a range any B-tree index can serve
+
+    Meant for folded columns, where LIKE 'x%' would not use an index on
+    SQLite. An empty prefix matches everything.
+    """
+    if not prefix:
+        return true()
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
+
+
+def tokenize(text: Optional[str], compounds: bool = True) -> List[str]:
+    """Split folded text into words
+
+    With `compounds`, '123.456.789-00' also yields '12345678900', so a
+    document can be found by its digits with or without punctuation.
+    """
+    folded = fold(text)
+    tokens = _WORD.findall(folded)
+    if compounds:
+        tokens.extend(_SEPARATOR.sub('', match) for match in _COMPOUND.findall(folded))
+    return tokens